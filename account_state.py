@@ -0,0 +1,223 @@
+"""
+Состояние аккаунта (балансы и позиции) в памяти по приватным потокам Bybit
+"""
+from models import Balance, Position, parse_balances, parse_positions, _float
+import logging
+import threading
+import time
+
+
+# Поля итогов аккаунта из wallet-balance / потока wallet
+ACCOUNT_FIELDS = ('totalEquity', 'totalWalletBalance', 'totalMarginBalance',
+                  'totalAvailableBalance', 'totalPerpUPL', 'totalInitialMargin',
+                  'totalMaintenanceMargin', 'accountIMRate', 'accountMMRate')
+
+
+class AccountState:
+    """
+    Балансы и позиции аккаунта без опроса REST.
+
+    Состояние один раз загружается из REST (get_wallet_balance, get_positions),
+    затем обновляется сообщениями приватных потоков wallet и position.
+    Чтение - обращение к словарю в памяти без запросов и блокировок.
+    """
+
+    def __init__(self, client, ws=None, account_type="UNIFIED", categories=("linear",),
+                 settle_coins=("USDT",), resync_interval=None):
+        """
+        Args:
+            client: Экземпляр BybitClient (для начального снимка)
+            ws: BybitWebSocketClient с channel_type="private" (None - только REST снимки)
+            account_type: Тип аккаунта для get_wallet_balance
+            categories: Категории позиций (linear, inverse, option)
+            settle_coins: Монеты расчетов для загрузки позиций без указания символа
+            resync_interval: Период контрольной перезагрузки из REST в секундах
+                             (None - только при старте и по вызову resync())
+        """
+        self.client = client
+        self.ws = ws
+        self.account_type = account_type
+        self.categories = tuple(categories)
+        self.settle_coins = tuple(settle_coins)
+        self.resync_interval = resync_interval
+
+        self._balances = {}
+        self._account = {}
+        self._positions = {}
+        self._wallet_ts = 0
+        self._lock = threading.Lock()
+
+        self.seeded_at = None
+        self.updated_at = None
+        self.wallet_updates = 0
+        self.position_updates = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # === Запуск ===
+
+    def start(self):
+        """Подписаться на приватные потоки и загрузить начальный снимок из REST"""
+        # Подписка до снимка: обновления, пришедшие во время запроса, не теряются
+        if self.ws is not None:
+            self.ws.subscribe_wallet(callback=self.on_wallet)
+            self.ws.subscribe_position(callback=self.on_position)
+        self.resync()
+
+        if self.resync_interval and not (self._thread and self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="AccountStateResync", daemon=True)
+            self._thread.start()
+        logging.info(f"Состояние аккаунта загружено: {len(self._balances)} монет, "
+                     f"{len(self._positions)} позиций")
+        return self
+
+    def stop(self):
+        """Остановить фоновую перезагрузку"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.resync_interval):
+            try:
+                self.resync()
+            except Exception as e:
+                logging.warning(f"Ошибка перезагрузки состояния аккаунта: {e}")
+
+    def _now_ms(self):
+        clock = getattr(self.client, 'clock', None)
+        return clock.now_ms() if clock is not None else time.time() * 1000
+
+    # === REST снимок ===
+
+    def resync(self):
+        """Загрузить балансы и позиции из REST и слить с состоянием из потоков"""
+        started = self._now_ms()
+        wallet = self.client.get_wallet_balance(accountType=self.account_type)
+        positions = []
+        for category in self.categories:
+            for settle_coin in self.settle_coins:
+                positions.extend(self._fetch_positions(category, settle_coin))
+
+        with self._lock:
+            # Сообщение потока новее снимка - оставляем данные потока
+            if self._wallet_ts <= started:
+                self._balances = parse_balances(wallet)
+                accounts = wallet['result']['list']
+                if accounts:
+                    self._account = self._account_totals(accounts[0])
+
+            fresh = {}
+            for position in positions:
+                key = (position.category, position.symbol, position.position_idx)
+                current = self._positions.get(key)
+                if (current is not None and current.updated_time and position.updated_time
+                        and current.updated_time > position.updated_time):
+                    fresh[key] = current
+                elif position.size:
+                    fresh[key] = position
+            # Позиции, открытые потоком после начала запроса, сохраняются
+            for key, current in self._positions.items():
+                if key not in fresh and current.updated_time and current.updated_time > started:
+                    fresh[key] = current
+            self._positions = fresh
+            self.seeded_at = time.time()
+            self.updated_at = self.seeded_at
+
+    def _fetch_positions(self, category, settle_coin):
+        positions = []
+        cursor = None
+        while True:
+            response = self.client.get_positions(category=category, settleCoin=settle_coin,
+                                                 limit=200, cursor=cursor)
+            positions.extend(parse_positions(response))
+            cursor = response['result'].get('nextPageCursor')
+            if not cursor:
+                return positions
+
+    @staticmethod
+    def _account_totals(account):
+        return {field: _float(account.get(field)) for field in ACCOUNT_FIELDS if field in account}
+
+    # === Обработчики потоков ===
+
+    def on_wallet(self, message):
+        """Обработчик потока wallet"""
+        try:
+            created = int(message.get('creationTime') or self._now_ms())
+            with self._lock:
+                if created < self._wallet_ts:
+                    return
+                for account in message.get('data', []):
+                    if account.get('accountType', self.account_type) != self.account_type:
+                        continue
+                    self._account.update(self._account_totals(account))
+                    for item in account.get('coin', []):
+                        self._balances[item['coin']] = Balance.from_dict(item)
+                self._wallet_ts = created
+                self.wallet_updates += 1
+                self.updated_at = time.time()
+        except Exception as e:
+            logging.error(f"Ошибка обработки wallet: {e}")
+
+    def on_position(self, message):
+        """Обработчик потока position"""
+        try:
+            with self._lock:
+                for item in message.get('data', []):
+                    position = Position.from_dict(item)
+                    key = (position.category, position.symbol, position.position_idx)
+                    current = self._positions.get(key)
+                    if (current is not None and current.updated_time and position.updated_time
+                            and position.updated_time < current.updated_time):
+                        continue
+                    if position.size:
+                        self._positions[key] = position
+                    elif current is not None and position.updated_time:
+                        # Закрытая позиция: хранить отметку времени, чтобы не воскресить
+                        # ее устаревшим снимком, но не отдавать при чтении
+                        self._positions[key] = position
+                    else:
+                        self._positions.pop(key, None)
+                self.position_updates += 1
+                self.updated_at = time.time()
+        except Exception as e:
+            logging.error(f"Ошибка обработки position: {e}")
+
+    # === Чтение ===
+
+    def balance(self, coin):
+        """Balance монеты или None"""
+        return self._balances.get(coin)
+
+    def balances(self):
+        """Все балансы {coin: Balance}"""
+        return dict(self._balances)
+
+    def account(self):
+        """Итоги аккаунта: totalEquity, totalAvailableBalance, accountIMRate и т.д."""
+        return dict(self._account)
+
+    def position(self, symbol, category="linear", position_idx=0):
+        """Открытая позиция или None"""
+        position = self._positions.get((category, symbol, position_idx))
+        return position if position is not None and position.size else None
+
+    def positions(self, category=None):
+        """Список открытых позиций (опционально только одной категории)"""
+        return [p for p in list(self._positions.values())
+                if p.size and (category is None or p.category == category)]
+
+    def stats(self):
+        """Счетчики обновлений и время последних данных"""
+        return {
+            'coins': len(self._balances),
+            'positions': len(self.positions()),
+            'wallet_updates': self.wallet_updates,
+            'position_updates': self.position_updates,
+            'seeded_at': self.seeded_at,
+            'updated_at': self.updated_at,
+        }
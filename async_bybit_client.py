@@ -0,0 +1,419 @@
+"""
+Асинхронный клиент для работы с Bybit API (asyncio + aiohttp)
+"""
+import codec
+import hashlib
+import hmac
+import logging
+import time
+from urllib.parse import urlencode
+from config import Config
+from rate_limiter import RateLimitScheduler
+from utils.metrics import MetricsRegistry
+
+
+MAINNET_URL = 'https://api.bybit.com'
+TESTNET_URL = 'https://api-testnet.bybit.com'
+
+
+class BybitAPIError(Exception):
+    """Ошибка, возвращенная Bybit API (retCode != 0)"""
+
+    def __init__(self, ret_code, ret_msg, path=None, headers=None):
+        super().__init__(f"{ret_msg} (ErrCode: {ret_code}) {path or ''}".strip())
+        self.ret_code = ret_code
+        self.ret_msg = ret_msg
+        self.path = path
+        self.headers = headers
+
+
+def sign_request(api_secret, timestamp, api_key, recv_window, payload):
+    """
+    Подпись запроса по схеме Bybit v5 (HMAC-SHA256)
+
+    Args:
+        api_secret: API secret
+        timestamp: Время запроса в миллисекундах
+        api_key: API ключ
+        recv_window: Окно приема запроса в миллисекундах
+        payload: Query string (GET) или JSON тело (POST)
+    """
+    param_str = f"{timestamp}{api_key}{recv_window}{payload}"
+    return hmac.new(
+        api_secret.encode('utf-8'),
+        param_str.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+
+class AsyncBybitClient:
+    """Асинхронный клиент Bybit API с пулом keep-alive соединений"""
+
+    def __init__(self, api_key=None, api_secret=None, testnet=None, base_url=None,
+                 recv_window=5000, max_connections=100, timeout=None, rate_limit=True,
+                 clock=None, metrics=False):
+        """
+        Инициализация клиента
+
+        Args:
+            api_key: API ключ (если None, берется из config)
+            api_secret: API secret (если None, берется из config)
+            testnet: Использовать testnet (если None, берется из config)
+            base_url: Базовый URL API (например, адрес локального mock-сервера)
+            recv_window: Окно приема подписанных запросов (мс)
+            max_connections: Максимум одновременных соединений в пуле
+            timeout: Таймаут запроса в секундах (если None, берется из config)
+            rate_limit: Планировать запросы с учетом лимитов Bybit (True),
+                        либо передать собственный RateLimitScheduler
+            clock: ClockSync для коррекции timestamp подписанных запросов
+            metrics: Собирать метрики запросов: True или собственный MetricsRegistry
+        """
+        self.api_key = api_key or Config.API_KEY
+        self.api_secret = api_secret or Config.API_SECRET
+        self.testnet = testnet if testnet is not None else Config.TESTNET
+        self.base_url = (base_url or (TESTNET_URL if self.testnet else MAINNET_URL)).rstrip('/')
+        self.recv_window = recv_window
+        self.max_connections = max_connections
+        self.timeout = timeout if timeout is not None else Config.REQUEST_TIMEOUT
+        self.session = None
+        self.clock = clock
+
+        if isinstance(metrics, MetricsRegistry):
+            self.metrics = metrics
+        else:
+            self.metrics = MetricsRegistry() if metrics else None
+
+        if isinstance(rate_limit, RateLimitScheduler):
+            self.scheduler = rate_limit
+        else:
+            self.scheduler = RateLimitScheduler() if rate_limit else None
+
+        logging.info(f"Async Bybit клиент инициализирован (base_url={self.base_url})")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Создать HTTP сессию с пулом соединений"""
+        if self.session is None or self.session.closed:
+            # aiohttp импортируется при первом использовании: импорт модуля остается быстрым
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'Content-Type': 'application/json', 'Accept': 'application/json'}
+            )
+
+    async def close(self):
+        """Закрыть HTTP сессию и все соединения пула"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def _timestamp(self):
+        """Текущее время в миллисекундах для подписи запросов (с поправкой ClockSync)"""
+        if self.clock is not None:
+            return self.clock.timestamp()
+        return int(time.time() * 1000)
+
+    def _auth_headers(self, payload):
+        """Заголовки аутентификации для приватных запросов"""
+        timestamp = self._timestamp()
+        signature = sign_request(self.api_secret, timestamp, self.api_key, self.recv_window, payload)
+        return {
+            'X-BAPI-API-KEY': self.api_key,
+            'X-BAPI-SIGN': signature,
+            'X-BAPI-SIGN-TYPE': '2',
+            'X-BAPI-TIMESTAMP': str(timestamp),
+            'X-BAPI-RECV-WINDOW': str(self.recv_window),
+        }
+
+    async def _request(self, name, method, path, params=None, auth=False, decoder=None):
+        """
+        Выполнить запрос к API
+
+        Args:
+            name: Имя метода клиента (для планировщика лимитов)
+            method: HTTP метод (GET или POST)
+            path: Путь эндпоинта (например, /v5/market/tickers)
+            params: Параметры запроса
+            auth: Подписывать ли запрос
+            decoder: Функция raw -> (retCode, retMsg, результат) для типизированного
+                     декодирования; по умолчанию ответ разбирается в dict
+        """
+        await self.start()
+        if self.scheduler:
+            await self.scheduler.acquire_async(name)
+
+        started = time.perf_counter()
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        url = f"{self.base_url}{path}"
+
+        if method == 'GET':
+            payload = urlencode(params)
+            if payload:
+                url = f"{url}?{payload}"
+            body = None
+        else:
+            payload = codec.dumps(params)
+            body = payload
+
+        headers = self._auth_headers(payload) if auth else None
+        signed = time.perf_counter()
+
+        ret_code = 0
+        raw = None
+        received = None
+        try:
+            async with self.session.request(method, url, data=body, headers=headers) as response:
+                if self.scheduler:
+                    if response.status == 403:
+                        self.scheduler.on_throttled(name, response.headers, ip_ban=True)
+                    else:
+                        self.scheduler.update_from_headers(name, response.headers)
+                raw = await response.read()
+                received = time.perf_counter()
+                if response.status != 200:
+                    ret_code = f"http_{response.status}"
+                    raise BybitAPIError(response.status,
+                                        f"HTTP {response.status}: {raw[:200].decode(errors='replace')}",
+                                        path, response.headers)
+
+            if decoder is not None:
+                ret_code, ret_msg, data = decoder(raw)
+            else:
+                data = codec.loads(raw)
+                ret_code, ret_msg = data.get('retCode', 0), data.get('retMsg')
+            if ret_code != 0:
+                if self.scheduler and ret_code == 10006:
+                    self.scheduler.on_throttled(name, response.headers)
+                raise BybitAPIError(ret_code, ret_msg, path, response.headers)
+            return data
+        except BybitAPIError:
+            raise
+        except Exception as e:
+            ret_code = type(e).__name__
+            raise
+        finally:
+            if self.metrics is not None:
+                finished = time.perf_counter()
+                phases = {'sign': (signed - started) * 1000}
+                if received is not None:
+                    phases['network'] = (received - signed) * 1000
+                    phases['parse'] = (finished - received) * 1000
+                self.metrics.record(name, path, (finished - started) * 1000, ret_code=ret_code,
+                                    size=len(raw) if raw is not None else None, phases=phases)
+
+    def metrics_snapshot(self):
+        """Снимок метрик запросов (None, если метрики выключены)"""
+        return self.metrics.snapshot() if self.metrics else None
+
+    # === Market Data Methods ===
+
+    async def get_server_time(self):
+        """Получить время сервера"""
+        try:
+            return await self._request('get_server_time', 'GET', '/v5/market/time')
+        except Exception as e:
+            logging.error(f"Ошибка получения времени сервера: {e}")
+            raise
+
+    async def get_tickers(self, category="spot", symbol=None):
+        """
+        Получить информацию о тикерах
+
+        Args:
+            category: Тип рынка (spot, linear, inverse, option)
+            symbol: Символ торговой пары (например, BTCUSDT)
+        """
+        try:
+            return await self._request('get_tickers', 'GET', '/v5/market/tickers',
+                                       {"category": category, "symbol": symbol})
+        except Exception as e:
+            logging.error(f"Ошибка получения тикеров: {e}")
+            raise
+
+    async def get_market_snapshot(self, category="spot"):
+        """
+        Получить тикеры всех инструментов категории одним запросом
+
+        Ответ декодируется сразу в объекты Ticker (см. codec.decode_tickers).
+
+        Args:
+            category: Тип рынка (spot, linear, inverse, option)
+
+        Returns:
+            dict: {symbol: Ticker}
+        """
+        try:
+            return await self._request('get_tickers', 'GET', '/v5/market/tickers',
+                                       {"category": category}, decoder=codec.decode_tickers)
+        except Exception as e:
+            logging.error(f"Ошибка получения снимка рынка {category}: {e}")
+            raise
+
+    async def get_kline(self, category="spot", symbol="BTCUSDT", interval="1", limit=200,
+                        start=None, end=None):
+        """
+        Получить данные свечей (kline)
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары
+            interval: Интервал (1, 3, 5, 15, 30, 60, 120, 240, 360, 720, D, W, M)
+            limit: Количество свечей (макс 1000)
+            start: Начало периода, timestamp в мс (опционально)
+            end: Конец периода, timestamp в мс (опционально)
+        """
+        try:
+            return await self._request('get_kline', 'GET', '/v5/market/kline', {
+                "category": category,
+                "symbol": symbol,
+                "interval": interval,
+                "limit": limit,
+                "start": start,
+                "end": end
+            })
+        except Exception as e:
+            logging.error(f"Ошибка получения kline: {e}")
+            raise
+
+    async def get_orderbook(self, category="spot", symbol="BTCUSDT", limit=25):
+        """
+        Получить стакан заявок
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары
+            limit: Глубина стакана (макс 500)
+        """
+        try:
+            return await self._request('get_orderbook', 'GET', '/v5/market/orderbook', {
+                "category": category,
+                "symbol": symbol,
+                "limit": limit
+            })
+        except Exception as e:
+            logging.error(f"Ошибка получения orderbook: {e}")
+            raise
+
+    async def get_many(self, coroutines):
+        """
+        Выполнить набор запросов параллельно
+
+        Args:
+            coroutines: Список корутин (например, [client.get_tickers(...), ...])
+
+        Returns:
+            list: Результаты в том же порядке; ошибки возвращаются как исключения
+        """
+        import asyncio
+
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    # === Account Methods ===
+
+    async def get_wallet_balance(self, accountType="UNIFIED"):
+        """
+        Получить баланс кошелька
+
+        Args:
+            accountType: Тип аккаунта (UNIFIED, CONTRACT, SPOT)
+        """
+        try:
+            return await self._request('get_wallet_balance', 'GET', '/v5/account/wallet-balance',
+                                       {"accountType": accountType}, auth=True)
+        except Exception as e:
+            logging.error(f"Ошибка получения баланса: {e}")
+            raise
+
+    # === Trading Methods ===
+
+    async def place_order(self, category, symbol, side, orderType, qty, price=None, **kwargs):
+        """
+        Разместить ордер
+
+        Args:
+            category: Тип рынка (spot, linear, inverse)
+            symbol: Символ пары
+            side: Buy или Sell
+            orderType: Тип ордера (Market, Limit)
+            qty: Количество
+            price: Цена (для лимитных ордеров)
+            **kwargs: Дополнительные параметры
+        """
+        try:
+            params = {
+                "category": category,
+                "symbol": symbol,
+                "side": side,
+                "orderType": orderType,
+                "qty": str(qty)
+            }
+
+            if price:
+                params["price"] = str(price)
+
+            params.update(kwargs)
+
+            response = await self._request('place_order', 'POST', '/v5/order/create', params, auth=True)
+            logging.info(f"Ордер размещен: {response}")
+            return response
+        except Exception as e:
+            logging.error(f"Ошибка размещения ордера: {e}")
+            raise
+
+    async def get_open_orders(self, category, symbol=None):
+        """
+        Получить открытые ордера
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары (опционально)
+        """
+        try:
+            return await self._request('get_open_orders', 'GET', '/v5/order/realtime',
+                                       {"category": category, "symbol": symbol}, auth=True)
+        except Exception as e:
+            logging.error(f"Ошибка получения открытых ордеров: {e}")
+            raise
+
+    async def cancel_order(self, category, symbol, orderId=None, orderLinkId=None):
+        """
+        Отменить ордер
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары
+            orderId: ID ордера
+            orderLinkId: Пользовательский ID ордера
+        """
+        try:
+            params = {
+                "category": category,
+                "symbol": symbol
+            }
+
+            if orderId:
+                params["orderId"] = orderId
+            elif orderLinkId:
+                params["orderLinkId"] = orderLinkId
+            else:
+                raise ValueError("Необходимо указать orderId или orderLinkId")
+
+            response = await self._request('cancel_order', 'POST', '/v5/order/cancel', params, auth=True)
+            logging.info(f"Ордер отменен: {response}")
+            return response
+        except Exception as e:
+            logging.error(f"Ошибка отмены ордера: {e}")
+            raise
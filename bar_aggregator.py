@@ -0,0 +1,249 @@
+"""
+Построение баров (OHLCV, VWAP) из потока сделок publicTrade
+"""
+from collections import deque
+import logging
+import threading
+import time
+
+
+# Виды баров
+BAR_TIME = 'time'      # по времени: size - интервал в секундах
+BAR_TICK = 'tick'      # по числу сделок: size - сделок в баре
+BAR_VOLUME = 'volume'  # по объему: size - объем базовой монеты в баре
+
+
+class Bar:
+    """Бар: OHLCV, оборот, объем покупок/продаж и число сделок"""
+
+    __slots__ = ('symbol', 'kind', 'size', 'start', 'end', 'open', 'high', 'low', 'close',
+                 'volume', 'turnover', 'buy_volume', 'sell_volume', 'trades')
+
+    def __init__(self, symbol, kind, size, start, end, price):
+        self.symbol = symbol
+        self.kind = kind
+        self.size = size
+        self.start = start
+        self.end = end
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.volume = 0.0
+        self.turnover = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.trades = 0
+
+    @property
+    def vwap(self):
+        """Средневзвешенная по объему цена"""
+        return self.turnover / self.volume if self.volume else self.close
+
+    @property
+    def delta(self):
+        """Объем покупок минус объем продаж"""
+        return self.buy_volume - self.sell_volume
+
+    def __repr__(self):
+        return (f"Bar({self.symbol} {self.kind}:{self.size} start={self.start} O={self.open} H={self.high} "
+                f"L={self.low} C={self.close} V={self.volume:g} VWAP={self.vwap:g} n={self.trades})")
+
+
+class _Series:
+    """Текущий бар и история завершенных баров одного вида для одного символа"""
+
+    __slots__ = ('kind', 'size', 'size_ms', 'bar', 'history', 'closed_until')
+
+    def __init__(self, kind, size, history):
+        self.kind = kind
+        self.size = size
+        self.size_ms = int(size * 1000) if kind == BAR_TIME else None
+        self.bar = None
+        self.history = deque(maxlen=history)
+        # Конец последнего закрытого бара по времени: более ранние сделки опоздали
+        self.closed_until = None
+
+
+class BarAggregator:
+    """
+    Бары по времени, по числу сделок и по объему для многих символов за один проход.
+
+    Каждая сделка обновляет текущие бары символа всех заданных видов (O(1) на
+    бар). Завершенный бар передается в callback(bar) и сохраняется в ограниченной
+    истории символа. Бар по времени выровнен по началу интервала и закрывается
+    первой сделкой следующего интервала или вызовом close_expired(); интервалы
+    без сделок баров не образуют. Бары по числу сделок и по объему закрываются
+    сделкой, на которой достигнут размер (сделка не делится между барами).
+
+    Сделка старше начала текущего бара по времени (или конца уже закрытого)
+    в бары по времени не попадает и учитывается в late_trades: закрытый бар
+    не изменяется и не передается повторно.
+    """
+
+    def __init__(self, time_intervals=(60,), tick_sizes=(), volume_sizes=(), callback=None, history=1000,
+                 clock=None, grace=1.0):
+        """
+        Args:
+            time_intervals: Интервалы баров по времени в секундах
+            tick_sizes: Размеры баров по числу сделок
+            volume_sizes: Размеры баров по объему (базовая монета)
+            callback: Функция callback(bar) для каждого завершенного бара
+            history: Сколько завершенных баров хранить на символ и вид
+            clock: ClockSync - close_expired() сравнивает конец бара со временем биржи
+            grace: Сколько секунд после конца интервала ждать опоздавших сделок в close_expired()
+        """
+        self.specs = ([(BAR_TIME, size) for size in time_intervals]
+                      + [(BAR_TICK, size) for size in tick_sizes]
+                      + [(BAR_VOLUME, size) for size in volume_sizes])
+        if not self.specs:
+            raise ValueError("Не задан ни один вид баров")
+        self.callback = callback
+        self.history = history
+        self.clock = clock
+        self.grace_ms = grace * 1000
+        self._series = {}
+        self._lock = threading.Lock()
+        self.trades = 0
+        self.late_trades = 0
+
+    def _symbol_series(self, symbol):
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = [_Series(kind, size, self.history) for kind, size in self.specs]
+        return series
+
+    # === Сделки ===
+
+    def on_message(self, message):
+        """Обработчик сообщений publicTrade (callback для subscribe_trades)"""
+        trades = message.get('data')
+        if not trades:
+            return
+        closed = []
+        with self._lock:
+            for trade in trades:
+                self._add(trade['s'], int(trade['T']), float(trade['p']), float(trade['v']),
+                          trade['S'] == 'Buy', closed)
+        self._emit(closed)
+
+    def add_trade(self, symbol, ts, price, qty, is_buy):
+        """
+        Добавить одну сделку
+
+        Args:
+            symbol: Символ пары
+            ts: Время сделки (мс)
+            price: Цена
+            qty: Количество
+            is_buy: True - сделка по инициативе покупателя
+        """
+        closed = []
+        with self._lock:
+            self._add(symbol, int(ts), float(price), float(qty), is_buy, closed)
+        self._emit(closed)
+
+    def _add(self, symbol, ts, price, qty, is_buy, closed):
+        self.trades += 1
+        late = False
+        for series in self._symbol_series(symbol):
+            bar = series.bar
+            if series.kind == BAR_TIME:
+                if (bar is not None and ts < bar.start) or \
+                        (bar is None and series.closed_until is not None and ts < series.closed_until):
+                    late = True
+                    continue
+                if bar is not None and ts >= bar.end:
+                    closed.append(self._close(series))
+                    bar = None
+                if bar is None:
+                    start = ts - ts % series.size_ms
+                    bar = series.bar = Bar(symbol, BAR_TIME, series.size, start, start + series.size_ms, price)
+            elif bar is None:
+                bar = series.bar = Bar(symbol, series.kind, series.size, ts, None, price)
+
+            if price > bar.high:
+                bar.high = price
+            elif price < bar.low:
+                bar.low = price
+            bar.close = price
+            bar.volume += qty
+            bar.turnover += price * qty
+            if is_buy:
+                bar.buy_volume += qty
+            else:
+                bar.sell_volume += qty
+            bar.trades += 1
+
+            if (series.kind == BAR_TICK and bar.trades >= series.size) or \
+                    (series.kind == BAR_VOLUME and bar.volume >= series.size):
+                bar.end = ts
+                closed.append(self._close(series))
+        self.late_trades += late
+
+    @staticmethod
+    def _close(series):
+        bar = series.bar
+        series.bar = None
+        if series.kind == BAR_TIME:
+            series.closed_until = bar.end
+        series.history.append(bar)
+        return bar
+
+    def _emit(self, closed):
+        if self.callback is None:
+            return
+        for bar in closed:
+            try:
+                self.callback(bar)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика бара {bar.symbol}: {e}")
+
+    def close_expired(self, now_ms=None):
+        """
+        Закрыть бары по времени, интервал которых закончился больше grace секунд назад
+        (для символов без новых сделок)
+
+        Args:
+            now_ms: Текущее время в мс (по умолчанию - время биржи по clock, без него - локальное)
+
+        Returns:
+            list: Закрытые бары
+        """
+        if now_ms is None:
+            now_ms = self.clock.now_ms() if self.clock is not None else time.time() * 1000
+        closed = []
+        with self._lock:
+            for series_list in self._series.values():
+                for series in series_list:
+                    if series.kind == BAR_TIME and series.bar is not None \
+                            and now_ms >= series.bar.end + self.grace_ms:
+                        closed.append(self._close(series))
+        self._emit(closed)
+        return closed
+
+    # === Чтение ===
+
+    def _find(self, symbol, kind, size):
+        for series in self._series.get(symbol, ()):
+            if series.kind == kind and series.size == size:
+                return series
+        return None
+
+    def bars(self, symbol, kind=BAR_TIME, size=60, limit=None):
+        """Завершенные бары символа (от старых к новым)"""
+        series = self._find(symbol, kind, size)
+        if series is None:
+            return []
+        with self._lock:
+            bars = list(series.history)
+        return bars[-limit:] if limit else bars
+
+    def current(self, symbol, kind=BAR_TIME, size=60):
+        """Текущий (незавершенный) бар символа или None"""
+        series = self._find(symbol, kind, size)
+        return series.bar if series is not None else None
+
+    def symbols(self):
+        """Символы, по которым были сделки"""
+        return list(self._series)
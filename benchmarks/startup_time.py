@@ -0,0 +1,71 @@
+"""
+Бенчмарк времени запуска: импорт модулей и создание клиентов в чистом процессе
+
+Каждый замер выполняется в отдельном интерпретаторе (без прогретого кэша модулей),
+сеть не используется. Пример:
+
+    python benchmarks/startup_time.py --runs 10 --max-ms 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Название -> код, время выполнения которого измеряется
+SCENARIOS = {
+    'import config': "import config",
+    'import bybit_client': "import bybit_client",
+    'import websocket_client': "import websocket_client",
+    'import hyperliquid_client': "import hyperliquid_client",
+    'import hyperliquid_websocket': "import hyperliquid_websocket",
+    'import async_bybit_client': "import async_bybit_client",
+    'BybitClient()': "from bybit_client import BybitClient; BybitClient(api_key='', api_secret='')",
+    'HyperliquidClient()': "from hyperliquid_client import HyperliquidClient; HyperliquidClient()",
+}
+
+_TEMPLATE = """
+import time
+_started = time.perf_counter()
+{code}
+print((time.perf_counter() - _started) * 1000)
+"""
+
+
+def measure(code, runs):
+    """Время выполнения code в новом процессе (мс), по каждому запуску"""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _TEMPLATE.format(code=code)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта модулей и создания клиентов")
+    parser.add_argument("--runs", type=int, default=5, help="Запусков на сценарий")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Порог медианы (мс): код возврата 1, если он превышен")
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'Сценарий':<32} {'медиана, мс':>12} {'мин, мс':>10}")
+    for name, code in SCENARIOS.items():
+        timings = measure(code, args.runs)
+        median = statistics.median(timings)
+        print(f"{name:<32} {median:>12.1f} {min(timings):>10.1f}")
+        if args.max_ms is not None and median > args.max_ms:
+            failed.append(name)
+
+    if failed:
+        print(f"\nПревышен порог {args.max_ms} мс: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,118 @@
 """
 Клиент для работы с Bybit API
 """
-from pybit.unified_trading import HTTP
+from pybit.exceptions import InvalidRequestError, FailedRequestError
 from config import Config
+from rate_limiter import RateLimitScheduler
+from utils.cache import TTLCache
+from utils.singleflight import SingleFlight
+from time_sync import ClockSync
+from utils.metrics import MetricsRegistry
+from utils.retry import RetryPolicy, HedgePolicy, DUPLICATE_ORDER_LINK_ID_CODES, error_code
+from models import Ticker, parse_tickers
+from instruments import InstrumentCache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import logging
+import time
+import uuid
+
+
+# Время жизни кэша по умолчанию для методов чтения (секунды)
+DEFAULT_CACHE_TTL = {
+    'get_tickers': 1.0,
+    'get_orderbook': 0.2,
+    'get_kline': 1.0,
+}
+
+# Метод pybit -> путь эндпоинта (для метрик)
+ENDPOINT_PATHS = {
+    'get_server_time': '/v5/market/time',
+    'get_tickers': '/v5/market/tickers',
+    'get_kline': '/v5/market/kline',
+    'get_orderbook': '/v5/market/orderbook',
+    'get_public_trade_history': '/v5/market/recent-trade',
+    'get_instruments_info': '/v5/market/instruments-info',
+    'get_wallet_balance': '/v5/account/wallet-balance',
+    'get_positions': '/v5/position/list',
+    'place_order': '/v5/order/create',
+    'amend_order': '/v5/order/amend',
+    'cancel_order': '/v5/order/cancel',
+    'cancel_all_orders': '/v5/order/cancel-all',
+    'get_open_orders': '/v5/order/realtime',
+    'place_batch_order': '/v5/order/create-batch',
+    'amend_batch_order': '/v5/order/amend-batch',
+    'cancel_batch_order': '/v5/order/cancel-batch',
+}
+
+# retCode, которые повторяет сам pybit (10002 - recv_window). 10006 в этот набор не входит:
+# pybit спал бы до сброса лимита, удерживая токен планировщика, и повторял бы запрос в обход него
+PYBIT_RETRY_CODES = {10002}
+
+# Методы чтения, одинаковые одновременные вызовы которых объединяются (по умолчанию)
+COALESCED_METHODS = {
+    'get_server_time',
+    'get_tickers',
+    'get_kline',
+    'get_orderbook',
+    'get_public_trade_history',
+}
+
+# Чтения счета и ордеров: объединяются только явно (coalesce=COALESCED_METHODS | ACCOUNT_READ_METHODS).
+# Чтение, начатое до записи (place_order, cancel_order), вернет ответ без ее результата
+ACCOUNT_READ_METHODS = {
+    'get_open_orders',
+    'get_wallet_balance',
+    'get_positions',
+}
+
+# Идемпотентные чтения, которые можно хеджировать вторым запросом
+HEDGED_METHODS = {
+    'get_server_time',
+    'get_tickers',
+    'get_kline',
+    'get_orderbook',
+}
+
+# Запись, повтор которой безопасен только с orderLinkId (биржа отклонит дубликат)
+ORDER_WRITE_METHODS = {
+    'place_order',
+    'amend_order',
+    'cancel_order',
+}
+
+# Параметры, которые биржа меняет у существующего ордера (amend); остальные - только cancel/new
+AMENDABLE_FIELDS = {
+    'qty',
+    'price',
+    'triggerPrice',
+    'takeProfit',
+    'stopLoss',
+    'tpslMode',
+    'tpLimitPrice',
+    'slLimitPrice',
+    'tpTriggerBy',
+    'slTriggerBy',
+    'triggerBy',
+}
+
+# Размер страницы get_open_orders по умолчанию (как у биржи)
+OPEN_ORDERS_PAGE_SIZE = 20
+
+# Максимум ордеров в одном batch-запросе по категориям
+BATCH_ORDER_LIMITS = {
+    'spot': 10,
+    'linear': 20,
+    'inverse': 20,
+    'option': 20,
+}
 
 
 class BybitClient:
     """Основной класс для взаимодействия с Bybit API"""
 
-    def __init__(self, api_key=None, api_secret=None, testnet=None):
+    def __init__(self, api_key=None, api_secret=None, testnet=None, rate_limit=True,
+                 cache=False, cache_size=1024, coalesce=True, clock=None, metrics=False,
+                 instruments=None, retry=False, hedge=False):
         """
         Инициализация клиента
 
@@ -17,51 +120,349 @@ class BybitClient:
             api_key: API ключ (если None, берется из config)
             api_secret: API secret (если None, берется из config)
             testnet: Использовать testnet (если None, берется из config)
+            rate_limit: Планировать запросы с учетом лимитов Bybit (True),
+                        либо передать собственный RateLimitScheduler
+            cache: Кэшировать ответы методов чтения: True - с TTL по умолчанию,
+                   dict {метод: TTL в секундах} - с собственными TTL
+            cache_size: Максимальное количество записей в кэше
+            coalesce: Объединять одинаковые одновременные запросы чтения: True - рыночные
+                      данные (COALESCED_METHODS), либо собственный набор методов
+            clock: Синхронизация времени с сервером: True - запустить ClockSync,
+                   либо передать собственный ClockSync. Смещение применяется
+                   к timestamp подписанных запросов
+            metrics: Собирать метрики запросов: True или собственный MetricsRegistry
+            instruments: Проверять и округлять ордера локально по параметрам инструментов:
+                         True - InstrumentCache по умолчанию, либо собственный InstrumentCache
+            retry: Повторять временные ошибки с экспоненциальной задержкой:
+                   True - RetryPolicy по умолчанию, либо собственный RetryPolicy.
+                   Ордера повторяются, только если указан orderLinkId
+            hedge: Хеджировать чтения (get_tickers, get_orderbook, get_kline, get_server_time):
+                   True - HedgePolicy по умолчанию, либо собственный HedgePolicy.
+                   Включает метрики, если они выключены
         """
         self.api_key = api_key or Config.API_KEY
         self.api_secret = api_secret or Config.API_SECRET
         self.testnet = testnet if testnet is not None else Config.TESTNET
 
-        # Инициализация HTTP клиента
-        self.client = HTTP(
-            testnet=self.testnet,
-            api_key=self.api_key,
-            api_secret=self.api_secret
-        )
+        # HTTP клиент pybit создается при первом запросе (см. свойство client)
+        self._http = None
+
+        if isinstance(rate_limit, RateLimitScheduler):
+            self.scheduler = rate_limit
+        else:
+            self.scheduler = RateLimitScheduler() if rate_limit else None
+
+        # Кэш рыночных данных (опционально)
+        self.cache = None
+        self.cache_ttl = {}
+        if cache:
+            self.cache_ttl = dict(DEFAULT_CACHE_TTL)
+            if isinstance(cache, dict):
+                self.cache_ttl.update(cache)
+            self.cache = TTLCache(maxsize=cache_size)
+
+        # Объединение одинаковых одновременных запросов чтения
+        self.singleflight = SingleFlight() if coalesce else None
+        self.coalesced_methods = set(COALESCED_METHODS if coalesce is True else coalesce or ())
+
+        # Метрики запросов (опционально; нужны для хеджирования)
+        if isinstance(metrics, MetricsRegistry):
+            self.metrics = metrics
+        else:
+            self.metrics = MetricsRegistry() if (metrics or hedge) else None
+
+        # Повторы временных ошибок и хеджирование медленных чтений (опционально)
+        if isinstance(retry, RetryPolicy):
+            self.retry = retry
+        else:
+            self.retry = RetryPolicy() if retry else None
+        if isinstance(hedge, HedgePolicy):
+            self.hedge = hedge
+        else:
+            self.hedge = HedgePolicy() if hedge else None
+        self._hedge_executor = None
+
+        # Параметры инструментов для локальной проверки ордеров (опционально)
+        if isinstance(instruments, InstrumentCache):
+            self.instruments = instruments
+        else:
+            self.instruments = InstrumentCache(self) if instruments else None
+
+        # Реестр открытых ордеров в памяти (подключается OrderRegistry.start())
+        self.orders = None
+
+        # Синхронизация времени (опционально)
+        self.clock = None
+        if clock:
+            self.clock = clock if isinstance(clock, ClockSync) else ClockSync(self)
+            self.clock.start()
+            self.clock.apply_to_pybit()
 
         logging.info(f"Bybit клиент инициализирован (testnet={self.testnet})")
 
+    @property
+    def client(self):
+        """HTTP клиент pybit; pybit импортируется и клиент создается при первом обращении"""
+        if self._http is None:
+            from pybit.unified_trading import HTTP
+
+            options = {}
+            if self.retry is not None:
+                # Повторяет RetryPolicy: pybit делает одну попытку (при max_retries=0
+                # pybit не отправляет запрос вовсе) без собственной задержки
+                options = {'max_retries': 1, 'retry_delay': 0}
+            http = HTTP(
+                testnet=self.testnet,
+                api_key=self.api_key,
+                api_secret=self.api_secret,
+                return_response_headers=True,
+                retry_codes=set(PYBIT_RETRY_CODES),
+                **options
+            )
+            if self.retry is not None:
+                # Пустой retry_codes pybit заменяет набором по умолчанию, поэтому - после создания:
+                # 10002 доходит до RetryPolicy как InvalidRequestError, а не как FailedRequestError(400)
+                http.retry_codes = set()
+            self._http = http
+        return self._http
+
+    @client.setter
+    def client(self, http):
+        self._http = http
+
+    def _call(self, method, **params):
+        """
+        Выполнить запрос через pybit; одинаковые одновременные чтения объединяются
+
+        Args:
+            method: Имя метода pybit HTTP (например, 'get_tickers')
+            **params: Параметры запроса
+        """
+        if self.singleflight is not None and method in self.coalesced_methods:
+            key = (method, tuple(sorted(params.items())))
+            return self.singleflight.do(key, lambda: self._request(method, params))
+        return self._request(method, params)
+
+    def _request(self, method, params):
+        """
+        Выполнить запрос с повторами временных ошибок и хеджированием чтений
+
+        Args:
+            method: Имя метода pybit HTTP
+            params: Параметры запроса (dict)
+        """
+        retry = self.retry
+        if method in ORDER_WRITE_METHODS and not params.get('orderLinkId'):
+            # Без orderLinkId повтор может создать второй ордер
+            retry = None
+        elif method not in ORDER_WRITE_METHODS and not method.startswith('get_'):
+            # batch и cancel_all: частично выполненный запрос нельзя повторить целиком
+            retry = None
+
+        attempt = 0
+        while True:
+            try:
+                if self.hedge is not None and method in HEDGED_METHODS:
+                    return self._send_hedged(method, params)
+                return self._send(method, **params)
+            except InvalidRequestError as e:
+                # Повтор ордера, который уже принят первой попыткой
+                if attempt and method == 'place_order' and e.status_code in DUPLICATE_ORDER_LINK_ID_CODES:
+                    return self._find_placed_order(params, e)
+                error = e
+            except Exception as e:
+                error = e
+
+            delay = retry.next_delay(error, attempt) if retry is not None else None
+            if delay is None:
+                raise error
+            attempt += 1
+            logging.warning(f"{method}: временная ошибка {error_code(error)}, повтор {attempt} "
+                            f"через {delay * 1000:.0f}мс")
+            time.sleep(delay)
+
+    def _find_placed_order(self, params, error):
+        """Ответ place_order для ордера, принятого биржей до повтора (по orderLinkId)"""
+        response = self._send('get_open_orders', category=params['category'],
+                              symbol=params['symbol'], orderLinkId=params['orderLinkId'])
+        orders = response['result'].get('list', [])
+        if not orders:
+            raise error
+        return {
+            'retCode': 0,
+            'retMsg': 'OK',
+            'result': {'orderId': orders[0]['orderId'], 'orderLinkId': orders[0]['orderLinkId']},
+            'retExtInfo': {},
+            'time': response.get('time'),
+        }
+
+    def _send_hedged(self, method, params):
+        """
+        Отправить запрос; если ответа нет дольше перцентиля задержки метода,
+        отправить второй такой же и вернуть первый успешный ответ
+        """
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="BybitHedge")
+        delay = self.hedge.delay(self.metrics, method)
+
+        primary = self._hedge_executor.submit(self._send, method, **params)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            self.hedge.record(hedged=False)
+            return primary.result()
+
+        backup = self._hedge_executor.submit(self._send, method, **params)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.hedge.record(hedged=True, hedge_won=future is backup)
+                    return future.result()
+                error = future.exception()
+        self.hedge.record(hedged=True)
+        raise error
+
+    def _send(self, method, **params):
+        """
+        Отправить запрос через pybit с учетом лимитов
+
+        Args:
+            method: Имя метода pybit HTTP
+            **params: Параметры запроса
+        """
+        if self.scheduler:
+            self.scheduler.acquire(method)
+
+        started = time.perf_counter()
+        ret_code = 0
+        elapsed = None
+        headers = None
+        try:
+            response, elapsed, headers = getattr(self.client, method)(**params)
+        except InvalidRequestError as e:
+            ret_code = e.status_code
+            if self.scheduler and e.status_code == 10006:
+                self.scheduler.on_throttled(method, e.resp_headers)
+            raise
+        except FailedRequestError as e:
+            ret_code = f"http_{e.status_code}"
+            if self.scheduler and e.status_code == 403:
+                self.scheduler.on_throttled(method, e.resp_headers, ip_ban=True)
+            raise
+        except Exception as e:
+            ret_code = type(e).__name__
+            raise
+        finally:
+            if self.metrics is not None:
+                self._record_metrics(method, started, ret_code, elapsed, headers)
+
+        if self.scheduler:
+            self.scheduler.update_from_headers(method, headers)
+        return response
+
+    def _record_metrics(self, method, started, ret_code, elapsed, headers):
+        """Записать метрики запроса: полное время, сеть (по данным requests), размер ответа"""
+        total_ms = (time.perf_counter() - started) * 1000
+        phases = None
+        if elapsed is not None:
+            network_ms = elapsed.total_seconds() * 1000
+            phases = {'network': network_ms, 'client': max(0.0, total_ms - network_ms)}
+        size = None
+        if headers is not None and headers.get('Content-Length'):
+            size = int(headers['Content-Length'])
+        self.metrics.record(method, ENDPOINT_PATHS.get(method, method), total_ms,
+                            ret_code=ret_code, size=size, phases=phases)
+
+    def close(self):
+        """Остановить потоки хеджирования и закрыть HTTP сессию pybit"""
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+            self._hedge_executor = None
+        if self._http is not None:
+            self._http.client.close()
+            self._http = None
+
+    def metrics_snapshot(self):
+        """Снимок метрик запросов (None, если метрики выключены)"""
+        return self.metrics.snapshot() if self.metrics else None
+
+    def _call_cached(self, method, use_cache=True, **params):
+        """
+        Выполнить запрос чтения через кэш (если он включен для метода)
+
+        Ответ из кэша - тот же объект, что вернул pybit; не изменяйте его.
+
+        Args:
+            method: Имя метода pybit HTTP
+            use_cache: False - всегда идти на биржу (свежий ответ все равно кэшируется)
+            **params: Параметры запроса
+        """
+        ttl = self.cache_ttl.get(method)
+        if self.cache is None or ttl is None:
+            return self._call(method, **params)
+
+        key = (method, tuple(sorted(params.items())))
+        if use_cache:
+            found, value = self.cache.get(key)
+            if found:
+                return value
+
+        response = self._call(method, **params)
+        self.cache.set(key, response, ttl)
+        return response
+
+    def cache_stats(self):
+        """Статистика кэша рыночных данных (None, если кэш выключен)"""
+        return self.cache.stats() if self.cache else None
+
+    def coalesce_stats(self):
+        """Статистика объединения запросов (None, если выключено)"""
+        return self.singleflight.stats() if self.singleflight else None
+
+    def retry_stats(self):
+        """Статистика повторов и хеджирования (None, если оба выключены)"""
+        if self.retry is None and self.hedge is None:
+            return None
+        return {
+            'retry': self.retry.stats() if self.retry else None,
+            'hedge': self.hedge.stats() if self.hedge else None,
+        }
+
     # === Market Data Methods ===
 
     def get_server_time(self):
         """Получить время сервера"""
         try:
-            response = self.client.get_server_time()
+            response = self._call('get_server_time')
             return response
         except Exception as e:
             logging.error(f"Ошибка получения времени сервера: {e}")
             raise
 
-    def get_tickers(self, category="spot", symbol=None):
+    def get_tickers(self, category="spot", symbol=None, use_cache=True):
         """
         Получить информацию о тикерах
 
         Args:
             category: Тип рынка (spot, linear, inverse, option)
             symbol: Символ торговой пары (например, BTCUSDT)
+            use_cache: False - запросить биржу в обход кэша
         """
         try:
             params = {"category": category}
             if symbol:
                 params["symbol"] = symbol
 
-            response = self.client.get_tickers(**params)
+            response = self._call_cached('get_tickers', use_cache, **params)
             return response
         except Exception as e:
             logging.error(f"Ошибка получения тикеров: {e}")
             raise
 
-    def get_kline(self, category="spot", symbol="BTCUSDT", interval="1", limit=200):
+    def get_kline(self, category="spot", symbol="BTCUSDT", interval="1", limit=200,
+                  start=None, end=None, use_cache=True):
         """
         Получить данные свечей (kline)
 
@@ -70,20 +471,29 @@ class BybitClient:
             symbol: Символ пары
             interval: Интервал (1, 3, 5, 15, 30, 60, 120, 240, 360, 720, D, W, M)
             limit: Количество свечей (макс 1000)
+            start: Начало периода, timestamp в мс (опционально)
+            end: Конец периода, timestamp в мс (опционально)
+            use_cache: False - запросить биржу в обход кэша
         """
         try:
-            response = self.client.get_kline(
-                category=category,
-                symbol=symbol,
-                interval=interval,
-                limit=limit
-            )
+            params = {
+                "category": category,
+                "symbol": symbol,
+                "interval": interval,
+                "limit": limit
+            }
+            if start is not None:
+                params["start"] = start
+            if end is not None:
+                params["end"] = end
+
+            response = self._call_cached('get_kline', use_cache, **params)
             return response
         except Exception as e:
             logging.error(f"Ошибка получения kline: {e}")
             raise
 
-    def get_orderbook(self, category="spot", symbol="BTCUSDT", limit=25):
+    def get_orderbook(self, category="spot", symbol="BTCUSDT", limit=25, use_cache=True):
         """
         Получить стакан заявок
 
@@ -91,9 +501,12 @@ class BybitClient:
             category: Тип рынка
             symbol: Символ пары
             limit: Глубина стакана (макс 500)
+            use_cache: False - запросить биржу в обход кэша
         """
         try:
-            response = self.client.get_orderbook(
+            response = self._call_cached(
+                'get_orderbook',
+                use_cache,
                 category=category,
                 symbol=symbol,
                 limit=limit
@@ -103,15 +516,62 @@ class BybitClient:
             logging.error(f"Ошибка получения orderbook: {e}")
             raise
 
-    def get_futures_ticker(self, symbol="BTCUSDT"):
+    def get_public_trade_history(self, category="spot", symbol="BTCUSDT", limit=None):
+        """
+        Получить последние публичные сделки
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары
+            limit: Количество сделок (spot - макс 60, остальные - макс 1000)
+        """
+        try:
+            params = {"category": category, "symbol": symbol}
+            if limit is not None:
+                params["limit"] = limit
+
+            return self._call('get_public_trade_history', **params)
+        except Exception as e:
+            logging.error(f"Ошибка получения последних сделок: {e}")
+            raise
+
+    def get_instruments_info(self, category="spot", symbol=None, limit=None, cursor=None):
+        """
+        Получить параметры инструментов (шаг цены, шаг количества, минимумы)
+
+        Args:
+            category: Тип рынка (spot, linear, inverse, option)
+            symbol: Символ пары (опционально)
+            limit: Размер страницы (макс 1000)
+            cursor: Курсор следующей страницы
+        """
+        try:
+            params = {"category": category}
+            if symbol:
+                params["symbol"] = symbol
+            if limit:
+                params["limit"] = limit
+            if cursor:
+                params["cursor"] = cursor
+
+            response = self._call('get_instruments_info', **params)
+            return response
+        except Exception as e:
+            logging.error(f"Ошибка получения параметров инструментов: {e}")
+            raise
+
+    def get_futures_ticker(self, symbol="BTCUSDT", use_cache=True):
         """
         Получить цену бессрочного фьючерса (linear perpetual)
 
         Args:
             symbol: Символ пары (например, BTCUSDT для фьючерса)
+            use_cache: False - запросить биржу в обход кэша
         """
         try:
-            response = self.client.get_tickers(
+            response = self._call_cached(
+                'get_tickers',
+                use_cache,
                 category="linear",
                 symbol=symbol
             )
@@ -120,6 +580,79 @@ class BybitClient:
             logging.error(f"Ошибка получения futures ticker: {e}")
             raise
 
+    def get_market_snapshot(self, category="spot", parsed=False):
+        """
+        Получить тикеры всех инструментов категории одним запросом
+
+        Args:
+            category: Тип рынка (spot, linear, inverse, option)
+            parsed: True - вернуть объекты Ticker с разобранными числовыми полями
+
+        Returns:
+            dict: {symbol: ticker} - тикеры (dict в формате Bybit или Ticker), индексированные по символу
+        """
+        try:
+            response = self.get_tickers(category=category)
+            if response['retCode'] != 0:
+                return {}
+            if parsed:
+                return parse_tickers(response)
+            return {ticker['symbol']: ticker for ticker in response['result']['list']}
+        except Exception as e:
+            logging.error(f"Ошибка получения снимка рынка {category}: {e}")
+            raise
+
+    def get_spot_and_futures_prices(self, base_symbols):
+        """
+        Получить цены spot и futures для нескольких активов за два запроса
+
+        Args:
+            base_symbols: Список базовых символов (например, ['BTC', 'ETH', 'SOL'])
+
+        Returns:
+            dict: {base_symbol: данные в формате get_spot_and_futures_price}
+        """
+        try:
+            spot_snapshot = self.get_market_snapshot(category="spot", parsed=True)
+            futures_snapshot = self.get_market_snapshot(category="linear", parsed=True)
+
+            results = {}
+            for base_symbol in base_symbols:
+                spot_symbol = f"{base_symbol}USDC"
+                futures_symbol = f"{base_symbol}USDT"
+                spot = spot_snapshot.get(spot_symbol)
+                futures = futures_snapshot.get(futures_symbol)
+                results[base_symbol] = self._build_spread(
+                    spot_symbol, spot.last_price if spot else None,
+                    futures_symbol, futures.last_price if futures else None
+                )
+            return results
+        except Exception as e:
+            logging.error(f"Ошибка получения spot и futures цен: {e}")
+            raise
+
+    @staticmethod
+    def _build_spread(spot_symbol, spot_price, futures_symbol, futures_price):
+        """Сформировать результат сравнения spot и futures цен"""
+        spread = None
+        spread_percent = None
+        if spot_price and futures_price:
+            spread = futures_price - spot_price
+            spread_percent = (spread / spot_price) * 100
+
+        return {
+            'spot': {
+                'symbol': spot_symbol,
+                'price': spot_price
+            },
+            'futures': {
+                'symbol': futures_symbol,
+                'price': futures_price
+            },
+            'spread': spread,
+            'spread_percent': spread_percent
+        }
+
     def get_spot_and_futures_price(self, base_symbol):
         """
         Получить цены spot и futures для сравнения
@@ -144,33 +677,15 @@ class BybitClient:
             spot_data = self.get_tickers(category="spot", symbol=spot_symbol)
             spot_price = None
             if spot_data['retCode'] == 0 and spot_data['result']['list']:
-                spot_price = float(spot_data['result']['list'][0]['lastPrice'])
+                spot_price = Ticker.from_dict(spot_data['result']['list'][0]).last_price
 
             # Получаем futures цену
             futures_data = self.get_futures_ticker(symbol=futures_symbol)
             futures_price = None
             if futures_data['retCode'] == 0 and futures_data['result']['list']:
-                futures_price = float(futures_data['result']['list'][0]['lastPrice'])
+                futures_price = Ticker.from_dict(futures_data['result']['list'][0]).last_price
 
-            # Расчет спреда
-            spread = None
-            spread_percent = None
-            if spot_price and futures_price:
-                spread = futures_price - spot_price
-                spread_percent = (spread / spot_price) * 100
-
-            return {
-                'spot': {
-                    'symbol': spot_symbol,
-                    'price': spot_price
-                },
-                'futures': {
-                    'symbol': futures_symbol,
-                    'price': futures_price
-                },
-                'spread': spread,
-                'spread_percent': spread_percent
-            }
+            return self._build_spread(spot_symbol, spot_price, futures_symbol, futures_price)
         except Exception as e:
             logging.error(f"Ошибка получения spot и futures цен: {e}")
             raise
@@ -185,12 +700,41 @@ class BybitClient:
             accountType: Тип аккаунта (UNIFIED, CONTRACT, SPOT)
         """
         try:
-            response = self.client.get_wallet_balance(accountType=accountType)
+            response = self._call('get_wallet_balance', accountType=accountType)
             return response
         except Exception as e:
             logging.error(f"Ошибка получения баланса: {e}")
             raise
 
+    def get_positions(self, category="linear", symbol=None, settleCoin=None, limit=None,
+                      cursor=None):
+        """
+        Получить открытые позиции
+
+        Args:
+            category: Тип рынка (linear, inverse, option)
+            symbol: Символ пары (опционально)
+            settleCoin: Монета расчетов (нужна, если symbol не указан, например USDT)
+            limit: Размер страницы (макс 200)
+            cursor: Курсор следующей страницы
+        """
+        try:
+            params = {"category": category}
+            if symbol:
+                params["symbol"] = symbol
+            elif settleCoin:
+                params["settleCoin"] = settleCoin
+            if limit:
+                params["limit"] = limit
+            if cursor:
+                params["cursor"] = cursor
+
+            response = self._call('get_positions', **params)
+            return response
+        except Exception as e:
+            logging.error(f"Ошибка получения позиций: {e}")
+            raise
+
     # === Trading Methods ===
 
     def place_order(self, category, symbol, side, orderType, qty, price=None, **kwargs):
@@ -205,8 +749,15 @@ class BybitClient:
             qty: Количество
             price: Цена (для лимитных ордеров)
             **kwargs: Дополнительные параметры
+
+        Если включен кэш инструментов, цена и количество округляются до шагов
+        инструмента, а заведомо невалидный ордер отклоняется (ValueError) без запроса.
         """
         try:
+            if self.instruments is not None:
+                qty, price = self.instruments.prepare_order(category, symbol, side, orderType,
+                                                            qty, price, **kwargs)
+
             params = {
                 "category": category,
                 "symbol": symbol,
@@ -220,27 +771,57 @@ class BybitClient:
 
             params.update(kwargs)
 
-            response = self.client.place_order(**params)
+            response = self._call('place_order', **params)
+            if self.orders is not None:
+                self.orders.on_placed(category, params, response['result'])
             logging.info(f"Ордер размещен: {response}")
             return response
         except Exception as e:
             logging.error(f"Ошибка размещения ордера: {e}")
             raise
 
-    def get_open_orders(self, category, symbol=None):
+    def get_open_orders(self, category, symbol=None, settleCoin=None, limit=None, cursor=None,
+                        use_local=True):
         """
         Получить открытые ордера
 
         Args:
             category: Тип рынка
             symbol: Символ пары (опционально)
+            settleCoin: Монета расчетов (для linear/inverse без symbol)
+            limit: Размер страницы (макс 50)
+            cursor: Курсор следующей страницы
+            use_local: Если подключен OrderRegistry и категория сверена с биржей,
+                       вернуть ордера из памяти без запроса (в формате ответа API, копии).
+                       Если ордеров больше страницы limit, запрос идет на биржу,
+                       чтобы nextPageCursor был настоящим
         """
         try:
+            if (use_local and self.orders is not None and self.orders.is_synced(category)
+                    and not settleCoin and not cursor):
+                orders = self.orders.open_orders(category, symbol)
+                if len(orders) <= (limit or OPEN_ORDERS_PAGE_SIZE):
+                    return {
+                        'retCode': 0,
+                        'retMsg': 'OK',
+                        'result': {
+                            'category': category,
+                            'list': orders,
+                            'nextPageCursor': '',
+                        },
+                    }
+
             params = {"category": category}
             if symbol:
                 params["symbol"] = symbol
+            elif settleCoin:
+                params["settleCoin"] = settleCoin
+            if limit:
+                params["limit"] = limit
+            if cursor:
+                params["cursor"] = cursor
 
-            response = self.client.get_open_orders(**params)
+            response = self._call('get_open_orders', **params)
             return response
         except Exception as e:
             logging.error(f"Ошибка получения открытых ордеров: {e}")
@@ -269,9 +850,415 @@ class BybitClient:
             else:
                 raise ValueError("Необходимо указать orderId или orderLinkId")
 
-            response = self.client.cancel_order(**params)
+            response = self._call('cancel_order', **params)
+            if self.orders is not None:
+                self.orders.on_cancelled(orderId=response['result'].get('orderId') or orderId,
+                                         orderLinkId=orderLinkId)
             logging.info(f"Ордер отменен: {response}")
             return response
         except Exception as e:
             logging.error(f"Ошибка отмены ордера: {e}")
             raise
+
+    def amend_order(self, category, symbol, orderId=None, orderLinkId=None, qty=None, price=None,
+                    **kwargs):
+        """
+        Изменить цену и/или количество ордера без снятия из стакана
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары
+            orderId: ID ордера
+            orderLinkId: Пользовательский ID ордера
+            qty: Новое количество (None - не менять)
+            price: Новая цена (None - не менять)
+            **kwargs: Другие изменяемые параметры (triggerPrice, takeProfit, stopLoss, ...)
+        """
+        try:
+            params = {
+                "category": category,
+                "symbol": symbol
+            }
+
+            if orderId:
+                params["orderId"] = orderId
+            elif orderLinkId:
+                params["orderLinkId"] = orderLinkId
+            else:
+                raise ValueError("Необходимо указать orderId или orderLinkId")
+
+            if self.instruments is not None and (qty is not None or price is not None):
+                qty, price = self.instruments.prepare_amend(category, symbol, qty, price)
+            if qty is not None:
+                params["qty"] = str(qty)
+            if price is not None:
+                params["price"] = str(price)
+            params.update(kwargs)
+
+            response = self._call('amend_order', **params)
+            if self.orders is not None:
+                self.orders.on_amended(orderId=response['result'].get('orderId') or orderId,
+                                       orderLinkId=orderLinkId, qty=qty, price=price)
+            logging.info(f"Ордер изменен: {response}")
+            return response
+        except Exception as e:
+            logging.error(f"Ошибка изменения ордера: {e}")
+            raise
+
+    def _current_order(self, category, symbol, orderId=None, orderLinkId=None):
+        """Текущее состояние ордера: из OrderRegistry или REST (None, если не найден)"""
+        if self.orders is not None:
+            order = self.orders.get(orderId=orderId, orderLinkId=orderLinkId)
+            if order is not None:
+                return order
+        params = {"category": category, "symbol": symbol}
+        if orderId:
+            params["orderId"] = orderId
+        else:
+            params["orderLinkId"] = orderLinkId
+        orders = self._call('get_open_orders', **params)['result'].get('list', [])
+        return orders[0] if orders else None
+
+    @staticmethod
+    def _needs_cancel_replace(current, side, orderType, changes):
+        """Нужно ли снимать ордер: меняется что-то кроме параметров amend"""
+        if any(field not in AMENDABLE_FIELDS for field in changes):
+            return True
+        if current is None:
+            return False
+        return bool((side and side != current.get('side'))
+                    or (orderType and orderType != current.get('orderType')))
+
+    def replace_order(self, category, symbol, orderId=None, orderLinkId=None, side=None,
+                      orderType=None, qty=None, price=None, **kwargs):
+        """
+        Переставить ордер: amend, если меняются только цена/количество (и TP/SL, триггер),
+        иначе отмена и новый ордер
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары
+            orderId: ID ордера
+            orderLinkId: Пользовательский ID ордера
+            side: Сторона нового ордера (None - как у текущего)
+            orderType: Тип нового ордера (None - как у текущего)
+            qty: Новое количество (None - как у текущего)
+            price: Новая цена (None - как у текущего)
+            **kwargs: Другие параметры; не изменяемые через amend (timeInForce, reduceOnly, ...)
+                      приводят к отмене и новому ордеру. newOrderLinkId - orderLinkId нового ордера
+
+        Returns:
+            dict: {'action': 'amend' | 'cancel_replace', 'orderId', 'orderLinkId', 'response'}
+        """
+        if not orderId and not orderLinkId:
+            raise ValueError("Необходимо указать orderId или orderLinkId")
+        new_link_id = kwargs.pop('newOrderLinkId', None)
+
+        current = None
+        if side or orderType or kwargs.keys() - AMENDABLE_FIELDS:
+            current = self._current_order(category, symbol, orderId, orderLinkId)
+
+        if not self._needs_cancel_replace(current, side, orderType, kwargs):
+            response = self.amend_order(category, symbol, orderId=orderId, orderLinkId=orderLinkId,
+                                        qty=qty, price=price, **kwargs)
+            return {
+                'action': 'amend',
+                'orderId': response['result'].get('orderId') or orderId,
+                'orderLinkId': response['result'].get('orderLinkId') or orderLinkId,
+                'response': response,
+            }
+
+        if current is None and not (side and orderType and qty):
+            raise ValueError("Ордер не найден: для отмены и нового ордера укажите side, orderType и qty")
+
+        current = current or {}
+        self.cancel_order(category, symbol, orderId=orderId, orderLinkId=orderLinkId)
+        new_price = price if price is not None else current.get('price')
+        order_type = orderType or current.get('orderType')
+        response = self.place_order(
+            category, symbol,
+            side or current.get('side'),
+            order_type,
+            qty if qty is not None else current.get('leavesQty') or current.get('qty'),
+            new_price if order_type != 'Market' else None,
+            orderLinkId=new_link_id or uuid.uuid4().hex,
+            **kwargs
+        )
+        return {
+            'action': 'cancel_replace',
+            'orderId': response['result'].get('orderId'),
+            'orderLinkId': response['result'].get('orderLinkId'),
+            'response': response,
+        }
+
+    def replace_orders(self, category, orders):
+        """
+        Переставить несколько ордеров: изменения цены/количества уходят одним
+        amend_batch_order, остальные - через cancel_batch_order + place_batch_order
+
+        Args:
+            category: Тип рынка
+            orders: Список изменений, каждое с symbol и orderId или orderLinkId, например
+                    [{'symbol': 'BTCUSDT', 'orderLinkId': 'q1', 'price': 60100}, ...].
+                    Для отмены и нового ордера нужны side, orderType и qty (если ордер
+                    не найден в OrderRegistry)
+
+        Returns:
+            list: Результат по каждому ордеру в исходном порядке:
+                  {'symbol', 'orderId', 'orderLinkId', 'code', 'msg', 'action'}
+        """
+        amends, replaces = [], []
+        for index, order in enumerate(orders):
+            changes = {k: v for k, v in order.items()
+                       if k not in ('symbol', 'orderId', 'orderLinkId', 'side', 'orderType',
+                                    'newOrderLinkId')}
+            current = None
+            if self.orders is not None:
+                current = self.orders.get(orderId=order.get('orderId'),
+                                          orderLinkId=order.get('orderLinkId'))
+            if self._needs_cancel_replace(current, order.get('side'), order.get('orderType'), changes):
+                replaces.append((index, order, current or {}))
+            else:
+                amends.append((index, order))
+
+        results = [None] * len(orders)
+
+        if amends:
+            amended = self.amend_batch_order(category, [order for _, order in amends])
+            for (index, _), result in zip(amends, amended):
+                results[index] = dict(result, action='amend')
+
+        if replaces:
+            cancelled = self.cancel_batch_order(category, [order for _, order, _ in replaces])
+            new_orders, placed_for = [], []
+            for (index, order, current), result in zip(replaces, cancelled):
+                if result['code'] != 0:
+                    results[index] = dict(result, action='cancel_replace')
+                    continue
+                item = {k: v for k, v in current.items()
+                        if k in ('symbol', 'side', 'orderType', 'price', 'timeInForce')}
+                item['qty'] = current.get('leavesQty') or current.get('qty')
+                item.update({k: v for k, v in order.items() if k not in ('orderId', 'orderLinkId',
+                                                                          'newOrderLinkId')})
+                item['orderLinkId'] = order.get('newOrderLinkId') or uuid.uuid4().hex
+                if item.get('orderType') == 'Market':
+                    item.pop('price', None)
+                new_orders.append(item)
+                placed_for.append(index)
+            if new_orders:
+                placed = self.place_batch_order(category, new_orders)
+                for index, result in zip(placed_for, placed):
+                    results[index] = dict(result, action='cancel_replace')
+
+        return results
+
+    # === Batch Trading Methods ===
+
+    @staticmethod
+    def _normalize_batch_order(order):
+        """Привести ордер batch-запроса к формату API (строковые qty/price, orderLinkId)"""
+        item = dict(order)
+        for field in ('qty', 'price', 'triggerPrice', 'takeProfit', 'stopLoss'):
+            if item.get(field) is not None:
+                item[field] = str(item[field])
+        return item
+
+    def _batch(self, method, category, orders):
+        """
+        Отправить ордера пачками параллельно
+
+        Args:
+            method: Метод pybit (place_batch_order, amend_batch_order, cancel_batch_order)
+            category: Тип рынка
+            orders: Список ордеров (dict)
+
+        Returns:
+            list: Результат по каждому ордеру в исходном порядке:
+                  {'symbol', 'orderId', 'orderLinkId', 'code', 'msg'}
+        """
+        chunk_size = BATCH_ORDER_LIMITS.get(category, 10)
+        chunks = [orders[i:i + chunk_size] for i in range(0, len(orders), chunk_size)]
+
+        def send(chunk):
+            try:
+                response = self._call(method, category=category, request=chunk)
+            except Exception as e:
+                code = getattr(e, 'status_code', -1)
+                return [{
+                    'symbol': order.get('symbol'),
+                    'orderId': order.get('orderId', ''),
+                    'orderLinkId': order.get('orderLinkId', ''),
+                    'code': code,
+                    'msg': str(e)
+                } for order in chunk]
+
+            items = response['result'].get('list', [])
+            infos = (response.get('retExtInfo') or {}).get('list', [])
+            results = []
+            for index, order in enumerate(chunk):
+                item = items[index] if index < len(items) else {}
+                info = infos[index] if index < len(infos) else {'code': 0, 'msg': 'OK'}
+                results.append({
+                    'symbol': item.get('symbol') or order.get('symbol'),
+                    'orderId': item.get('orderId') or order.get('orderId', ''),
+                    'orderLinkId': item.get('orderLinkId') or order.get('orderLinkId', ''),
+                    'code': info.get('code', 0),
+                    'msg': info.get('msg', '')
+                })
+            return results
+
+        if len(chunks) == 1:
+            return send(chunks[0])
+
+        with ThreadPoolExecutor(max_workers=min(len(chunks), 8)) as executor:
+            return [result for chunk in executor.map(send, chunks) for result in chunk]
+
+    def place_batch_order(self, category, orders):
+        """
+        Разместить несколько ордеров batch-запросами
+
+        Ордера делятся на пачки по лимиту биржи (spot - 10, остальные - 20),
+        пачки отправляются параллельно. Ордерам без orderLinkId он присваивается,
+        чтобы результат можно было сопоставить с запросом.
+
+        Args:
+            category: Тип рынка (spot, linear, inverse, option)
+            orders: Список ордеров, например
+                    [{'symbol': 'BTCUSDT', 'side': 'Buy', 'orderType': 'Limit',
+                      'qty': 0.01, 'price': 60000}, ...]
+
+        Returns:
+            list: Результат по каждому ордеру ('code' == 0 - успешно)
+        """
+        try:
+            items = []
+            for order in orders:
+                item = self._normalize_batch_order(order)
+                if self.instruments is not None:
+                    extra = {k: v for k, v in item.items()
+                             if k not in ('symbol', 'side', 'orderType', 'qty', 'price')}
+                    item['qty'], price = self.instruments.prepare_order(
+                        category, item['symbol'], item.get('side'), item.get('orderType'),
+                        item['qty'], item.get('price'), **extra)
+                    if price is not None:
+                        item['price'] = price
+                item.setdefault('orderLinkId', uuid.uuid4().hex)
+                items.append(item)
+
+            results = self._batch('place_batch_order', category, items)
+            if self.orders is not None:
+                for item, result in zip(items, results):
+                    if result['code'] == 0:
+                        self.orders.on_placed(category, item, result)
+            failed = sum(1 for r in results if r['code'] != 0)
+            logging.info(f"Batch размещение: {len(results) - failed} из {len(results)} ордеров")
+            return results
+        except Exception as e:
+            logging.error(f"Ошибка batch размещения ордеров: {e}")
+            raise
+
+    def amend_batch_order(self, category, orders):
+        """
+        Изменить несколько ордеров batch-запросами
+
+        Args:
+            category: Тип рынка
+            orders: Список изменений, каждое с symbol и orderId или orderLinkId,
+                    например [{'symbol': 'BTCUSDT', 'orderLinkId': 'q1', 'price': 60100}, ...]
+
+        Returns:
+            list: Результат по каждому ордеру ('code' == 0 - успешно)
+        """
+        try:
+            items = []
+            for order in orders:
+                if not order.get('orderId') and not order.get('orderLinkId'):
+                    raise ValueError("Необходимо указать orderId или orderLinkId")
+                item = self._normalize_batch_order(order)
+                if self.instruments is not None and ('qty' in item or 'price' in item):
+                    qty, price = self.instruments.prepare_amend(
+                        category, item['symbol'], item.get('qty'), item.get('price'))
+                    for field, value in (('qty', qty), ('price', price)):
+                        if value is not None:
+                            item[field] = value
+                items.append(item)
+
+            results = self._batch('amend_batch_order', category, items)
+            if self.orders is not None:
+                for item, result in zip(items, results):
+                    if result['code'] == 0:
+                        self.orders.on_amended(orderId=result['orderId'],
+                                               orderLinkId=result['orderLinkId'],
+                                               qty=item.get('qty'), price=item.get('price'))
+            failed = sum(1 for r in results if r['code'] != 0)
+            logging.info(f"Batch изменение: {len(results) - failed} из {len(results)} ордеров")
+            return results
+        except Exception as e:
+            logging.error(f"Ошибка batch изменения ордеров: {e}")
+            raise
+
+    def cancel_batch_order(self, category, orders):
+        """
+        Отменить несколько ордеров batch-запросами
+
+        Args:
+            category: Тип рынка
+            orders: Список ордеров, каждый с symbol и orderId или orderLinkId
+
+        Returns:
+            list: Результат по каждому ордеру ('code' == 0 - успешно)
+        """
+        try:
+            items = []
+            for order in orders:
+                item = {'symbol': order['symbol']}
+                if order.get('orderId'):
+                    item['orderId'] = order['orderId']
+                elif order.get('orderLinkId'):
+                    item['orderLinkId'] = order['orderLinkId']
+                else:
+                    raise ValueError("Необходимо указать orderId или orderLinkId")
+                items.append(item)
+
+            results = self._batch('cancel_batch_order', category, items)
+            if self.orders is not None:
+                for result in results:
+                    if result['code'] == 0:
+                        self.orders.on_cancelled(orderId=result['orderId'],
+                                                 orderLinkId=result['orderLinkId'])
+            failed = sum(1 for r in results if r['code'] != 0)
+            logging.info(f"Batch отмена: {len(results) - failed} из {len(results)} ордеров")
+            return results
+        except Exception as e:
+            logging.error(f"Ошибка batch отмены ордеров: {e}")
+            raise
+
+    def cancel_all_orders(self, category, symbol=None, baseCoin=None, settleCoin=None):
+        """
+        Отменить все открытые ордера категории или символа
+
+        Args:
+            category: Тип рынка
+            symbol: Символ пары (опционально)
+            baseCoin: Базовая монета (опционально)
+            settleCoin: Монета расчетов (опционально, для linear/inverse)
+        """
+        try:
+            params = {"category": category}
+            if symbol:
+                params["symbol"] = symbol
+            if baseCoin:
+                params["baseCoin"] = baseCoin
+            if settleCoin:
+                params["settleCoin"] = settleCoin
+
+            response = self._call('cancel_all_orders', **params)
+            if self.orders is not None:
+                for item in response['result'].get('list', []):
+                    self.orders.on_cancelled(orderId=item.get('orderId'),
+                                             orderLinkId=item.get('orderLinkId'))
+            logging.info(f"Отменены все ордера: {response}")
+            return response
+        except Exception as e:
+            logging.error(f"Ошибка отмены всех ордеров: {e}")
+            raise
@@ -0,0 +1,224 @@
+"""
+Локальное колоночное хранилище свечей на memory-mapped файлах NumPy
+"""
+import numpy as np
+import logging
+import os
+import threading
+from datetime import datetime
+from kline_backfill import backfill_klines, to_ms
+
+
+# Колонки хранилища и их типы (порядок совпадает с ответом Bybit /v5/market/kline)
+COLUMNS = (
+    ('timestamp', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+    ('turnover', np.float64),
+)
+
+
+def klines_to_arrays(candles):
+    """
+    Преобразовать свечи Bybit в колонки NumPy, отсортированные по времени
+
+    Args:
+        candles: [[startTime, open, high, low, close, volume, turnover], ...]
+                 (строки, как в ответе get_kline, в любом порядке)
+
+    Returns:
+        dict: {колонка: np.ndarray}
+    """
+    if not candles:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+
+    table = np.asarray(candles, dtype=np.float64)[:, :len(COLUMNS)]
+    order = np.argsort(table[:, 0], kind='stable')
+    table = table[order]
+    arrays = {}
+    for index, (name, dtype) in enumerate(COLUMNS):
+        arrays[name] = table[:, index].astype(dtype)
+    return arrays
+
+
+class CandleSeries:
+    """Ряд свечей одного (category, symbol, interval): по файлу на колонку"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Директория ряда
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._columns = None
+        self._length = None
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _stored_length(self):
+        """Количество полностью записанных строк (минимум по всем колонкам)"""
+        lengths = []
+        for name, dtype in COLUMNS:
+            path = self._file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // np.dtype(dtype).itemsize)
+        return min(lengths)
+
+    def __len__(self):
+        return self._stored_length()
+
+    def columns(self):
+        """
+        Колонки ряда как read-only memmap массивы (без копирования данных)
+
+        Returns:
+            dict: {колонка: np.memmap}
+        """
+        with self._lock:
+            length = self._stored_length()
+            if self._columns is None or self._length != length:
+                columns = {}
+                for name, dtype in COLUMNS:
+                    if length:
+                        columns[name] = np.memmap(self._file(name), dtype=dtype, mode='r',
+                                                  shape=(length,))
+                    else:
+                        columns[name] = np.empty(0, dtype=dtype)
+                self._columns = columns
+                self._length = length
+            return self._columns
+
+    def last_timestamp(self):
+        """Время открытия последней сохраненной свечи (мс) или None"""
+        timestamps = self.columns()['timestamp']
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def append(self, candles):
+        """
+        Дописать новые свечи
+
+        Свечи не новее последней сохраненной пропускаются; свеча с тем же временем,
+        что и последняя, перезаписывает ее (обновление незакрытой свечи).
+
+        Args:
+            candles: Свечи в формате Bybit или dict колонок из klines_to_arrays
+
+        Returns:
+            int: Количество добавленных строк
+        """
+        arrays = candles if isinstance(candles, dict) else klines_to_arrays(candles)
+        timestamps = arrays['timestamp']
+        if not len(timestamps):
+            return 0
+
+        with self._lock:
+            length = self._stored_length()
+            last = None
+            if length:
+                stored = np.memmap(self._file('timestamp'), dtype=np.int64, mode='r', shape=(length,))
+                last = int(stored[-1])
+                del stored
+
+            start = 0
+            if last is not None:
+                start = int(np.searchsorted(timestamps, last, side='left'))
+                if start < len(timestamps) and timestamps[start] == last:
+                    # Обновляем последнюю (незакрытую) свечу на месте
+                    for name, dtype in COLUMNS:
+                        column = np.memmap(self._file(name), dtype=dtype, mode='r+', shape=(length,))
+                        column[-1] = arrays[name][start]
+                        column.flush()
+                        del column
+                    start += 1
+
+            added = len(timestamps) - start
+            if added > 0:
+                for name, dtype in COLUMNS:
+                    # Обрезаем недописанный хвост, если прошлая запись прервалась
+                    with open(self._file(name), 'ab') as f:
+                        f.truncate(length * np.dtype(dtype).itemsize)
+                        f.write(np.ascontiguousarray(arrays[name][start:], dtype=dtype).tobytes())
+
+            self._columns = None
+            return max(added, 0)
+
+    def range(self, start=None, end=None):
+        """
+        Свечи за период (бинарный поиск по времени, результат - срезы memmap)
+
+        Args:
+            start: Начало периода, мс (включительно)
+            end: Конец периода, мс (включительно)
+
+        Returns:
+            dict: {колонка: np.ndarray} - представления без копирования
+        """
+        columns = self.columns()
+        timestamps = columns['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        return {name: column[lo:hi] for name, column in columns.items()}
+
+
+class CandleStore:
+    """Хранилище рядов свечей: root/category/symbol/interval/<колонка>.bin"""
+
+    def __init__(self, root='data/candles'):
+        """
+        Args:
+            root: Корневая директория хранилища
+        """
+        self.root = root
+        self._series = {}
+        self._lock = threading.Lock()
+        logging.info(f"Хранилище свечей: {os.path.abspath(root)}")
+
+    def series(self, category, symbol, interval):
+        """Получить (или создать) ряд свечей"""
+        key = (category, symbol, str(interval))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = CandleSeries(os.path.join(self.root, category, symbol, str(interval)))
+                self._series[key] = series
+            return series
+
+    def append(self, category, symbol, interval, candles):
+        """Дописать свечи в ряд; возвращает количество добавленных строк"""
+        return self.series(category, symbol, interval).append(candles)
+
+    def load(self, category, symbol, interval, start=None, end=None):
+        """Свечи ряда за период как dict колонок memmap"""
+        return self.series(category, symbol, interval).range(start, end)
+
+    def update_from_exchange(self, client, category, symbols, interval, end=None, start=None):
+        """
+        Догрузить с биржи свечи новее последней сохраненной
+
+        Args:
+            client: Экземпляр BybitClient
+            category: Тип рынка
+            symbols: Список символов
+            interval: Интервал свечей
+            end: Конец периода (по умолчанию - сейчас)
+            start: Начало периода для пустых рядов (обязательно, если ряд пуст)
+
+        Returns:
+            dict: {symbol: количество добавленных строк}
+        """
+        end_ms = to_ms(end if end is not None else datetime.now())
+        added = {}
+        for symbol in symbols:
+            last = self.series(category, symbol, interval).last_timestamp()
+            symbol_start = last if last is not None else start
+            if symbol_start is None:
+                raise ValueError(f"Ряд {symbol} пуст: укажите start")
+            history = backfill_klines(client, [symbol], interval, symbol_start, end_ms, category=category)
+            added[symbol] = self.append(category, symbol, interval, history[symbol])
+        return added
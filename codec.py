@@ -0,0 +1,141 @@
+"""
+JSON кодек с автоматическим выбором быстрой реализации
+
+Порядок выбора: orjson, msgspec, стандартный json. Бэкенд можно задать
+явно переменной окружения JSON_CODEC (orjson, msgspec, json).
+"""
+import json
+import os
+from typing import List
+
+from models import Ticker, _float
+
+
+def _load_backend(name):
+    """Импортировать бэкенд по имени; None, если пакет не установлен"""
+    try:
+        if name == 'orjson':
+            import orjson
+            return orjson
+        if name == 'msgspec':
+            import msgspec
+            return msgspec
+    except ImportError:
+        return None
+    return json if name == 'json' else None
+
+
+def _select_backend():
+    preferred = os.getenv('JSON_CODEC')
+    candidates = [preferred] if preferred else ['orjson', 'msgspec', 'json']
+    for name in candidates:
+        module = _load_backend(name)
+        if module is not None:
+            return name, module
+    return 'json', json
+
+
+BACKEND, _module = _select_backend()
+
+if BACKEND == 'orjson':
+    loads = _module.loads
+
+    def dumps(obj):
+        """Сериализовать объект в компактную JSON строку"""
+        return _module.dumps(obj).decode('utf-8')
+
+elif BACKEND == 'msgspec':
+    _decoder = _module.json.Decoder()
+    _encoder = _module.json.Encoder()
+    loads = _decoder.decode
+
+    def dumps(obj):
+        """Сериализовать объект в компактную JSON строку"""
+        return _encoder.encode(obj).decode('utf-8')
+
+else:
+    loads = json.loads
+
+    def dumps(obj):
+        """Сериализовать объект в компактную JSON строку"""
+        return json.dumps(obj, separators=(',', ':'))
+
+
+# === Типизированное декодирование ===
+
+# Декодер схемы тикеров msgspec: создается при первом decode_tickers
+# (False - msgspec не установлен)
+_tickers_decoder = None
+
+
+def _build_tickers_decoder():
+    """Схема ответа тикеров msgspec или False, если msgspec не установлен"""
+    msgspec = _load_backend('msgspec')
+    if msgspec is None:
+        return False
+
+    class _TickerRaw(msgspec.Struct):
+        """Схема тикера Bybit для декодирования без промежуточных dict"""
+        symbol: str
+        lastPrice: str = ''
+        bid1Price: str = ''
+        bid1Size: str = ''
+        ask1Price: str = ''
+        ask1Size: str = ''
+        highPrice24h: str = ''
+        lowPrice24h: str = ''
+        volume24h: str = ''
+        turnover24h: str = ''
+        price24hPcnt: str = ''
+        markPrice: str = ''
+        indexPrice: str = ''
+        fundingRate: str = ''
+        openInterest: str = ''
+
+    class _TickersResult(msgspec.Struct):
+        list: List[_TickerRaw] = []
+
+    class _TickersResponse(msgspec.Struct):
+        retCode: int
+        retMsg: str = ''
+        result: _TickersResult = msgspec.field(default_factory=_TickersResult)
+
+    return msgspec.json.Decoder(_TickersResponse)
+
+
+def _ticker_from_raw(raw):
+    return Ticker(
+        raw.symbol, _float(raw.lastPrice), _float(raw.bid1Price), _float(raw.bid1Size),
+        _float(raw.ask1Price), _float(raw.ask1Size), _float(raw.highPrice24h),
+        _float(raw.lowPrice24h), _float(raw.volume24h), _float(raw.turnover24h),
+        _float(raw.price24hPcnt), _float(raw.markPrice), _float(raw.indexPrice),
+        _float(raw.fundingRate), _float(raw.openInterest),
+    )
+
+
+def decode_tickers(raw):
+    """
+    Декодировать ответ /v5/market/tickers сразу в объекты Ticker
+
+    При установленном msgspec JSON разбирается по схеме без построения
+    промежуточных словарей; иначе используется loads + Ticker.from_dict.
+
+    Args:
+        raw: Тело ответа (bytes или str)
+
+    Returns:
+        tuple: (retCode, retMsg, {symbol: Ticker})
+    """
+    global _tickers_decoder
+    if _tickers_decoder is None:
+        _tickers_decoder = _build_tickers_decoder()
+
+    if _tickers_decoder:
+        response = _tickers_decoder.decode(raw)
+        tickers = {item.symbol: _ticker_from_raw(item) for item in response.result.list}
+        return response.retCode, response.retMsg, tickers
+
+    response = loads(raw)
+    items = (response.get('result') or {}).get('list', [])
+    tickers = {item['symbol']: Ticker.from_dict(item) for item in items}
+    return response.get('retCode', 0), response.get('retMsg', ''), tickers
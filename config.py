@@ -2,33 +2,59 @@
 Конфигурация для подключения к Bybit API
 """
 import os
-from dotenv import load_dotenv
 
-# Загрузка переменных окружения из .env файла
-load_dotenv()
+_env_loaded = False
 
 
-class Config:
-    """Настройки для Bybit API"""
+def load_env():
+    """Загрузить переменные окружения из .env файла (один раз, при первом чтении настроек)"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
 
-    # API credentials
-    API_KEY = os.getenv('BYBIT_API_KEY', '')
-    API_SECRET = os.getenv('BYBIT_API_SECRET', '')
+        load_dotenv()
+        _env_loaded = True
 
-    # Testnet или mainnet
-    TESTNET = os.getenv('BYBIT_TESTNET', 'True').lower() == 'true'
 
+# Настройки, зависящие от окружения: имя -> функция вычисления
+_ENV_SETTINGS = {
+    # API credentials
+    'API_KEY': lambda: os.getenv('BYBIT_API_KEY', ''),
+    'API_SECRET': lambda: os.getenv('BYBIT_API_SECRET', ''),
+    # Testnet или mainnet
+    'TESTNET': lambda: os.getenv('BYBIT_TESTNET', 'True').lower() == 'true',
     # Базовые URL
-    if TESTNET:
-        BASE_URL = 'https://api-testnet.bybit.com'
-    else:
-        BASE_URL = 'https://api.bybit.com'
+    'BASE_URL': lambda: 'https://api-testnet.bybit.com' if Config.TESTNET else 'https://api.bybit.com',
+    # Логирование
+    'LOG_LEVEL': lambda: os.getenv('LOG_LEVEL', 'INFO'),
+}
+
+
+class _LazyConfig(type):
+    """Метакласс: настройки окружения вычисляются (и .env читается) при первом обращении"""
+
+    def __getattr__(cls, name):
+        factory = _ENV_SETTINGS.get(name)
+        if factory is None:
+            raise AttributeError(f"type object '{cls.__name__}' has no attribute '{name}'")
+        load_env()
+        value = factory()
+        setattr(cls, name, value)
+        return value
+
+
+class Config(metaclass=_LazyConfig):
+    """
+    Настройки для Bybit API
+
+    API_KEY, API_SECRET, TESTNET, BASE_URL и LOG_LEVEL берутся из окружения
+    (и .env) при первом обращении.
+    """
 
     # Настройки таймаутов
     REQUEST_TIMEOUT = 10  # секунды
 
     # Логирование
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = 'logs/bybit_api.log'
 
     @classmethod
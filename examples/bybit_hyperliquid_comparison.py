@@ -45,19 +45,18 @@ def main():
 
     results = []
 
+    # Все цены одним запросом на каждую биржу
+    bybit_tickers = bybit.get_market_snapshot(category="spot", parsed=True)
+    hl_prices = hyperliquid.get_multiple_tickers(common_symbols)
+
     for symbol in common_symbols:
         try:
             # Bybit spot цена
-            bybit_symbol = f"{symbol}USDC"
-            bybit_data = bybit.get_tickers(category="spot", symbol=bybit_symbol)
-            bybit_price = None
-
-            if bybit_data['retCode'] == 0 and bybit_data['result']['list']:
-                bybit_price = float(bybit_data['result']['list'][0]['lastPrice'])
+            ticker = bybit_tickers.get(f"{symbol}USDC")
+            bybit_price = ticker.last_price if ticker else None
 
             # Hyperliquid futures цена
-            hl_ticker = hyperliquid.get_ticker(symbol)
-            hl_price = hl_ticker.get('price')
+            hl_price = hl_prices.get(symbol)
 
             if bybit_price and hl_price:
                 # Расчет спреда
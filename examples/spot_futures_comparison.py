@@ -26,12 +26,19 @@ def main():
 
     results = []
 
-    for pair in TRADING_PAIRS:
-        # Получаем базовый символ (убираем USDC)
-        base_symbol = pair.replace("USDC", "")
+    # Базовые символы (убираем USDC)
+    base_symbols = [pair.replace("USDC", "") for pair in TRADING_PAIRS]
 
+    # Два запроса на весь рынок вместо двух запросов на каждую пару
+    try:
+        all_prices = client.get_spot_and_futures_prices(base_symbols)
+    except Exception as e:
+        print(f"❌ Ошибка получения цен: {e}")
+        return
+
+    for base_symbol in base_symbols:
         try:
-            data = client.get_spot_and_futures_price(base_symbol)
+            data = all_prices[base_symbol]
 
             spot_price = data['spot']['price']
             futures_price = data['futures']['price']
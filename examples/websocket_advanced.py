@@ -6,6 +6,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from websocket_client import BybitWebSocketClient
+from models import Ticker
 from config import Config
 from utils.logger import setup_logger
 from utils.encoding import fix_windows_encoding
@@ -47,11 +48,11 @@ class MultiStreamMonitor:
     def ticker_handler(self, message):
         """Обработчик тикеров"""
         if 'data' in message:
-            data = message['data']
-            symbol = data['symbol']
-            price = float(data['lastPrice'])
-            change_pct = float(data['price24hPcnt']) * 100
-            volume = float(data['volume24h'])
+            ticker = Ticker.from_dict(message['data'])
+            symbol = ticker.symbol
+            price = ticker.last_price
+            change_pct = ticker.change_24h * 100
+            volume = ticker.volume_24h
 
             change_indicator = "📈" if change_pct > 0 else "📉"
 
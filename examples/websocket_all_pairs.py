@@ -5,7 +5,9 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pybit.unified_trading import WebSocket
+from websocket_client import BybitWebSocketClient
+from bybit_client import BybitClient
+from stream_resync import StreamResync
 from config import Config
 from trading_pairs import TRADING_PAIRS, get_pair_count
 from utils.encoding import fix_windows_encoding
@@ -125,14 +127,18 @@ def main():
     monitor = AllPairsMonitor()
 
     # WebSocket
-    ws = WebSocket(testnet=Config.TESTNET, channel_type="spot")
+    ws = BybitWebSocketClient(testnet=Config.TESTNET, channel_type="spot")
+    # Сделки, пропущенные за время разрыва соединения, дозагружаются из REST
+    resync = StreamResync(BybitClient(), ws, category="spot").start()
 
-    # Подписка на все пары
+    # Подписка на все пары: несколько пакетных запросов subscribe вместо одного на пару
     print(f"🔌 Подключение к WebSocket для {len(TRADING_PAIRS)} пар...")
-    for symbol in TRADING_PAIRS:
-        ws.trade_stream(symbol=symbol, callback=monitor.trade_handler)
+    ws.subscribe_trades(TRADING_PAIRS, callback=resync.track_trades(monitor.trade_handler))
+    ws.wait_subscribed(timeout=10)
 
-    print(f"✅ Подписка завершена для {len(TRADING_PAIRS)} пар\n")
+    status = ws.subscription_status()
+    print(f"✅ Подписка завершена для {len(TRADING_PAIRS)} пар "
+          f"({status['frames']} запросов, отклонено топиков: {len(status['failed_topics'])})\n")
     sys.stdout.flush()
 
     # Периодическая сводка каждые 60 секунд
@@ -1,7 +1,6 @@
 """
 Клиент для работы с Hyperliquid API
 """
-from hyperliquid.info import Info
 from hyperliquid.utils import constants
 import logging
 
@@ -20,15 +19,29 @@ class HyperliquidClient:
 
         # Выбор базового URL
         if testnet:
-            base_url = constants.TESTNET_API_URL
+            self.base_url = constants.TESTNET_API_URL
         else:
-            base_url = constants.MAINNET_API_URL
+            self.base_url = constants.MAINNET_API_URL
 
-        # Инициализация Info клиента (для чтения данных)
-        self.info = Info(base_url=base_url, skip_ws=True)
+        # Info клиент создается при первом запросе (см. свойство info)
+        self._info = None
 
         logging.info(f"Hyperliquid клиент инициализирован ({'testnet' if testnet else 'mainnet'})")
 
+    @property
+    def info(self):
+        """
+        Info клиент SDK (для чтения данных).
+
+        Конструктор Info загружает метаданные по сети, поэтому SDK импортируется
+        и клиент создается при первом обращении, а не при создании HyperliquidClient.
+        """
+        if self._info is None:
+            from hyperliquid.info import Info
+
+            self._info = Info(base_url=self.base_url, skip_ws=True)
+        return self._info
+
     def get_all_mids(self):
         """
         Получить средние цены (mid prices) для всех активов
@@ -188,40 +201,33 @@ class HyperliquidClient:
             # Получаем все цены Hyperliquid
             hl_prices = self.get_multiple_tickers(symbols)
 
+            # Все spot тикеры Bybit одним запросом
+            bybit_tickers = bybit_client.get_market_snapshot(category="spot", parsed=True)
+
             for symbol in symbols:
                 hl_price = hl_prices.get(symbol)
 
                 if hl_price is None:
                     continue
 
-                # Получаем Bybit spot цену
-                bybit_symbol = f"{symbol}USDC"
-                try:
-                    bybit_data = bybit_client.get_tickers(category="spot", symbol=bybit_symbol)
-                    bybit_price = None
-
-                    if bybit_data['retCode'] == 0 and bybit_data['result']['list']:
-                        bybit_price = float(bybit_data['result']['list'][0]['lastPrice'])
+                ticker = bybit_tickers.get(f"{symbol}USDC")
+                bybit_price = ticker.last_price if ticker else None
 
-                    # Расчет спреда
-                    spread = None
-                    spread_percent = None
+                # Расчет спреда
+                spread = None
+                spread_percent = None
 
-                    if bybit_price and hl_price:
-                        spread = hl_price - bybit_price
-                        spread_percent = (spread / bybit_price) * 100
+                if bybit_price and hl_price:
+                    spread = hl_price - bybit_price
+                    spread_percent = (spread / bybit_price) * 100
 
-                    results.append({
-                        'symbol': symbol,
-                        'bybit_spot': bybit_price,
-                        'hyperliquid_futures': hl_price,
-                        'spread': spread,
-                        'spread_percent': spread_percent
-                    })
-
-                except Exception as e:
-                    logging.warning(f"Ошибка получения Bybit данных для {symbol}: {e}")
-                    continue
+                results.append({
+                    'symbol': symbol,
+                    'bybit_spot': bybit_price,
+                    'hyperliquid_futures': hl_price,
+                    'spread': spread,
+                    'spread_percent': spread_percent
+                })
 
             return results
 
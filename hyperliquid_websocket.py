@@ -1,8 +1,8 @@
 """
 WebSocket клиент для Hyperliquid
 """
-from hyperliquid.websocket_manager import WebsocketManager
 from hyperliquid.utils import constants
+import codec
 import logging
 import time
 from datetime import datetime
@@ -10,21 +10,77 @@ from collections import defaultdict
 import threading
 
 
+_codec_manager_class = None
+
+
+def codec_websocket_manager():
+    """
+    Класс WebsocketManager SDK с разбором сообщений быстрым JSON кодеком.
+
+    Создается при первом вызове: websocket_manager SDK (и websocket-client)
+    импортируется только при запуске соединения.
+    """
+    global _codec_manager_class
+    if _codec_manager_class is None:
+        from hyperliquid.websocket_manager import WebsocketManager, ws_msg_to_identifier
+
+        class CodecWebsocketManager(WebsocketManager):
+            def on_message(self, _ws, message):
+                if message == "Websocket connection established.":
+                    return
+                ws_msg = codec.loads(message)
+                identifier = ws_msg_to_identifier(ws_msg)
+                if identifier is None or identifier == "pong":
+                    return
+                for active_subscription in self.active_subscriptions[identifier]:
+                    active_subscription.callback(ws_msg)
+
+        _codec_manager_class = CodecWebsocketManager
+    return _codec_manager_class
+
+
 class HyperliquidWebSocket:
     """Класс для работы с Hyperliquid WebSocket"""
 
-    def __init__(self, testnet=False):
+    def __init__(self, testnet=False, clock=None, dispatcher=None, reconnect_interval=1.0):
         """
         Инициализация WebSocket клиента
 
         Args:
             testnet: Использовать testnet (по умолчанию False)
+            clock: ClockSync для поправки локальных часов при расчете задержек
+            dispatcher: utils.dispatch.Dispatcher - обработчики вызываются в его потоках,
+                        а не в потоке приема WebSocket (True - Dispatcher по умолчанию)
+            reconnect_interval: Период проверки соединения в секундах; при разрыве
+                                соединение открывается заново со всеми подписками
+                                (None - без переподключения)
         """
         self.testnet = testnet
+        self.clock = clock
+
+        # Свой Dispatcher останавливается в stop(), переданный извне - нет
+        self._owns_dispatcher = dispatcher is True
+        if dispatcher is True:
+            from utils.dispatch import Dispatcher
+
+            dispatcher = Dispatcher()
+        self.dispatcher = dispatcher
+        # Слияние allMids (subscribe_all_mids(conflate=...)), останавливаются в stop()
+        self._conflators = []
         self.subscriptions = {}
         self.callbacks = {}
         self.ws_manager = None
 
+        # Подписки и обработчики - по топику '<type>.<coin>' ('trades.BTC', 'l2Book.BTC', 'allMids')
+        # Переподключения: топик -> время последнего сообщения (мс, локальные часы), обработчики
+        self.reconnect_interval = reconnect_interval
+        self.topic_ts = {}
+        self.reconnects = 0
+        self._disconnect_listeners = []
+        self._reconnect_listeners = []
+        self._stop = threading.Event()
+        self._watchdog = None
+
         # Выбор базового URL
         if testnet:
             base_url = constants.TESTNET_API_URL
@@ -46,9 +102,9 @@ class HyperliquidWebSocket:
             callback = self._default_trade_handler
 
         for symbol in symbols:
-            subscription = {"type": "trades", "coin": symbol}
-            self.subscriptions[symbol] = subscription
-            self.callbacks[symbol] = callback
+            topic = f"trades.{symbol}"
+            self.subscriptions[topic] = {"type": "trades", "coin": symbol}
+            self.callbacks[topic] = callback
 
         logging.info(f"Подписка на trades для {len(symbols)} символов")
 
@@ -64,27 +120,70 @@ class HyperliquidWebSocket:
             callback = self._default_orderbook_handler
 
         for symbol in symbols:
-            subscription = {"type": "l2Book", "coin": symbol}
-            self.subscriptions[symbol] = subscription
-            self.callbacks[symbol] = callback
+            topic = f"l2Book.{symbol}"
+            self.subscriptions[topic] = {"type": "l2Book", "coin": symbol}
+            self.callbacks[topic] = callback
 
         logging.info(f"Подписка на orderbook для {len(symbols)} символов")
 
-    def subscribe_all_mids(self, callback=None):
+    def subscribe_all_mids(self, callback=None, conflate=None):
         """
         Подписка на все средние цены (all mids)
 
         Args:
             callback: Функция обработки данных
+            conflate: Интервал слияния в секундах. Если задан, хранится только последняя
+                      цена каждой монеты, а callback(changed) вызывается не чаще раза
+                      за интервал со словарем {монета: цена} изменившихся монет
+
+        Returns:
+            Conflator при conflate, иначе None
         """
-        if callback is None:
+        conflator = None
+        if conflate:
+            from utils.conflation import Conflator
+
+            conflator = Conflator(callback or self._default_conflated_mids_handler, conflate,
+                                  name="AllMidsConflator")
+            self._conflators.append(conflator)
+            callback = lambda message: self._conflate_mids(conflator, message)
+        elif callback is None:
             callback = self._default_all_mids_handler
 
         subscription = {"type": "allMids"}
-        self.subscriptions["all_mids"] = subscription
-        self.callbacks["all_mids"] = callback
+        self.subscriptions["allMids"] = subscription
+        self.callbacks["allMids"] = callback
 
         logging.info("Подписка на all mids")
+        return conflator
+
+    @staticmethod
+    def _conflate_mids(conflator, message):
+        """Разложить полный снимок allMids по монетам"""
+        data = message.get('data', message) if isinstance(message, dict) else {}
+        for coin, price in data.get('mids', {}).items():
+            conflator.update(coin, price)
+
+    def _dispatch(self, topic, callback):
+        dispatcher = self.dispatcher
+        return lambda message: dispatcher.submit(topic, callback, message)
+
+    def dispatch_stats(self):
+        """Глубина очередей и счетчики потерь dispatcher (None, если dispatcher не задан)"""
+        return self.dispatcher.stats() if self.dispatcher is not None else None
+
+    def latency_ms(self, exchange_ts, received_at=None):
+        """
+        Задержка сообщения: локальное время получения минус timestamp биржи (мс)
+
+        Args:
+            exchange_ts: Timestamp биржи (например, trade['time'])
+            received_at: Время получения (time.time()); по умолчанию - сейчас
+        """
+        if self.clock is not None:
+            return self.clock.latency_ms(exchange_ts, received_at)
+        received = received_at if received_at is not None else time.time()
+        return received * 1000 - float(exchange_ts)
 
     def _default_trade_handler(self, message):
         """Стандартный обработчик сделок"""
@@ -151,18 +250,81 @@ class HyperliquidWebSocket:
         except Exception as e:
             logging.error(f"Ошибка обработки all mids: {e}")
 
+    def _default_conflated_mids_handler(self, changed):
+        """Стандартный обработчик слитых средних цен"""
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        print(f"\n=== All Mids: изменилось {len(changed)} [{timestamp}] ===")
+        for symbol, price in sorted(changed.items())[:10]:
+            print(f"{symbol:8} {float(price):>12,.4f}")
+
+    def _track(self, topic, callback):
+        """Обработчик, запоминающий время последнего сообщения топика"""
+        def handler(message):
+            self.topic_ts[topic] = time.time() * 1000
+            callback(message)
+        return handler
+
+    def _connect(self):
+        """Создать WebsocketManager, подписаться на все подписки и запустить поток соединения"""
+        manager = codec_websocket_manager()(base_url=self.base_url)
+        manager.daemon = True
+
+        # Подписки до открытия соединения SDK ставит в очередь и отправляет в on_open
+        for topic, subscription in self.subscriptions.items():
+            callback = self.callbacks.get(topic, self._default_trade_handler)
+            if self.dispatcher is not None:
+                callback = self._dispatch(topic, callback)
+            manager.subscribe(subscription, self._track(topic, callback))
+
+        manager.start()
+        self.ws_manager = manager
+
+    def _watch(self):
+        """Проверка соединения: поток WebsocketManager завершается при разрыве"""
+        while not self._stop.wait(self.reconnect_interval):
+            if self.ws_manager is None or self.ws_manager.is_alive():
+                continue
+            last_seen = dict(self.topic_ts)
+            logging.warning("Hyperliquid WebSocket: соединение потеряно, переподключение...")
+            self._notify(self._disconnect_listeners, last_seen)
+            try:
+                self.ws_manager.stop()
+                self._connect()
+            except Exception as e:
+                logging.error(f"Ошибка переподключения WebSocket: {e}")
+                continue
+            self.reconnects += 1
+            logging.info(f"Hyperliquid WebSocket: переподключено, подписок: {len(self.subscriptions)}")
+            self._notify(self._reconnect_listeners, last_seen)
+
+    def _notify(self, listeners, last_seen):
+        for listener in list(listeners):
+            try:
+                listener(self, last_seen)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика переподключения: {e}")
+
+    def add_disconnect_listener(self, callback):
+        """Вызывать callback(client, last_seen) при разрыве, до открытия нового соединения"""
+        self._disconnect_listeners.append(callback)
+
+    def add_reconnect_listener(self, callback):
+        """
+        Вызывать callback(client, last_seen) после каждого переподключения
+
+        last_seen - {топик: время последнего сообщения до разрыва (мс)}.
+        Стакан l2Book приходит полным снимком и восстанавливается первым же сообщением.
+        """
+        self._reconnect_listeners.append(callback)
+
     def start(self):
         """Запуск WebSocket соединения"""
         try:
-            # Создаем WebSocket manager
-            self.ws_manager = WebsocketManager(base_url=self.base_url)
-
-            # Подписываемся на все добавленные подписки
-            for key, subscription in self.subscriptions.items():
-                callback = self.callbacks.get(key, self._default_trade_handler)
-
-                # Подписываемся
-                self.ws_manager.subscribe(subscription, callback)
+            self._connect()
+            if self.reconnect_interval and self._watchdog is None:
+                self._stop.clear()
+                self._watchdog = threading.Thread(target=self._watch, name="HyperliquidReconnect", daemon=True)
+                self._watchdog.start()
 
             logging.info("WebSocket соединения установлены")
             print("✅ WebSocket подключен к Hyperliquid")
@@ -186,9 +348,16 @@ class HyperliquidWebSocket:
     def stop(self):
         """Остановка WebSocket соединения"""
         try:
+            self._stop.set()
+            if self._watchdog:
+                self._watchdog.join(timeout=1)
+                self._watchdog = None
             if self.ws_manager:
-                # WebsocketManager автоматически закрывается при выходе
-                pass
+                self.ws_manager.stop()
+            for conflator in self._conflators:
+                conflator.stop()
+            if self._owns_dispatcher:
+                self.dispatcher.stop()
             logging.info("WebSocket соединение закрыто")
         except Exception as e:
             logging.error(f"Ошибка при закрытии WebSocket: {e}")
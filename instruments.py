@@ -0,0 +1,385 @@
+"""
+Кэш параметров инструментов Bybit и локальная проверка ордеров
+"""
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+import json
+import logging
+import os
+import threading
+import time
+
+
+# Не чаще чем раз в столько секунд обновлять кэш из-за ордера по неизвестному символу
+UNKNOWN_REFRESH_INTERVAL = 60
+
+
+def _decimal(value):
+    """Строка/число -> Decimal; пустое значение -> None"""
+    if value is None or value == '':
+        return None
+    return Decimal(str(value))
+
+
+def _format(value):
+    """Decimal -> строка без экспоненциальной записи"""
+    return format(value.normalize(), 'f')
+
+
+class InstrumentRules:
+    """Торговые ограничения инструмента: шаг цены, шаг количества, минимумы"""
+
+    __slots__ = ('category', 'symbol', 'status', 'tick_size', 'qty_step', 'min_qty', 'max_qty',
+                 'min_notional', 'min_price', 'max_price')
+
+    def __init__(self, category, symbol, status, tick_size, qty_step, min_qty, max_qty,
+                 min_notional=None, min_price=None, max_price=None):
+        self.category = category
+        self.symbol = symbol
+        self.status = status
+        self.tick_size = tick_size
+        self.qty_step = qty_step
+        self.min_qty = min_qty
+        self.max_qty = max_qty
+        self.min_notional = min_notional
+        self.min_price = min_price
+        self.max_price = max_price
+
+    @classmethod
+    def from_dict(cls, category, data):
+        """Создать из элемента ответа /v5/market/instruments-info"""
+        price_filter = data.get('priceFilter') or {}
+        lot = data.get('lotSizeFilter') or {}
+        return cls(
+            category,
+            data['symbol'],
+            data.get('status'),
+            _decimal(price_filter.get('tickSize')),
+            # spot: basePrecision, деривативы: qtyStep
+            _decimal(lot.get('qtyStep') or lot.get('basePrecision')),
+            _decimal(lot.get('minOrderQty')),
+            _decimal(lot.get('maxOrderQty') or lot.get('maxLimitOrderQty')),
+            _decimal(lot.get('minNotionalValue') or lot.get('minOrderAmt')),
+            _decimal(price_filter.get('minPrice')),
+            _decimal(price_filter.get('maxPrice')),
+        )
+
+    def to_dict(self):
+        """Сериализация для кэша на диске"""
+        return {name: (str(getattr(self, name)) if isinstance(getattr(self, name), Decimal)
+                       else getattr(self, name)) for name in self.__slots__}
+
+    @classmethod
+    def from_cache(cls, data):
+        """Восстановить из кэша на диске"""
+        return cls(**{name: (_decimal(value) if name not in ('category', 'symbol', 'status') else value)
+                      for name, value in data.items()})
+
+    def round_price(self, price):
+        """Округлить цену до ближайшего шага цены"""
+        price = _decimal(price)
+        if self.tick_size:
+            price = (price / self.tick_size).quantize(Decimal(1), rounding=ROUND_HALF_UP) * self.tick_size
+        return price
+
+    def round_qty(self, qty):
+        """Округлить количество вниз до шага количества"""
+        qty = _decimal(qty)
+        if self.qty_step:
+            qty = (qty / self.qty_step).quantize(Decimal(1), rounding=ROUND_DOWN) * self.qty_step
+        return qty
+
+    def prepare(self, qty, price=None, orderType="Limit", side=None, market_qty_in_quote=False,
+                reference_price=None):
+        """
+        Округлить и проверить параметры ордера
+
+        Args:
+            qty: Количество
+            price: Цена (для лимитных ордеров)
+            orderType: Market или Limit
+            side: Buy или Sell
+            market_qty_in_quote: qty задан в котируемой монете (spot Market Buy по умолчанию)
+            reference_price: Цена для проверки минимальной стоимости рыночного ордера
+
+        Returns:
+            tuple: (qty, price) строками, готовыми к отправке (price может быть None)
+
+        Raises:
+            ValueError: Если ордер будет отклонен биржей
+        """
+        if self.status and self.status != 'Trading':
+            raise ValueError(f"{self.symbol}: инструмент не торгуется (status={self.status})")
+        if orderType == "Limit" and price is None:
+            raise ValueError(f"{self.symbol}: для лимитного ордера нужна цена")
+
+        price_out = None
+        if price is not None and orderType != "Market":
+            rounded_price = self.round_price(price)
+            if rounded_price <= 0:
+                raise ValueError(f"{self.symbol}: цена {price} меньше шага {self.tick_size}")
+            if self.min_price and rounded_price < self.min_price:
+                raise ValueError(f"{self.symbol}: цена {price} ниже минимальной {self.min_price}")
+            if self.max_price and rounded_price > self.max_price:
+                raise ValueError(f"{self.symbol}: цена {price} выше максимальной {self.max_price}")
+            price_out = rounded_price
+
+        if market_qty_in_quote:
+            # Количество в котируемой монете: проверяем только минимальную сумму
+            quote_qty = _decimal(qty)
+            if self.min_notional and quote_qty < self.min_notional:
+                raise ValueError(f"{self.symbol}: сумма {qty} меньше минимальной {self.min_notional}")
+            return _format(quote_qty), None
+
+        rounded_qty = self.round_qty(qty)
+        if rounded_qty <= 0:
+            raise ValueError(f"{self.symbol}: количество {qty} меньше шага {self.qty_step}")
+        if self.min_qty and rounded_qty < self.min_qty:
+            raise ValueError(f"{self.symbol}: количество {qty} меньше минимального {self.min_qty}")
+        if self.max_qty and rounded_qty > self.max_qty:
+            raise ValueError(f"{self.symbol}: количество {qty} больше максимального {self.max_qty}")
+
+        notional_price = price_out if price_out is not None else _decimal(reference_price)
+        if self.min_notional and notional_price is not None:
+            notional = rounded_qty * notional_price
+            if notional < self.min_notional:
+                raise ValueError(f"{self.symbol}: стоимость ордера {_format(notional)} меньше "
+                                 f"минимальной {self.min_notional}")
+
+        return _format(rounded_qty), (_format(price_out) if price_out is not None else None)
+
+    def prepare_amend(self, qty=None, price=None):
+        """
+        Округлить и проверить новые qty/price изменяемого ордера
+
+        Returns:
+            tuple: (qty, price) строками; None - параметр не меняется
+
+        Raises:
+            ValueError: Если изменение будет отклонено биржей
+        """
+        qty_out = price_out = None
+        if price is not None:
+            rounded_price = self.round_price(price)
+            if rounded_price <= 0:
+                raise ValueError(f"{self.symbol}: цена {price} меньше шага {self.tick_size}")
+            if self.min_price and rounded_price < self.min_price:
+                raise ValueError(f"{self.symbol}: цена {price} ниже минимальной {self.min_price}")
+            if self.max_price and rounded_price > self.max_price:
+                raise ValueError(f"{self.symbol}: цена {price} выше максимальной {self.max_price}")
+            price_out = _format(rounded_price)
+        if qty is not None:
+            rounded_qty = self.round_qty(qty)
+            if rounded_qty <= 0:
+                raise ValueError(f"{self.symbol}: количество {qty} меньше шага {self.qty_step}")
+            if self.min_qty and rounded_qty < self.min_qty:
+                raise ValueError(f"{self.symbol}: количество {qty} меньше минимального {self.min_qty}")
+            if self.max_qty and rounded_qty > self.max_qty:
+                raise ValueError(f"{self.symbol}: количество {qty} больше максимального {self.max_qty}")
+            qty_out = _format(rounded_qty)
+        return qty_out, price_out
+
+
+class InstrumentCache:
+    """
+    Кэш параметров инструментов: загружается целиком по категориям,
+    хранится на диске и обновляется не чаще refresh_interval.
+
+    Устаревший кэш обновляется в фоновом потоке, а ордера до конца обновления
+    проверяются по прежним параметрам: place_order не ждет загрузки всех категорий.
+    Синхронно (при первом ордере) загружается только пустой кэш.
+
+    Ордер по инструменту, которого нет в кэше (категория вне categories или
+    символ, добавленный биржей после обновления), отправляется без изменений -
+    его проверит биржа; для новых символов запускается фоновое обновление.
+    """
+
+    def __init__(self, client, path='data/instruments.json', refresh_interval=3600,
+                 categories=('spot', 'linear', 'inverse')):
+        """
+        Args:
+            client: Экземпляр BybitClient
+            path: Файл кэша на диске (None - не сохранять)
+            refresh_interval: Через сколько секунд данные считаются устаревшими
+            categories: Загружаемые категории
+        """
+        self.client = client
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.categories = tuple(categories)
+        self.updated_at = None
+        self._rules = {}
+        self._lock = threading.Lock()
+        # Одно обновление за раз; поток фонового обновления
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._unknown_refresh_at = 0.0
+
+    def _fetch_category(self, category):
+        """Загрузить все инструменты категории (с пагинацией)"""
+        rules = {}
+        cursor = None
+        while True:
+            params = {"category": category, "limit": 1000}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get_instruments_info(**params)
+            result = response['result']
+            for item in result.get('list', []):
+                rules[item['symbol']] = InstrumentRules.from_dict(category, item)
+            cursor = result.get('nextPageCursor')
+            if not cursor:
+                return rules
+
+    def refresh(self):
+        """Загрузить параметры всех категорий с биржи и сохранить на диск"""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Обновление (под self._refresh_lock)"""
+        rules = {}
+        for category in self.categories:
+            for symbol, item in self._fetch_category(category).items():
+                rules[(category, symbol)] = item
+
+        with self._lock:
+            self._rules = rules
+            self.updated_at = time.time()
+        self._save()
+        logging.info(f"Параметры инструментов обновлены: {len(rules)} инструментов")
+
+    def _refresh_in_background(self):
+        """Запустить обновление в фоновом потоке, если оно еще не идет"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._background_refresh,
+                                                    name="InstrumentRefresh", daemon=True)
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Ордера проверяются по прежним параметрам, следующая попытка - при следующем ордере
+            logging.error(f"Ошибка обновления параметров инструментов: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {
+                'updated_at': self.updated_at,
+                'instruments': [rules.to_dict() for rules in self._rules.values()],
+            }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _load_from_disk(self):
+        """Загрузить кэш с диска, если он есть и не устарел"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось прочитать кэш инструментов {self.path}: {e}")
+            return False
+
+        if time.time() - data.get('updated_at', 0) > self.refresh_interval:
+            return False
+        rules = {}
+        for item in data.get('instruments', []):
+            if item['category'] in self.categories:
+                rules[(item['category'], item['symbol'])] = InstrumentRules.from_cache(item)
+        with self._lock:
+            self._rules = rules
+            self.updated_at = data['updated_at']
+        logging.info(f"Параметры инструментов загружены с диска: {len(rules)} инструментов")
+        return True
+
+    def load(self):
+        """Загрузить параметры: с диска, если кэш свежий, иначе с биржи"""
+        if not self._load_from_disk():
+            self.refresh()
+        return self
+
+    def ensure_fresh(self):
+        """
+        Загрузить параметры, если кэш пуст (синхронно, один поток загружает - остальные ждут),
+        либо запустить фоновое обновление, если прошло больше refresh_interval
+        """
+        if self.updated_at is None:
+            with self._refresh_lock:
+                if self.updated_at is None and not self._load_from_disk():
+                    self._refresh()
+        elif time.time() - self.updated_at > self.refresh_interval:
+            self._refresh_in_background()
+
+    def get(self, category, symbol):
+        """Параметры инструмента или None"""
+        return self._rules.get((category, symbol))
+
+    def _rules_for(self, category, symbol):
+        """
+        Параметры инструмента для проверки ордера или None (ордер отправляется без проверки)
+
+        Неизвестный символ загружаемой категории мог появиться после обновления:
+        запускается фоновое обновление (не чаще UNKNOWN_REFRESH_INTERVAL).
+        """
+        if category not in self.categories:
+            return None
+        self.ensure_fresh()
+        rules = self.get(category, symbol)
+        if rules is None:
+            logging.info(f"{category}/{symbol}: нет в кэше инструментов, ордер проверит биржа")
+            now = time.time()
+            if now - self._unknown_refresh_at > UNKNOWN_REFRESH_INTERVAL:
+                self._unknown_refresh_at = now
+                self._refresh_in_background()
+        return rules
+
+    def prepare_order(self, category, symbol, side, orderType, qty, price=None, **kwargs):
+        """
+        Округлить и проверить ордер локально
+
+        Returns:
+            tuple: (qty, price) строками; для инструмента не из кэша - без изменений
+
+        Raises:
+            ValueError: Если ордер будет отклонен биржей
+        """
+        rules = self._rules_for(category, symbol)
+        if rules is None:
+            return qty, price
+
+        market_qty_in_quote = (
+            category == 'spot' and orderType == 'Market' and side == 'Buy'
+            and kwargs.get('marketUnit') != 'baseCoin'
+        )
+        return rules.prepare(qty, price, orderType=orderType, side=side,
+                             market_qty_in_quote=market_qty_in_quote)
+
+    def prepare_amend(self, category, symbol, qty=None, price=None):
+        """
+        Округлить и проверить изменение ордера локально
+
+        Returns:
+            tuple: (qty, price) строками; None - параметр не меняется;
+                   для инструмента не из кэша - без изменений
+
+        Raises:
+            ValueError: Если изменение будет отклонено биржей
+        """
+        rules = self._rules_for(category, symbol)
+        if rules is None:
+            return qty, price
+        return rules.prepare_amend(qty, price)
+
+    def __len__(self):
+        return len(self._rules)
@@ -0,0 +1,130 @@
+"""
+Параллельная загрузка истории свечей Bybit за произвольный период
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+
+# Максимум свечей в одном ответе /v5/market/kline
+KLINE_MAX_LIMIT = 1000
+
+_MINUTE_MS = 60 * 1000
+_SPECIAL_INTERVALS_MS = {
+    'D': 24 * 60 * _MINUTE_MS,
+    'W': 7 * 24 * 60 * _MINUTE_MS,
+    'M': 31 * 24 * 60 * _MINUTE_MS,  # верхняя оценка; перекрытия окон убираются дедупликацией
+}
+
+
+def interval_to_ms(interval):
+    """
+    Длительность интервала свечи в миллисекундах
+
+    Args:
+        interval: Интервал Bybit (1, 3, 5, 15, 30, 60, 120, 240, 360, 720, D, W, M)
+    """
+    interval = str(interval)
+    if interval in _SPECIAL_INTERVALS_MS:
+        return _SPECIAL_INTERVALS_MS[interval]
+    return int(interval) * _MINUTE_MS
+
+
+def to_ms(value):
+    """Перевести datetime или timestamp (секунды/миллисекунды) в миллисекунды"""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    value = int(value)
+    # Значения меньше 10^11 считаем секундами
+    return value * 1000 if value < 10**11 else value
+
+
+def split_windows(start, end, interval, limit=KLINE_MAX_LIMIT):
+    """
+    Разбить период на окна, каждое из которых помещается в один запрос
+
+    Args:
+        start: Начало периода (мс, включительно)
+        end: Конец периода (мс, включительно)
+        interval: Интервал свечей
+        limit: Свечей на запрос
+
+    Returns:
+        list: [(window_start, window_end), ...] в миллисекундах
+    """
+    step = interval_to_ms(interval)
+    # Выравниваем начало по сетке свечей
+    start = start - start % step if step < _SPECIAL_INTERVALS_MS['W'] else start
+    windows = []
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + step * (limit - 1), end)
+        windows.append((window_start, window_end))
+        window_start = window_end + step
+    return windows
+
+
+def backfill_klines(client, symbols, interval, start, end, category="spot",
+                    max_workers=8, limit=KLINE_MAX_LIMIT):
+    """
+    Загрузить историю свечей для нескольких символов параллельно
+
+    Период делится на окна по limit свечей, окна запрашиваются в пуле потоков.
+    Соблюдение лимитов биржи обеспечивает планировщик клиента (RateLimitScheduler).
+
+    Args:
+        client: Экземпляр BybitClient
+        symbols: Список символов (например, TRADING_PAIRS)
+        interval: Интервал свечей (1, 3, 5, ..., D, W, M)
+        start: Начало периода (datetime или timestamp)
+        end: Конец периода (datetime или timestamp)
+        category: Тип рынка
+        max_workers: Количество параллельных запросов
+        limit: Свечей на запрос (макс 1000)
+
+    Returns:
+        dict: {symbol: [[startTime, open, high, low, close, volume, turnover], ...]}
+              свечи в формате Bybit, отсортированы по времени без дубликатов
+    """
+    start_ms = to_ms(start)
+    end_ms = to_ms(end)
+    if start_ms > end_ms:
+        raise ValueError("Начало периода позже конца")
+
+    windows = split_windows(start_ms, end_ms, interval, limit)
+    tasks = [(symbol, window) for symbol in symbols for window in windows]
+    logging.info(f"Загрузка истории: {len(symbols)} символов, {len(windows)} окон, "
+                 f"{len(tasks)} запросов (interval={interval})")
+
+    def fetch(task):
+        symbol, (window_start, window_end) = task
+        response = client.get_kline(
+            category=category,
+            symbol=symbol,
+            interval=interval,
+            limit=limit,
+            start=window_start,
+            end=window_end,
+            use_cache=False
+        )
+        return symbol, response['result']['list']
+
+    candles = {symbol: {} for symbol in symbols}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for symbol, rows in executor.map(fetch, tasks):
+            by_time = candles[symbol]
+            for row in rows:
+                # Дедупликация по времени открытия свечи на границах окон
+                by_time[int(row[0])] = row
+
+    result = {}
+    for symbol, by_time in candles.items():
+        result[symbol] = [by_time[ts] for ts in sorted(by_time)]
+
+        expected = len(range(start_ms - start_ms % interval_to_ms(interval), end_ms + 1,
+                             interval_to_ms(interval)))
+        if str(interval) not in _SPECIAL_INTERVALS_MS and len(result[symbol]) < expected:
+            logging.warning(f"{symbol}: получено {len(result[symbol])} из {expected} свечей "
+                            f"(пропуски в истории биржи или символ появился позже)")
+
+    return result
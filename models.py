@@ -0,0 +1,306 @@
+"""
+Компактные типизированные модели ответов Bybit API
+
+Числовые поля разбираются один раз при создании объекта; __slots__
+убирает словарь атрибутов у каждого экземпляра.
+"""
+
+
+def _float(value):
+    """Строка Bybit -> float; пустая строка или None -> None"""
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _int(value):
+    """Строка Bybit -> int; пустая строка или None -> None"""
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+class Ticker:
+    """Тикер инструмента (/v5/market/tickers, поток tickers.{symbol})"""
+
+    __slots__ = ('symbol', 'last_price', 'bid_price', 'bid_size', 'ask_price', 'ask_size',
+                 'high_24h', 'low_24h', 'volume_24h', 'turnover_24h', 'change_24h',
+                 'mark_price', 'index_price', 'funding_rate', 'open_interest')
+
+    def __init__(self, symbol, last_price, bid_price=None, bid_size=None, ask_price=None,
+                 ask_size=None, high_24h=None, low_24h=None, volume_24h=None, turnover_24h=None,
+                 change_24h=None, mark_price=None, index_price=None, funding_rate=None,
+                 open_interest=None):
+        self.symbol = symbol
+        self.last_price = last_price
+        self.bid_price = bid_price
+        self.bid_size = bid_size
+        self.ask_price = ask_price
+        self.ask_size = ask_size
+        self.high_24h = high_24h
+        self.low_24h = low_24h
+        self.volume_24h = volume_24h
+        self.turnover_24h = turnover_24h
+        self.change_24h = change_24h
+        self.mark_price = mark_price
+        self.index_price = index_price
+        self.funding_rate = funding_rate
+        self.open_interest = open_interest
+
+    @classmethod
+    def from_dict(cls, data):
+        """Создать из словаря тикера Bybit"""
+        get = data.get
+        return cls(
+            get('symbol'),
+            _float(get('lastPrice')),
+            _float(get('bid1Price')),
+            _float(get('bid1Size')),
+            _float(get('ask1Price')),
+            _float(get('ask1Size')),
+            _float(get('highPrice24h')),
+            _float(get('lowPrice24h')),
+            _float(get('volume24h')),
+            _float(get('turnover24h')),
+            _float(get('price24hPcnt')),
+            _float(get('markPrice')),
+            _float(get('indexPrice')),
+            _float(get('fundingRate')),
+            _float(get('openInterest')),
+        )
+
+    @property
+    def mid_price(self):
+        """Середина спреда (или последняя цена, если стакан пуст)"""
+        if self.bid_price and self.ask_price:
+            return (self.bid_price + self.ask_price) / 2
+        return self.last_price
+
+    def __repr__(self):
+        return f"Ticker({self.symbol}, last={self.last_price}, bid={self.bid_price}, ask={self.ask_price})"
+
+
+class Kline:
+    """Свеча (/v5/market/kline или поток kline.{interval}.{symbol})"""
+
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume', 'turnover')
+
+    def __init__(self, start, open, high, low, close, volume, turnover=None):
+        self.start = start
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.turnover = turnover
+
+    @classmethod
+    def from_list(cls, row):
+        """Создать из строки REST ответа [startTime, open, high, low, close, volume, turnover]"""
+        return cls(int(row[0]), float(row[1]), float(row[2]), float(row[3]),
+                   float(row[4]), float(row[5]), _float(row[6]) if len(row) > 6 else None)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Создать из сообщения WebSocket потока kline"""
+        return cls(int(data['start']), float(data['open']), float(data['high']),
+                   float(data['low']), float(data['close']), float(data['volume']),
+                   _float(data.get('turnover')))
+
+    def __repr__(self):
+        return (f"Kline({self.start}, O={self.open}, H={self.high}, L={self.low}, "
+                f"C={self.close}, V={self.volume})")
+
+
+class OrderBookLevel:
+    """Уровень стакана: цена и объем"""
+
+    __slots__ = ('price', 'size')
+
+    def __init__(self, price, size):
+        self.price = price
+        self.size = size
+
+    @classmethod
+    def from_list(cls, level):
+        """Создать из уровня Bybit ['price', 'size']"""
+        return cls(float(level[0]), float(level[1]))
+
+    def __repr__(self):
+        return f"OrderBookLevel({self.price}, {self.size})"
+
+
+class Order:
+    """Ордер (/v5/order/realtime, поток order)"""
+
+    __slots__ = ('order_id', 'order_link_id', 'symbol', 'side', 'order_type', 'price', 'qty',
+                 'leaves_qty', 'cum_exec_qty', 'avg_price', 'status', 'time_in_force',
+                 'created_time', 'updated_time', 'category')
+
+    def __init__(self, order_id, order_link_id, symbol, side, order_type, price, qty,
+                 leaves_qty=None, cum_exec_qty=None, avg_price=None, status=None,
+                 time_in_force=None, created_time=None, updated_time=None, category=None):
+        self.order_id = order_id
+        self.order_link_id = order_link_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.qty = qty
+        self.leaves_qty = leaves_qty
+        self.cum_exec_qty = cum_exec_qty
+        self.avg_price = avg_price
+        self.status = status
+        self.time_in_force = time_in_force
+        self.created_time = created_time
+        self.updated_time = updated_time
+        self.category = category
+
+    @classmethod
+    def from_dict(cls, data, category=None):
+        """Создать из словаря ордера Bybit"""
+        get = data.get
+        return cls(
+            get('orderId'),
+            get('orderLinkId'),
+            get('symbol'),
+            get('side'),
+            get('orderType'),
+            _float(get('price')),
+            _float(get('qty')),
+            _float(get('leavesQty')),
+            _float(get('cumExecQty')),
+            _float(get('avgPrice')),
+            get('orderStatus'),
+            get('timeInForce'),
+            _int(get('createdTime')),
+            _int(get('updatedTime')),
+            get('category', category),
+        )
+
+    def __repr__(self):
+        return (f"Order({self.order_id}, {self.symbol} {self.side} {self.qty}@{self.price}, "
+                f"{self.status})")
+
+
+class Balance:
+    """Баланс монеты (/v5/account/wallet-balance, поток wallet)"""
+
+    __slots__ = ('coin', 'wallet_balance', 'equity', 'available', 'locked', 'usd_value',
+                 'unrealised_pnl')
+
+    def __init__(self, coin, wallet_balance, equity=None, available=None, locked=None,
+                 usd_value=None, unrealised_pnl=None):
+        self.coin = coin
+        self.wallet_balance = wallet_balance
+        self.equity = equity
+        self.available = available
+        self.locked = locked
+        self.usd_value = usd_value
+        self.unrealised_pnl = unrealised_pnl
+
+    @classmethod
+    def from_dict(cls, data):
+        """Создать из элемента coin[] ответа баланса"""
+        get = data.get
+        return cls(
+            get('coin'),
+            _float(get('walletBalance')),
+            _float(get('equity')),
+            _float(get('availableToWithdraw')),
+            _float(get('locked')),
+            _float(get('usdValue')),
+            _float(get('unrealisedPnl')),
+        )
+
+    def __repr__(self):
+        return f"Balance({self.coin}, {self.wallet_balance})"
+
+
+class Position:
+    """Позиция (/v5/position/list, поток position)"""
+
+    __slots__ = ('symbol', 'side', 'size', 'avg_price', 'mark_price', 'position_value',
+                 'unrealised_pnl', 'cum_realised_pnl', 'leverage', 'liq_price', 'position_idx',
+                 'updated_time', 'category')
+
+    def __init__(self, symbol, side, size, avg_price=None, mark_price=None, position_value=None,
+                 unrealised_pnl=None, cum_realised_pnl=None, leverage=None, liq_price=None,
+                 position_idx=0, updated_time=None, category=None):
+        self.symbol = symbol
+        self.side = side
+        self.size = size
+        self.avg_price = avg_price
+        self.mark_price = mark_price
+        self.position_value = position_value
+        self.unrealised_pnl = unrealised_pnl
+        self.cum_realised_pnl = cum_realised_pnl
+        self.leverage = leverage
+        self.liq_price = liq_price
+        self.position_idx = position_idx
+        self.updated_time = updated_time
+        self.category = category
+
+    @classmethod
+    def from_dict(cls, data, category=None):
+        """Создать из словаря позиции Bybit (REST: avgPrice, поток: entryPrice)"""
+        get = data.get
+        return cls(
+            get('symbol'),
+            get('side'),
+            _float(get('size')) or 0.0,
+            _float(get('avgPrice') or get('entryPrice')),
+            _float(get('markPrice')),
+            _float(get('positionValue')),
+            _float(get('unrealisedPnl')),
+            _float(get('cumRealisedPnl')),
+            _float(get('leverage')),
+            _float(get('liqPrice')),
+            _int(get('positionIdx')) or 0,
+            _int(get('updatedTime')),
+            get('category', category),
+        )
+
+    def __repr__(self):
+        return f"Position({self.symbol} {self.side} {self.size}@{self.avg_price})"
+
+
+# === Разбор ответов REST ===
+
+def parse_tickers(response):
+    """Ответ get_tickers -> {symbol: Ticker}"""
+    return {item['symbol']: Ticker.from_dict(item) for item in response['result']['list']}
+
+
+def parse_klines(response):
+    """Ответ get_kline -> [Kline, ...] по возрастанию времени"""
+    return [Kline.from_list(row) for row in reversed(response['result']['list'])]
+
+
+def parse_orderbook(response):
+    """Ответ get_orderbook -> (bids, asks) списки OrderBookLevel от лучшей цены"""
+    result = response['result']
+    bids = [OrderBookLevel.from_list(level) for level in result.get('b', [])]
+    asks = [OrderBookLevel.from_list(level) for level in result.get('a', [])]
+    return bids, asks
+
+
+def parse_orders(response):
+    """Ответ get_open_orders -> [Order, ...]"""
+    category = response['result'].get('category')
+    return [Order.from_dict(item, category) for item in response['result']['list']]
+
+
+def parse_balances(response):
+    """Ответ get_wallet_balance -> {coin: Balance}"""
+    balances = {}
+    for account in response['result']['list']:
+        for item in account.get('coin', []):
+            balances[item['coin']] = Balance.from_dict(item)
+    return balances
+
+
+def parse_positions(response):
+    """Ответ get_positions -> [Position, ...]"""
+    category = response['result'].get('category')
+    return [Position.from_dict(item, category) for item in response['result']['list']]
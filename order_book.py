@@ -0,0 +1,327 @@
+"""
+Локальный стакан L2 по потоку orderbook.{depth}.{symbol} Bybit (snapshot + delta)
+"""
+from bisect import bisect_left
+from collections import deque
+import logging
+import threading
+
+
+# Сколько delta хранить, пока стакан ждет снимка (для применения после снимка REST)
+PENDING_DELTAS_LIMIT = 1000
+
+
+class _BookSide:
+    """
+    Сторона стакана: словарь цена -> объем и отсортированный по возрастанию список цен.
+
+    Изменение объема существующего уровня - O(1) (словарь), лучшая цена - O(1):
+    последний элемент списка для bids, первый - для asks. Добавление и удаление
+    уровня - поиск O(log n) (bisect) плюс сдвиг списка O(n); для глубины до 500
+    уровней это один memmove, что быстрее дерева на объектах Python.
+    """
+
+    __slots__ = ('sizes', 'prices', 'is_bid')
+
+    def __init__(self, is_bid):
+        self.sizes = {}
+        self.prices = []
+        self.is_bid = is_bid
+
+    def clear(self):
+        self.sizes.clear()
+        self.prices.clear()
+
+    def set(self, price, size):
+        """Установить объем уровня (size == 0 - удалить уровень)"""
+        if size == 0:
+            if self.sizes.pop(price, None) is not None:
+                index = bisect_left(self.prices, price)
+                del self.prices[index]
+            return
+        if price not in self.sizes:
+            index = bisect_left(self.prices, price)
+            self.prices.insert(index, price)
+        self.sizes[price] = size
+
+    def best(self):
+        """(цена, объем) лучшего уровня или None"""
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.is_bid else self.prices[0]
+        return price, self.sizes[price]
+
+    def levels(self, limit=None):
+        """Уровни от лучшей цены: [(цена, объем), ...]"""
+        prices = self.prices
+        if self.is_bid:
+            selected = prices[::-1] if limit is None else prices[:-limit - 1:-1]
+        else:
+            selected = prices if limit is None else prices[:limit]
+        return [(price, self.sizes[price]) for price in selected]
+
+    def __len__(self):
+        return len(self.prices)
+
+
+class OrderBook:
+    """
+    Стакан одного символа.
+
+    apply() принимает сырые сообщения Bybit (type snapshot/delta) и проверяет
+    порядок по u (update id) и seq. Если порядок нарушен, стакан помечается
+    несинхронизированным (synced = False) до следующего snapshot.
+
+    По умолчанию каждый delta должен иметь u = предыдущий u + 1: потерянное
+    сообщение - это пропуск. Без strict_sequence пропуск u только учитывается
+    в skipped_updates, а стакан продолжает обновляться.
+
+    Пока стакан не синхронизирован, delta сохраняются (до PENDING_DELTAS_LIMIT):
+    load_snapshot() применяет снимок REST и затем сохраненные delta новее него.
+    """
+
+    def __init__(self, symbol, depth, strict_sequence=True):
+        """
+        Args:
+            symbol: Символ пары
+            depth: Глубина подписки (1, 50, 200, 500)
+            strict_sequence: Требовать u = предыдущий u + 1 для каждого delta
+                             (False - пропуски u только считаются и логируются)
+        """
+        self.symbol = symbol
+        self.depth = depth
+        self.strict_sequence = strict_sequence
+        self.bids = _BookSide(is_bid=True)
+        self.asks = _BookSide(is_bid=False)
+        self.update_id = None
+        self.seq = None
+        self.ts = None
+        self.synced = False
+        self.skipped_updates = 0
+        self._pending = deque(maxlen=PENDING_DELTAS_LIMIT)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _apply_levels(side, levels):
+        for price, size in levels:
+            side.set(float(price), float(size))
+
+    def apply(self, message):
+        """
+        Применить сообщение потока orderbook
+
+        Returns:
+            str: 'snapshot', 'delta', 'stale' (устаревшее сообщение пропущено),
+                 'gap' (нарушен порядок, нужен новый snapshot) или
+                 'unsynced' (delta до получения snapshot пропущен)
+        """
+        data = message['data']
+        update_id = data.get('u')
+        seq = data.get('seq')
+
+        with self._lock:
+            # u == 1 - snapshot после перезапуска сервиса биржи
+            if message.get('type') == 'snapshot' or update_id == 1:
+                self.bids.clear()
+                self.asks.clear()
+                self._apply_levels(self.bids, data.get('b', ()))
+                self._apply_levels(self.asks, data.get('a', ()))
+                self.update_id, self.seq, self.ts = update_id, seq, message.get('ts')
+                self.synced = True
+                self._pending.clear()
+                return 'snapshot'
+
+            if not self.synced:
+                self._pending.append(message)
+                return 'unsynced'
+            return self._apply_delta(message)
+
+    def _apply_delta(self, message):
+        """Применить delta к синхронизированному стакану (под self._lock)"""
+        data = message['data']
+        update_id = data.get('u')
+        seq = data.get('seq')
+        if update_id is not None and self.update_id is not None:
+            if update_id <= self.update_id:
+                return 'stale'
+            if update_id != self.update_id + 1:
+                if self.strict_sequence:
+                    self.synced = False
+                    # Delta после пропуска пригодится, если снимок REST окажется старше него
+                    self._pending.append(message)
+                    return 'gap'
+                self.skipped_updates += update_id - self.update_id - 1
+                logging.warning(f"Стакан {self.symbol}: пропущены обновления "
+                                f"u={self.update_id + 1}..{update_id - 1}")
+        if seq is not None and self.seq is not None and seq < self.seq:
+            self.synced = False
+            return 'gap'
+
+        self._apply_levels(self.bids, data.get('b', ()))
+        self._apply_levels(self.asks, data.get('a', ()))
+        self.update_id, self.seq, self.ts = update_id, seq, message.get('ts')
+
+        best_bid, best_ask = self.bids.best(), self.asks.best()
+        if best_bid and best_ask and best_bid[0] >= best_ask[0]:
+            # Пересекшийся стакан - признак пропущенного обновления
+            self.synced = False
+            return 'gap'
+        return 'delta'
+
+    def invalidate(self):
+        """Пометить стакан несинхронизированным до следующего снимка (например, при разрыве соединения)"""
+        with self._lock:
+            self.synced = False
+            self._pending.clear()
+
+    def load_snapshot(self, data, ts=None):
+        """
+        Загрузить снимок стакана из REST (result get_orderbook: s, b, a, u, seq)
+        и применить сохраненные delta новее снимка
+
+        u снимка REST совпадает с u потока WebSocket только для одной глубины
+        (см. stream_resync.REST_SNAPSHOT_DEPTH); для других глубин нужен snapshot
+        самого потока. Снимок не применяется к синхронизированному стакану.
+
+        Returns:
+            bool: True, если стакан синхронизирован снимком
+        """
+        with self._lock:
+            if self.synced:
+                return False
+            self.bids.clear()
+            self.asks.clear()
+            self._apply_levels(self.bids, data.get('b', ()))
+            self._apply_levels(self.asks, data.get('a', ()))
+            self.update_id, self.seq = data.get('u'), data.get('seq')
+            self.ts = ts if ts is not None else data.get('ts')
+            self.synced = True
+
+            pending = sorted(self._pending, key=lambda message: message['data'].get('u') or 0)
+            self._pending.clear()
+            for message in pending:
+                if self._apply_delta(message) == 'gap':
+                    # Снимок старше сохраненных delta: ждем следующий снимок
+                    logging.warning(f"Стакан {self.symbol}: снимок REST u={data.get('u')} не стыкуется с delta")
+                    return False
+            return True
+
+    def best_bid(self):
+        """(цена, объем) лучшей заявки на покупку или None"""
+        with self._lock:
+            return self.bids.best()
+
+    def best_ask(self):
+        """(цена, объем) лучшей заявки на продажу или None"""
+        with self._lock:
+            return self.asks.best()
+
+    def mid_price(self):
+        """Середина спреда или None"""
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def spread(self):
+        """Спред (ask - bid) или None"""
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return ask[0] - bid[0]
+
+    def snapshot(self, limit=None):
+        """
+        Копия стакана
+
+        Returns:
+            dict: {'symbol', 'bids': [(цена, объем), ...], 'asks': [...], 'u', 'seq', 'ts', 'synced'}
+        """
+        with self._lock:
+            return {
+                'symbol': self.symbol,
+                'bids': self.bids.levels(limit),
+                'asks': self.asks.levels(limit),
+                'u': self.update_id,
+                'seq': self.seq,
+                'ts': self.ts,
+                'synced': self.synced,
+            }
+
+    def __repr__(self):
+        return (f"OrderBook({self.symbol}, bid={self.bids.best()}, ask={self.asks.best()}, "
+                f"u={self.update_id}, synced={self.synced})")
+
+
+class OrderBookManager:
+    """
+    Локальные стаканы для набора символов по одному WebSocket клиенту.
+
+    Сообщения приходят без слияния в pybit (subscribe_orderbook(raw=True)),
+    поэтому pybit не копирует стакан на каждое сообщение; изменение объема уровня
+    стоит O(1), добавление или удаление уровня - O(log n) поиск и сдвиг списка.
+    """
+
+    def __init__(self, ws_client, symbols, depth=50, callback=None, on_gap=None,
+                 strict_sequence=True, on_snapshot=None):
+        """
+        Args:
+            ws_client: BybitWebSocketClient
+            symbols: Список символов
+            depth: Глубина стакана (1, 50, 200, 500)
+            callback: Функция callback(book) после каждого применения snapshot/delta
+            on_gap: Функция on_gap(book) при нарушении порядка обновлений
+            strict_sequence: Требовать последовательных u (см. OrderBook, по умолчанию True)
+            on_snapshot: Функция on_snapshot(book) после snapshot потока (стакан синхронизирован)
+        """
+        self.ws_client = ws_client
+        self.depth = depth
+        self.callback = callback
+        self.on_gap = on_gap
+        self.on_snapshot = on_snapshot
+        self.books = {symbol: OrderBook(symbol, depth, strict_sequence) for symbol in symbols}
+        self.stats = {'snapshot': 0, 'delta': 0, 'stale': 0, 'gap': 0, 'unsynced': 0}
+
+    def start(self):
+        """Подписаться на поток стаканов всех символов"""
+        self.ws_client.subscribe_orderbook(list(self.books), depth=self.depth,
+                                           callback=self.on_message, raw=True)
+        return self
+
+    def on_message(self, message):
+        """Обработчик сырых сообщений orderbook.{depth}.{symbol}"""
+        try:
+            symbol = message['data']['s']
+            book = self.books.get(symbol)
+            if book is None:
+                return
+            result = book.apply(message)
+            self.stats[result] += 1
+            if result == 'gap':
+                logging.warning(f"Стакан {symbol}: нарушен порядок обновлений (u={message['data'].get('u')}), "
+                                f"требуется пересинхронизация")
+                if self.on_gap is not None:
+                    self.on_gap(book)
+                return
+            if result == 'snapshot' and self.on_snapshot is not None:
+                self.on_snapshot(book)
+            if result in ('snapshot', 'delta') and self.callback is not None:
+                self.callback(book)
+        except Exception as e:
+            logging.error(f"Ошибка обработки стакана: {e}")
+
+    def book(self, symbol):
+        """OrderBook символа или None"""
+        return self.books.get(symbol)
+
+    def best_bid(self, symbol):
+        """(цена, объем) лучшей заявки на покупку или None"""
+        book = self.books.get(symbol)
+        return book.best_bid() if book else None
+
+    def best_ask(self, symbol):
+        """(цена, объем) лучшей заявки на продажу или None"""
+        book = self.books.get(symbol)
+        return book.best_ask() if book else None
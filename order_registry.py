@@ -0,0 +1,335 @@
+"""
+Реестр открытых ордеров в памяти: ответы REST + приватный поток order
+"""
+from models import Order
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+
+# Статусы, после которых ордер больше не открыт
+FINAL_STATUSES = {
+    'Filled',
+    'Cancelled',
+    'Rejected',
+    'Deactivated',
+    'PartiallyFilledCanceled',
+}
+
+# Сколько закрытых orderId помнить, чтобы запоздавшие сообщения не воскресили ордер
+CLOSED_HISTORY_SIZE = 10000
+
+
+class OrderRegistry:
+    """
+    Открытые ордера аккаунта в памяти.
+
+    Ордер добавляется по ответу place_order (предварительно, со статусом New),
+    уточняется и закрывается сообщениями потока order и ответами cancel_order.
+    Фоновая сверка с REST (get_open_orders) исправляет расхождения, например
+    после разрыва WebSocket соединения.
+
+    Индексы: orderId, orderLinkId -> orderId, (category, symbol, side) -> {orderId}.
+    """
+
+    def __init__(self, client, ws=None, categories=("linear",), settle_coins=("USDT",),
+                 reconcile_interval=30.0):
+        """
+        Args:
+            client: Экземпляр BybitClient
+            ws: BybitWebSocketClient с channel_type="private" (None - только ответы REST и сверка)
+            categories: Категории, ордера которых хранятся в реестре
+            settle_coins: Монеты расчетов для сверки linear/inverse без указания символа
+            reconcile_interval: Период сверки с REST в секундах (None - без фоновой сверки)
+        """
+        self.client = client
+        self.ws = ws
+        self.categories = tuple(categories)
+        self.settle_coins = tuple(settle_coins)
+        self.reconcile_interval = reconcile_interval
+
+        self._orders = {}
+        self._links = {}
+        self._index = {}
+        self._closed = OrderedDict()
+        self._synced = set()
+        self._lock = threading.RLock()
+
+        self.reconciled_at = None
+        self.drift = {'added': 0, 'removed': 0, 'updated': 0}
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # === Запуск ===
+
+    def start(self):
+        """
+        Подписаться на поток order, загрузить открытые ордера из REST
+        и подключить реестр к клиенту (client.orders)
+        """
+        if self.ws is not None:
+            self.ws.subscribe_order(callback=self.on_order_message)
+        self.reconcile()
+        self.client.orders = self
+
+        if self.reconcile_interval and not (self._thread and self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="OrderReconcile", daemon=True)
+            self._thread.start()
+        logging.info(f"Реестр ордеров запущен: {len(self._orders)} открытых ордеров")
+        return self
+
+    def stop(self):
+        """Остановить фоновую сверку и отключить реестр от клиента"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if getattr(self.client, 'orders', None) is self:
+            self.client.orders = None
+
+    def _run(self):
+        while not self._stop.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                logging.warning(f"Ошибка сверки ордеров: {e}")
+
+    def _now_ms(self):
+        clock = getattr(self.client, 'clock', None)
+        return int(clock.now_ms() if clock is not None else time.time() * 1000)
+
+    # === Внутреннее состояние (вызывается под блокировкой) ===
+
+    def _remember_closed(self, order_id):
+        self._closed[order_id] = True
+        self._closed.move_to_end(order_id)
+        while len(self._closed) > CLOSED_HISTORY_SIZE:
+            self._closed.popitem(last=False)
+
+    def _remove(self, order_id):
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        if order.get('orderLinkId'):
+            self._links.pop(order['orderLinkId'], None)
+        key = (order.get('category'), order.get('symbol'), order.get('side'))
+        ids = self._index.get(key)
+        if ids is not None:
+            ids.discard(order_id)
+            if not ids:
+                del self._index[key]
+        return order
+
+    def _put(self, order):
+        order_id = order['orderId']
+        self._remove(order_id)
+        self._orders[order_id] = order
+        if order.get('orderLinkId'):
+            self._links[order['orderLinkId']] = order_id
+        key = (order.get('category'), order.get('symbol'), order.get('side'))
+        self._index.setdefault(key, set()).add(order_id)
+
+    def _apply(self, order):
+        """Применить состояние ордера (словарь Bybit); устаревшие обновления пропускаются"""
+        order_id = order.get('orderId')
+        if not order_id:
+            return
+        if order.get('orderStatus') in FINAL_STATUSES:
+            self._remove(order_id)
+            self._remember_closed(order_id)
+            return
+        if order_id in self._closed:
+            return
+        current = self._orders.get(order_id)
+        if current is not None and int(current.get('updatedTime') or 0) > int(order.get('updatedTime') or 0):
+            return
+        self._put(order)
+
+    # === Обновления ===
+
+    def on_placed(self, category, params, result):
+        """
+        Добавить ордер по ответу place_order
+
+        Args:
+            category: Тип рынка
+            params: Параметры запроса (symbol, side, orderType, qty, price, ...)
+            result: result ответа ({'orderId', 'orderLinkId'})
+        """
+        if category not in self.categories or not result.get('orderId'):
+            return
+        now = str(self._now_ms())
+        order = {
+            'category': category,
+            'orderId': result['orderId'],
+            'orderLinkId': result.get('orderLinkId') or params.get('orderLinkId', ''),
+            'symbol': params.get('symbol'),
+            'side': params.get('side'),
+            'orderType': params.get('orderType'),
+            'price': str(params.get('price') or '0'),
+            'qty': str(params.get('qty')),
+            'leavesQty': str(params.get('qty')),
+            'cumExecQty': '0',
+            'orderStatus': 'New',
+            'timeInForce': params.get('timeInForce', ''),
+            'createdTime': now,
+            # 0: любое сообщение потока по этому ордеру новее предварительной записи
+            'updatedTime': '0',
+        }
+        with self._lock:
+            # Поток мог сообщить об ордере раньше, чем пришел ответ REST
+            if order['orderId'] in self._orders or order['orderId'] in self._closed:
+                return
+            self._put(order)
+
+    def on_amended(self, orderId=None, orderLinkId=None, qty=None, price=None):
+        """Обновить цену/количество по ответу amend_order (поток пришлет точное состояние)"""
+        with self._lock:
+            order_id = orderId or self._links.get(orderLinkId)
+            current = self._orders.get(order_id) if order_id else None
+            if current is None:
+                return
+            order = dict(current)
+            if price is not None:
+                order['price'] = str(price)
+            if qty is not None:
+                order['qty'] = str(qty)
+                executed = float(order.get('cumExecQty') or 0)
+                order['leavesQty'] = str(max(0.0, float(qty) - executed))
+            self._put(order)
+
+    def on_cancelled(self, orderId=None, orderLinkId=None):
+        """Убрать ордер по ответу cancel_order / cancel_all_orders"""
+        with self._lock:
+            order_id = orderId or self._links.get(orderLinkId)
+            if order_id:
+                self._remove(order_id)
+                self._remember_closed(order_id)
+
+    def on_order_message(self, message):
+        """Обработчик потока order"""
+        try:
+            with self._lock:
+                for item in message.get('data', []):
+                    if item.get('category') in self.categories:
+                        self._apply(item)
+        except Exception as e:
+            logging.error(f"Ошибка обработки order: {e}")
+
+    # === Сверка с REST ===
+
+    def _fetch_open_orders(self, category):
+        orders = []
+        settle_coins = self.settle_coins if category in ('linear', 'inverse') else (None,)
+        for settle_coin in settle_coins:
+            cursor = None
+            while True:
+                response = self.client.get_open_orders(category, settleCoin=settle_coin, limit=50,
+                                                       cursor=cursor, use_local=False)
+                for item in response['result'].get('list', []):
+                    item.setdefault('category', category)
+                    orders.append(item)
+                cursor = response['result'].get('nextPageCursor')
+                if not cursor:
+                    break
+        return orders
+
+    def reconcile(self):
+        """
+        Сверить реестр с открытыми ордерами из REST
+
+        Returns:
+            dict: Расхождения этой сверки {'added', 'removed', 'updated'}
+        """
+        drift = {'added': 0, 'removed': 0, 'updated': 0}
+        for category in self.categories:
+            started = self._now_ms()
+            remote = {order['orderId']: order for order in self._fetch_open_orders(category)}
+
+            with self._lock:
+                # Первая загрузка категории - не расхождение
+                counts = drift if category in self._synced else dict(drift)
+                for order_id, order in remote.items():
+                    current = self._orders.get(order_id)
+                    if current is None:
+                        if order_id in self._closed:
+                            continue
+                        counts['added'] += 1
+                    else:
+                        current_time = int(current.get('updatedTime') or 0)
+                        remote_time = int(order.get('updatedTime') or 0)
+                        if current_time > remote_time:
+                            continue
+                        # current_time == 0 - предварительная запись из ответа place_order
+                        if current_time and current_time != remote_time:
+                            counts['updated'] += 1
+                    self._put(order)
+
+                # Ордер есть в памяти, но не на бирже, и не менялся после начала запроса
+                for order_id, order in list(self._orders.items()):
+                    if (order.get('category') == category and order_id not in remote
+                            and int(order.get('updatedTime') or 0) < started
+                            and int(order.get('createdTime') or 0) < started):
+                        self._remove(order_id)
+                        self._remember_closed(order_id)
+                        counts['removed'] += 1
+                self._synced.add(category)
+
+        with self._lock:
+            for key, value in drift.items():
+                self.drift[key] += value
+            self.reconciled_at = time.time()
+        if any(drift.values()):
+            logging.warning(f"Расхождение реестра ордеров с биржей: {drift}")
+        return drift
+
+    # === Чтение ===
+
+    def is_synced(self, category):
+        """Есть ли в реестре полный список ордеров категории"""
+        return category in self._synced
+
+    def get(self, orderId=None, orderLinkId=None):
+        """Копия ордера (словарь Bybit) по orderId или orderLinkId, или None"""
+        with self._lock:
+            order_id = orderId or self._links.get(orderLinkId)
+            order = self._orders.get(order_id) if order_id else None
+            return dict(order) if order is not None else None
+
+    def open_orders(self, category, symbol=None, side=None):
+        """
+        Открытые ордера из памяти (новые первыми, как в REST)
+
+        Returns:
+            list: Копии словарей ордеров в формате Bybit (изменение не затрагивает реестр)
+        """
+        with self._lock:
+            if symbol is None:
+                orders = [dict(o) for o in self._orders.values() if o.get('category') == category
+                          and (side is None or o.get('side') == side)]
+            else:
+                sides = (side,) if side else ('Buy', 'Sell')
+                orders = [dict(self._orders[order_id]) for s in sides
+                          for order_id in self._index.get((category, symbol, s), ())]
+        orders.sort(key=lambda o: int(o.get('createdTime') or 0), reverse=True)
+        return orders
+
+    def open_order_models(self, category, symbol=None, side=None):
+        """Открытые ордера из памяти как [Order, ...]"""
+        return [Order.from_dict(o, category) for o in self.open_orders(category, symbol, side)]
+
+    def stats(self):
+        """Количество ордеров, накопленные расхождения и время последней сверки"""
+        with self._lock:
+            return {
+                'open_orders': len(self._orders),
+                'synced_categories': sorted(self._synced),
+                'drift': dict(self.drift),
+                'reconciled_at': self.reconciled_at,
+            }
+
+    def __len__(self):
+        return len(self._orders)
@@ -0,0 +1,263 @@
+"""
+Планировщик запросов с учетом лимитов Bybit API
+"""
+import logging
+import threading
+import time
+
+
+# Приоритеты запросов (меньше - важнее)
+PRIORITY_TRADING = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_MARKET = 2
+
+# Метод клиента -> (группа лимитов, приоритет)
+ENDPOINT_GROUPS = {
+    'get_server_time': ('market', PRIORITY_MARKET),
+    'get_tickers': ('market', PRIORITY_MARKET),
+    'get_kline': ('market', PRIORITY_MARKET),
+    'get_orderbook': ('market', PRIORITY_MARKET),
+    'get_instruments_info': ('market', PRIORITY_MARKET),
+    'get_public_trade_history': ('market', PRIORITY_MARKET),
+    'place_order': ('order_create', PRIORITY_TRADING),
+    'amend_order': ('order_amend', PRIORITY_TRADING),
+    'cancel_order': ('order_cancel', PRIORITY_TRADING),
+    'cancel_all_orders': ('order_cancel_all', PRIORITY_TRADING),
+    'place_batch_order': ('order_create_batch', PRIORITY_TRADING),
+    'amend_batch_order': ('order_amend_batch', PRIORITY_TRADING),
+    'cancel_batch_order': ('order_cancel_batch', PRIORITY_TRADING),
+    'get_open_orders': ('order_query', PRIORITY_ACCOUNT),
+    'get_wallet_balance': ('account', PRIORITY_ACCOUNT),
+    'get_positions': ('position', PRIORITY_ACCOUNT),
+}
+
+# Лимиты по умолчанию: группа -> запросов в секунду.
+# Точные значения приходят в заголовках X-Bapi-Limit-* и заменяют эти.
+DEFAULT_LIMITS = {
+    'market': 50,
+    'order_create': 10,
+    'order_amend': 10,
+    'order_cancel': 10,
+    'order_cancel_all': 10,
+    'order_create_batch': 10,
+    'order_amend_batch': 10,
+    'order_cancel_batch': 10,
+    'order_query': 50,
+    'account': 50,
+    'position': 50,
+}
+
+# Общий лимит по IP: 600 запросов за 5 секунд
+IP_LIMIT = 600
+IP_WINDOW = 5.0
+
+
+class TokenBucket:
+    """Корзина токенов с равномерным пополнением"""
+
+    def __init__(self, capacity, refill_per_second):
+        """
+        Args:
+            capacity: Максимальное количество токенов
+            refill_per_second: Скорость пополнения (токенов в секунду)
+        """
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self._last = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self._last = now
+
+    def available(self, now=None):
+        """Количество доступных токенов"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if now < self.blocked_until:
+            return 0.0
+        return self.tokens
+
+    def time_until(self, tokens=1.0, now=None):
+        """Сколько секунд ждать, пока станет доступно tokens токенов"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        missing = tokens - self.tokens
+        if missing > 0:
+            wait = max(wait, missing / self.refill_per_second)
+        return wait
+
+    def consume(self, tokens=1.0):
+        """Списать токены (вызывается после успешной проверки)"""
+        self.tokens -= tokens
+
+    def update(self, limit, remaining, reset_in):
+        """
+        Синхронизировать корзину с состоянием, сообщенным биржей
+
+        Args:
+            limit: Лимит запросов в окне
+            remaining: Оставшиеся запросы в текущем окне
+            reset_in: Секунд до сброса окна
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if limit > 0:
+            self.capacity = float(limit)
+            self.refill_per_second = float(limit)
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset_in > 0:
+            self.blocked_until = max(self.blocked_until, now + reset_in)
+
+    def block(self, seconds):
+        """Заблокировать корзину на заданное время"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimitScheduler:
+    """
+    Планировщик запросов: корзина токенов на группу эндпоинтов плюс общий лимит по IP.
+
+    Запросы с более высоким приоритетом (ордера) резервируют общий лимит
+    за собой, поэтому опрос рыночных данных не вытесняет торговые операции.
+    """
+
+    def __init__(self, limits=None, ip_limit=IP_LIMIT, ip_window=IP_WINDOW):
+        """
+        Args:
+            limits: Лимиты групп {группа: запросов в секунду} (по умолчанию DEFAULT_LIMITS)
+            ip_limit: Общий лимит запросов по IP за окно
+            ip_window: Длина окна общего лимита в секундах
+        """
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.buckets = {group: TokenBucket(rate, rate) for group, rate in self.limits.items()}
+        self.ip_bucket = TokenBucket(ip_limit, ip_limit / ip_window)
+        self._waiting = [0, 0, 0]
+        self._cond = threading.Condition()
+        self.stats = {'acquired': 0, 'delayed': 0, 'throttled': 0}
+
+    def resolve(self, method):
+        """Группа лимитов и приоритет для метода клиента"""
+        return ENDPOINT_GROUPS.get(method, ('market', PRIORITY_MARKET))
+
+    def _bucket(self, group):
+        bucket = self.buckets.get(group)
+        if bucket is None:
+            rate = self.limits.get(group, DEFAULT_LIMITS['market'])
+            bucket = self.buckets[group] = TokenBucket(rate, rate)
+        return bucket
+
+    def _try_acquire(self, group, priority, tokens):
+        """Попытаться получить токены; возвращает 0 при успехе или время ожидания"""
+        now = time.monotonic()
+        bucket = self._bucket(group)
+        # Токены общего лимита, зарезервированные за более приоритетными запросами
+        reserved = sum(self._waiting[:priority])
+        wait = max(
+            bucket.time_until(tokens, now),
+            self.ip_bucket.time_until(tokens + reserved, now)
+        )
+        if wait > 0:
+            return wait
+        bucket.consume(tokens)
+        self.ip_bucket.consume(tokens)
+        self.stats['acquired'] += 1
+        return 0.0
+
+    def acquire(self, method, tokens=1):
+        """
+        Дождаться разрешения на запрос (блокирующий вызов)
+
+        Args:
+            method: Имя метода клиента (например, 'get_tickers')
+            tokens: Сколько запросов расходует вызов
+        """
+        group, priority = self.resolve(method)
+        with self._cond:
+            wait = self._try_acquire(group, priority, tokens)
+            if wait == 0:
+                return
+            self.stats['delayed'] += 1
+            self._waiting[priority] += 1
+            try:
+                while wait > 0:
+                    self._cond.wait(wait)
+                    wait = self._try_acquire(group, priority, tokens)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    async def acquire_async(self, method, tokens=1):
+        """Асинхронный аналог acquire для использования в event loop"""
+        import asyncio
+
+        group, priority = self.resolve(method)
+        with self._cond:
+            wait = self._try_acquire(group, priority, tokens)
+            if wait == 0:
+                return
+            self.stats['delayed'] += 1
+            self._waiting[priority] += 1
+        try:
+            while wait > 0:
+                await asyncio.sleep(wait)
+                with self._cond:
+                    wait = self._try_acquire(group, priority, tokens)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def update_from_headers(self, method, headers):
+        """
+        Обновить корзину группы по заголовкам ответа Bybit
+
+        Args:
+            method: Имя метода клиента
+            headers: Заголовки ответа (X-Bapi-Limit, X-Bapi-Limit-Status,
+                     X-Bapi-Limit-Reset-Timestamp)
+        """
+        if not headers:
+            return
+        limit = headers.get('X-Bapi-Limit')
+        remaining = headers.get('X-Bapi-Limit-Status')
+        if limit is None or remaining is None:
+            return
+        try:
+            limit = int(limit)
+            remaining = int(remaining)
+            reset_ts = int(headers.get('X-Bapi-Limit-Reset-Timestamp', 0))
+        except (TypeError, ValueError):
+            return
+
+        reset_in = max(0.0, reset_ts / 1000 - time.time()) if reset_ts else 0.0
+        group, _ = self.resolve(method)
+        with self._cond:
+            self._bucket(group).update(limit, remaining, reset_in)
+            self._cond.notify_all()
+
+    def on_throttled(self, method, headers=None, ip_ban=False):
+        """
+        Зафиксировать отказ биржи по лимиту (retCode 10006 или HTTP 403)
+
+        Args:
+            method: Имя метода клиента
+            headers: Заголовки ответа, если есть
+            ip_ban: True для HTTP 403 (превышен общий лимит по IP)
+        """
+        group, _ = self.resolve(method)
+        with self._cond:
+            self.stats['throttled'] += 1
+            if ip_ban:
+                # Bybit блокирует IP минимум на 10 минут, но повторы раньше продлевают бан
+                self.ip_bucket.block(60)
+            else:
+                self._bucket(group).block(1.0)
+        self.update_from_headers(method, headers)
+        logging.warning(f"Превышен лимит запросов для {method} (группа {group})")
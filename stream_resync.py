@@ -0,0 +1,401 @@
+"""
+Обнаружение пропусков в потоках WebSocket (Bybit, Hyperliquid) и восстановление состояния
+(стаканы, сделки Bybit)
+"""
+from collections import deque
+import logging
+import threading
+import time
+
+
+# Максимум сделок в get_public_trade_history по категориям
+RECENT_TRADES_LIMITS = {'spot': 60}
+DEFAULT_RECENT_TRADES_LIMIT = 1000
+
+# Глубина потока orderbook, u которого совпадает с u снимка REST get_orderbook.
+# Для других глубин стакан восстанавливается snapshot потока (переподпиской).
+REST_SNAPSHOT_DEPTH = {'spot': 200, 'linear': 500, 'inverse': 500}
+
+# Сколько id последних сделок символа помнить для отсева дублей при дозагрузке
+SEEN_TRADES_SIZE = 2000
+
+# Виды пропусков
+GAP_RECONNECT = 'reconnect'  # разрыв соединения
+GAP_SEQUENCE = 'sequence'    # нарушен порядок обновлений стакана (u/seq)
+GAP_SILENCE = 'silence'      # топик молчит дольше max_silence
+
+
+class StreamResync:
+    """
+    Пропуски данных в потоках BybitWebSocketClient и их восстановление.
+
+    При разрыве соединения стаканы OrderBookManager помечаются устаревшими, а
+    сделки символов, подписанных через track_trades(), начинают буферизоваться.
+    После переподключения pybit повторяет подписки: стакан восстанавливает
+    snapshot потока, а пропущенные сделки дозагружаются из
+    get_public_trade_history и передаются обработчику вместе с буфером - по
+    времени и без дублей (по id сделки).
+
+    Нарушение порядка обновлений стакана и молчание топика дольше max_silence
+    тоже считаются пропуском: стакан загружается снимком REST, если глубина
+    подписки совпадает с REST_SNAPSHOT_DEPTH, иначе - переподпиской на топик.
+
+    С HyperliquidWebSocket (топики 'trades.BTC', 'l2Book.BTC', 'allMids')
+    учитываются пропуски при переподключении и молчание топиков, например
+    max_silence={'l2Book': 10, 'trades': 60}. Восстанавливать нечего только
+    для l2Book: он приходит полным снимком. Пропущенные сделки не дозагружаются
+    (track_trades и books - только для Bybit).
+    """
+
+    def __init__(self, client, ws_client, category="spot", books=None, on_gap=None, on_resync=None,
+                 max_silence=None, check_interval=1.0):
+        """
+        Args:
+            client: BybitClient для REST снимков (None для HyperliquidWebSocket)
+            ws_client: BybitWebSocketClient или HyperliquidWebSocket
+            category: Категория рынка для REST запросов (spot, linear, inverse)
+            books: OrderBookManager, стаканы которого пересинхронизируются
+            on_gap: Функция on_gap(topic, kind, info) при обнаружении пропуска
+            on_resync: Функция on_resync(topic, kind, info) после восстановления ('book'/'trades')
+            max_silence: {префикс топика: секунд}, например {'orderbook': 10}
+            check_interval: Период проверки молчания топиков в секундах
+        """
+        self.client = client
+        self.ws_client = ws_client
+        self.category = category
+        self.books = books
+        self.on_gap = on_gap
+        self.on_resync = on_resync
+        self.max_silence = dict(max_silence or {})
+        self.check_interval = check_interval
+
+        # Обработчики track_trades -> (пользовательский обработчик, время создания, мс)
+        self._handlers = {}
+        # symbol -> (deque id, set id) последних сделок; symbol -> обработчик сделок
+        self._seen = {}
+        self._trade_callbacks = {}
+        # symbol -> сообщения, полученные во время дозагрузки; блокировки доставки по символу
+        self._buffers = {}
+        self._symbol_locks = {}
+        # Стаканы, ожидающие snapshot потока
+        self._awaiting = set()
+        self._silent = set()
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'gaps': {GAP_RECONNECT: 0, GAP_SEQUENCE: 0, GAP_SILENCE: 0},
+            'resyncs': {'book': 0, 'trades': 0},
+            'backfilled_trades': 0,
+            'truncated': 0,
+            'errors': 0,
+        }
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # === Запуск ===
+
+    def start(self):
+        """Подключиться к клиенту и стаканам"""
+        self.ws_client.add_disconnect_listener(self.on_disconnect)
+        self.ws_client.add_reconnect_listener(self.on_reconnect)
+        if self.books is not None:
+            previous_gap, previous_snapshot = self.books.on_gap, self.books.on_snapshot
+
+            def on_book_gap(book):
+                if previous_gap is not None:
+                    previous_gap(book)
+                self._gap(self._book_topic(book.symbol), GAP_SEQUENCE, {'u': book.update_id, 'seq': book.seq})
+                self._resync_book_async(book.symbol)
+
+            def on_book_snapshot(book):
+                if previous_snapshot is not None:
+                    previous_snapshot(book)
+                if book.symbol in self._awaiting:
+                    self._awaiting.discard(book.symbol)
+                    self._resynced(self._book_topic(book.symbol), 'book', {'source': 'ws', 'u': book.update_id})
+
+            self.books.on_gap = on_book_gap
+            self.books.on_snapshot = on_book_snapshot
+        if self.max_silence and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="StreamResync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановить проверку молчания топиков"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _book_topic(self, symbol):
+        return f"orderbook.{self.books.depth}.{symbol}"
+
+    # === Сделки ===
+
+    def track_trades(self, callback):
+        """
+        Обработчик сделок для subscribe_trades: сделки передаются по порядку и без дублей,
+        в том числе после дозагрузки пропущенных при разрыве
+
+        Args:
+            callback: Пользовательский обработчик сообщений publicTrade
+
+        Returns:
+            Функция для параметра callback подписки
+        """
+        def handler(message):
+            trades = message.get('data')
+            if not trades:
+                return
+            symbol = trades[0]['s']
+            with self._symbol_lock(symbol):
+                self._trade_callbacks[symbol] = callback
+                buffer = self._buffers.get(symbol)
+                if buffer is not None:
+                    # Идет дозагрузка: сообщение будет передано после пропущенных сделок
+                    buffer.append(message)
+                    return
+                self._deliver(symbol, callback, message)
+
+        self._handlers[handler] = (callback, time.time() * 1000)
+        return handler
+
+    def _symbol_lock(self, symbol):
+        lock = self._symbol_locks.get(symbol)
+        if lock is None:
+            with self._lock:
+                lock = self._symbol_locks.setdefault(symbol, threading.Lock())
+        return lock
+
+    def _tracked_symbols(self):
+        """{символ: (обработчик, время создания)} для подписок с обработчиком track_trades"""
+        tracked = {}
+        for topic, handler in list(self.ws_client.callbacks.items()):
+            if topic.startswith('publicTrade.') and handler in self._handlers:
+                tracked[topic.split('.', 1)[1]] = self._handlers[handler]
+        return tracked
+
+    def _deliver(self, symbol, callback, message):
+        """Передать сообщение без уже переданных сделок (под блокировкой символа)"""
+        trades = message['data']
+        fresh = self._remember(symbol, [trade['i'] for trade in trades])
+        if len(fresh) < len(trades):
+            if not fresh:
+                return
+            message = {**message, 'data': [trade for trade in trades if trade['i'] in fresh]}
+        callback(message)
+
+    def _remember(self, symbol, trade_ids):
+        """Запомнить id сделок; возвращает множество id, которых еще не было"""
+        fresh = set()
+        with self._lock:
+            seen = self._seen.get(symbol)
+            if seen is None:
+                seen = self._seen[symbol] = (deque(), set())
+            order, ids = seen
+            for trade_id in trade_ids:
+                if trade_id in ids:
+                    continue
+                fresh.add(trade_id)
+                order.append(trade_id)
+                ids.add(trade_id)
+                if len(order) > SEEN_TRADES_SIZE:
+                    ids.discard(order.popleft())
+        return fresh
+
+    # === Пропуски ===
+
+    def _gap(self, topic, kind, info):
+        """Учесть пропуск"""
+        self.stats['gaps'][kind] += 1
+        logging.warning(f"Пропуск данных {topic} ({kind}): {info}")
+        if self.on_gap is not None:
+            try:
+                self.on_gap(topic, kind, info)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика пропуска: {e}")
+
+    def _schedule(self, topic, func, *args):
+        """Восстановление в отдельном потоке (REST запрос не задерживает поток приема)"""
+        with self._lock:
+            if topic in self._inflight:
+                return
+            self._inflight.add(topic)
+
+        def run():
+            try:
+                func(*args)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logging.error(f"Ошибка восстановления {topic}: {e}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(topic)
+
+        threading.Thread(target=run, name=f"Resync-{topic}", daemon=True).start()
+
+    def on_disconnect(self, ws_client, last_seen):
+        """
+        Разрыв соединения (до повторных подписок): стаканы ждут snapshot потока,
+        сделки буферизуются до окончания дозагрузки
+        """
+        for symbol, (callback, _) in self._tracked_symbols().items():
+            with self._symbol_lock(symbol):
+                self._trade_callbacks[symbol] = callback
+                self._buffers.setdefault(symbol, [])
+        if self.books is not None:
+            for symbol, book in self.books.books.items():
+                book.invalidate()
+                self._awaiting.add(symbol)
+
+    def on_reconnect(self, ws_client, last_seen):
+        """Переподключение BybitWebSocketClient: пропуск по каждому топику и дозагрузка сделок"""
+        tracked = self._tracked_symbols()
+        for topic, ts in last_seen.items():
+            if not topic.startswith('publicTrade.') or topic.split('.', 1)[1] not in tracked:
+                self._gap(topic, GAP_RECONNECT, {'since': ts})
+        # Сделки - и для символов, по которым до разрыва не было ни одной сделки
+        for symbol, (_, started) in tracked.items():
+            topic = f"publicTrade.{symbol}"
+            since = last_seen.get(topic) or started
+            self._gap(topic, GAP_RECONNECT, {'since': since})
+            self._schedule(topic, self.backfill_trades, symbol, since)
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check_silence()
+            except Exception as e:
+                logging.error(f"Ошибка проверки потоков: {e}")
+
+    def check_silence(self):
+        """Пропуск по времени: топики, не получавшие сообщений дольше max_silence"""
+        for topic, ts in list(self.ws_client.topic_ts.items()):
+            limit = self.max_silence.get(topic.split('.', 1)[0])
+            if limit is None or ts is None:
+                continue
+            silent_ms = self.ws_client.latency_ms(ts)
+            if silent_ms > limit * 1000:
+                if topic not in self._silent:
+                    self._silent.add(topic)
+                    self._gap(topic, GAP_SILENCE, {'since': ts, 'silent_ms': round(silent_ms)})
+                    symbol = topic.rpartition('.')[2]
+                    if topic.startswith('orderbook') and self.books is not None and self.books.book(symbol):
+                        self._resync_book_async(symbol)
+            else:
+                self._silent.discard(topic)
+
+    # === Восстановление ===
+
+    def _resynced(self, topic, kind, info):
+        self.stats['resyncs'][kind] += 1
+        logging.info(f"{topic}: восстановлено ({kind}) {info}")
+        if self.on_resync is not None:
+            try:
+                self.on_resync(topic, kind, info)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика восстановления: {e}")
+
+    def _resync_book_async(self, symbol):
+        if self.books.depth == REST_SNAPSHOT_DEPTH.get(self.category):
+            self._schedule(self._book_topic(symbol), self.resync_book, symbol)
+        else:
+            self._schedule(self._book_topic(symbol), self.resubscribe_book, symbol)
+
+    def resync_book(self, symbol):
+        """
+        Загрузить стакан символа снимком REST (только для глубины REST_SNAPSHOT_DEPTH)
+
+        Если снимок не стыкуется с delta потока, стакан восстанавливается переподпиской.
+
+        Returns:
+            bool: True, если стакан синхронизирован снимком REST
+        """
+        if self.books.depth != REST_SNAPSHOT_DEPTH.get(self.category):
+            raise ValueError(f"u снимка REST не совпадает с потоком orderbook.{self.books.depth}")
+        book = self.books.book(symbol)
+        response = self.client.get_orderbook(category=self.category, symbol=symbol, limit=self.books.depth,
+                                             use_cache=False)
+        result = response['result']
+        if not book.load_snapshot(result, result.get('ts')):
+            if not book.synced:
+                self.resubscribe_book(symbol)
+            return False
+        self._awaiting.discard(symbol)
+        if self.books.callback is not None:
+            self.books.callback(book)
+        self._resynced(self._book_topic(symbol), 'book', {'source': 'rest', 'u': book.update_id})
+        return True
+
+    def resubscribe_book(self, symbol):
+        """Переподписаться на стакан символа: поток пришлет новый snapshot"""
+        topic = self._book_topic(symbol)
+        self._awaiting.add(symbol)
+        self.books.book(symbol).invalidate()
+        self.ws_client.unsubscribe(topic)
+        self.ws_client.subscribe_orderbook([symbol], depth=self.books.depth, callback=self.books.on_message,
+                                           raw=True)
+
+    def backfill_trades(self, symbol, since):
+        """
+        Дозагрузить сделки символа, пропущенные после since, и передать их обработчику
+
+        Дозагруженные сделки передаются одним сообщением publicTrade ('data' - по
+        возрастанию времени, 'backfill': True), затем - сообщения, полученные во
+        время дозагрузки; уже переданные сделки отбрасываются.
+
+        Args:
+            symbol: Символ пары
+            since: Timestamp последнего сообщения до разрыва (мс)
+
+        Returns:
+            int: Количество дозагруженных сделок
+        """
+        limit = RECENT_TRADES_LIMITS.get(self.category, DEFAULT_RECENT_TRADES_LIMIT)
+        trades, error = [], None
+        try:
+            response = self.client.get_public_trade_history(category=self.category, symbol=symbol, limit=limit)
+            trades = response['result'].get('list', [])
+        except Exception as e:
+            # Буфер все равно передается обработчику
+            error = e
+
+        missed = [
+            {'T': int(t['time']), 's': t['symbol'], 'S': t['side'], 'v': t['size'],
+             'p': t['price'], 'i': t['execId'], 'BT': t.get('isBlockTrade', False)}
+            for t in reversed(trades)  # REST возвращает от новых к старым
+            if int(t['time']) >= int(since)
+        ]
+        missed.sort(key=lambda trade: trade['T'])
+        # Самая старая полученная сделка новее разрыва: часть сделок не помещается в лимит
+        truncated = len(trades) >= limit and int(trades[-1]['time']) > int(since)
+
+        with self._symbol_lock(symbol):
+            callback = self._trade_callbacks.get(symbol)
+            live = self._buffers.pop(symbol, [])
+            if missed and callback is not None:
+                fresh = self._remember(symbol, [trade['i'] for trade in missed])
+                missed = [trade for trade in missed if trade['i'] in fresh]
+                if missed:
+                    callback({
+                        'topic': f"publicTrade.{symbol}",
+                        'type': 'snapshot',
+                        'ts': missed[-1]['T'],
+                        'data': missed,
+                        'backfill': True,
+                    })
+            for message in live:
+                self._deliver(symbol, callback, message)
+
+        if error is not None:
+            raise error
+        if truncated:
+            self.stats['truncated'] += 1
+            logging.warning(f"publicTrade.{symbol}: пропущено больше {limit} сделок, дозагружены последние")
+        self.stats['backfilled_trades'] += len(missed)
+        self._resynced(f"publicTrade.{symbol}", 'trades', {'trades': len(missed), 'truncated': truncated})
+        return len(missed)
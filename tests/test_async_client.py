@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from async_bybit_client import AsyncBybitClient, BybitAPIError, sign_request
+
+
+def run_with_server(scenario):
+    """Запустить локальный mock-сервер Bybit и scenario(client, requests, bodies)"""
+    requests, bodies = [], []
+
+    async def tickers(request):
+        requests.append(request)
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': {
+            'category': request.query['category'],
+            'list': [{'symbol': request.query.get('symbol', 'BTCUSDT'), 'lastPrice': '50000'}]}})
+
+    async def create_order(request):
+        body = await request.text()
+        requests.append(request)
+        bodies.append(body)
+        headers = request.headers
+        expected = sign_request('secret', headers['X-BAPI-TIMESTAMP'], 'key',
+                                headers['X-BAPI-RECV-WINDOW'], body)
+        if headers['X-BAPI-SIGN'] != expected:
+            return web.json_response({'retCode': 10004, 'retMsg': 'error sign!', 'result': {}})
+        params = json.loads(body)
+        if params['qty'] == '0':
+            return web.json_response({'retCode': 170136, 'retMsg': 'Order quantity is too small',
+                                      'result': {}})
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': {'orderId': '1'}})
+
+    async def unavailable(request):
+        return web.Response(status=503, text='Service Unavailable')
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/v5/market/tickers', tickers)
+        app.router.add_post('/v5/order/create', create_order)
+        app.router.add_get('/v5/market/time', unavailable)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        try:
+            async with AsyncBybitClient(api_key='key', api_secret='secret', base_url=f"http://{host}:{port}",
+                                        rate_limit=False, metrics=True) as client:
+                await scenario(client, requests, bodies)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_public_request_query_and_response():
+    async def scenario(client, requests, bodies):
+        response = await client.get_tickers(category='linear', symbol='ETHUSDT')
+        assert response['result']['list'][0]['symbol'] == 'ETHUSDT'
+        assert dict(requests[0].query) == {'category': 'linear', 'symbol': 'ETHUSDT'}
+        assert 'X-BAPI-SIGN' not in requests[0].headers
+
+    run_with_server(scenario)
+
+
+def test_signed_order_and_api_error():
+    async def scenario(client, requests, bodies):
+        response = await client.place_order('linear', 'BTCUSDT', 'Buy', 'Limit', 0.01, price=50000)
+        assert response['result']['orderId'] == '1'
+        assert json.loads(bodies[0])['price'] == '50000'
+        try:
+            await client.place_order('linear', 'BTCUSDT', 'Buy', 'Limit', 0, price=50000)
+        except BybitAPIError as e:
+            assert e.ret_code == 170136
+        else:
+            raise AssertionError("ожидалась BybitAPIError")
+
+    run_with_server(scenario)
+
+
+def test_http_error_is_raised_and_recorded():
+    async def scenario(client, requests, bodies):
+        try:
+            await client.get_server_time()
+        except BybitAPIError as e:
+            assert e.ret_code == 503
+        else:
+            raise AssertionError("ожидалась BybitAPIError")
+        errors = client.metrics_snapshot()
+        assert 'http_503' in json.dumps(errors)
+
+    run_with_server(scenario)
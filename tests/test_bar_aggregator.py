@@ -0,0 +1,63 @@
+from bar_aggregator import BarAggregator
+
+
+class FixedClock:
+    def __init__(self, now):
+        self.now = now
+
+    def now_ms(self):
+        return self.now
+
+
+def test_time_bar_ohlcv_vwap_and_delta():
+    closed = []
+    bars = BarAggregator(time_intervals=(60,), callback=closed.append)
+    bars.add_trade('BTC', 60_000, 100, 1, True)
+    bars.add_trade('BTC', 61_000, 110, 1, False)
+    bars.add_trade('BTC', 119_999, 90, 2, True)
+    bars.add_trade('BTC', 120_000, 95, 1, True)
+    bar, = closed
+    assert (bar.start, bar.end) == (60_000, 120_000)
+    assert (bar.open, bar.high, bar.low, bar.close) == (100, 110, 90, 90)
+    assert bar.volume == 4 and bar.vwap == (100 + 110 + 180) / 4
+    assert bar.delta == 2
+    assert bars.current('BTC').start == 120_000
+
+
+def test_late_trade_does_not_change_or_reopen_time_bars():
+    closed = []
+    bars = BarAggregator(time_intervals=(60,), tick_sizes=(2,), callback=closed.append)
+    bars.add_trade('BTC', 60_000, 100, 1, True)
+    bars.add_trade('BTC', 120_000, 101, 1, True)
+    # Сделка из уже закрытого интервала
+    bars.add_trade('BTC', 70_000, 50, 1, True)
+    assert bars.late_trades == 1
+    assert bars.current('BTC').low == 101
+    assert [bar.kind for bar in closed] == ['time', 'tick']
+
+    bars.close_expired(now_ms=10 ** 9)
+    bars.add_trade('BTC', 170_000, 50, 1, True)
+    assert bars.late_trades == 2
+    assert bars.current('BTC') is None
+    assert [bar.start for bar in bars.bars('BTC')] == [60_000, 120_000]
+
+
+def test_close_expired_waits_for_grace_by_exchange_clock():
+    clock = FixedClock(120_500)
+    bars = BarAggregator(time_intervals=(60,), clock=clock, grace=1.0)
+    bars.add_trade('BTC', 60_000, 100, 1, True)
+    assert bars.close_expired() == []
+    clock.now = 121_000
+    assert len(bars.close_expired()) == 1
+    # Опоздавшая сделка того же интервала не создает второй бар с тем же началом
+    bars.add_trade('BTC', 119_000, 100, 1, True)
+    bars.close_expired()
+    assert len(bars.bars('BTC')) == 1
+
+
+def test_tick_and_volume_bars():
+    bars = BarAggregator(time_intervals=(), tick_sizes=(2,), volume_sizes=(3,))
+    for ts, qty in ((1, 1), (2, 1), (3, 2)):
+        bars.add_trade('ETH', ts, 10, qty, True)
+    assert [bar.trades for bar in bars.bars('ETH', 'tick', 2)] == [2]
+    assert [bar.volume for bar in bars.bars('ETH', 'volume', 3)] == [4]
@@ -0,0 +1,35 @@
+from candle_store import CandleStore, klines_to_arrays
+
+
+def candle(ts, close):
+    return [str(ts), '1', '2', '0.5', str(close), '10', '100']
+
+
+def test_klines_are_sorted_by_time():
+    arrays = klines_to_arrays([candle(120_000, 3), candle(60_000, 2)])
+    assert arrays['timestamp'].tolist() == [60_000, 120_000]
+    assert arrays['close'].tolist() == [2.0, 3.0]
+
+
+def test_append_skips_old_and_updates_last_candle(tmp_path):
+    store = CandleStore(root=str(tmp_path))
+    assert store.append('spot', 'BTCUSDT', '1', [candle(0, 1), candle(60_000, 2)]) == 2
+    # Свеча 0 уже сохранена, 60_000 - незакрытая и перезаписывается, 120_000 - новая
+    assert store.append('spot', 'BTCUSDT', '1', [candle(0, 9), candle(60_000, 5), candle(120_000, 6)]) == 1
+    columns = store.load('spot', 'BTCUSDT', '1')
+    assert columns['timestamp'].tolist() == [0, 60_000, 120_000]
+    assert columns['close'].tolist() == [1.0, 5.0, 6.0]
+
+
+def test_range_and_recovery_after_partial_write(tmp_path):
+    store = CandleStore(root=str(tmp_path))
+    store.append('spot', 'BTCUSDT', '1', [candle(i * 60_000, i) for i in range(5)])
+    assert store.load('spot', 'BTCUSDT', '1', start=60_000, end=180_000)['close'].tolist() == [1.0, 2.0, 3.0]
+
+    series = store.series('spot', 'BTCUSDT', '1')
+    # Прерванная запись: в одной колонке лишние байты
+    with open(series._file('close'), 'ab') as f:
+        f.write(b'\x00' * 4)
+    assert len(series) == 5
+    store.append('spot', 'BTCUSDT', '1', [candle(300_000, 5)])
+    assert series.range()['close'].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
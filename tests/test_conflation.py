@@ -0,0 +1,86 @@
+import threading
+import time
+
+from utils.conflation import Conflator
+
+
+def test_in_place_updates_are_delivered():
+    """pybit меняет словарь тикера на месте: каждое изменение должно дойти до обработчика"""
+    delivered = []
+    conflator = Conflator(delivered.append, interval=3600)
+    shared = {'symbol': 'BTCUSDT', 'lastPrice': '1'}
+    for price in ('2', '3', '4', '5'):
+        shared['lastPrice'] = price
+        conflator.update('BTCUSDT', shared)
+        conflator.flush()
+    conflator.stop()
+    assert [changed['BTCUSDT']['lastPrice'] for changed in delivered] == ['2', '3', '4', '5']
+
+
+def test_burst_is_conflated_to_latest_value():
+    delivered = []
+    conflator = Conflator(delivered.append, interval=3600)
+    for i in range(1000):
+        conflator.update('BTC', str(i))
+    conflator.update('ETH', '1')
+    conflator.flush()
+    conflator.stop()
+    assert delivered == [{'BTC': '999', 'ETH': '1'}]
+    assert conflator.stats['updates'] == 1001
+
+
+def test_unchanged_value_is_not_redelivered():
+    delivered = []
+    conflator = Conflator(delivered.append, interval=3600)
+    conflator.update('BTC', '1')
+    conflator.flush()
+    conflator.update('BTC', '1')
+    conflator.flush()
+    conflator.stop()
+    assert delivered == [{'BTC': '1'}]
+
+
+def test_timer_flushes_periodically():
+    delivered = []
+    conflator = Conflator(delivered.append, interval=0.01)
+    conflator.update('BTC', '1')
+    deadline = time.time() + 1
+    while not delivered and time.time() < deadline:
+        time.sleep(0.01)
+    conflator.stop()
+    assert delivered == [{'BTC': '1'}]
+
+
+def test_concurrent_flushes_deliver_each_batch_once():
+    delivered, active, overlaps = [], [0], []
+
+    def consumer(changed):
+        active[0] += 1
+        if active[0] > 1:
+            overlaps.append(changed)
+        delivered.append(changed['BTC'])
+        time.sleep(0.001)
+        active[0] -= 1
+
+    conflator = Conflator(consumer, interval=0.0005)
+    stop = threading.Event()
+
+    def flusher():
+        while not stop.is_set():
+            conflator.flush()
+
+    threads = [threading.Thread(target=flusher) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(500):
+        conflator.update('BTC', i)
+        time.sleep(0.00005)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    conflator.stop()
+    assert not overlaps
+    # Ни одно значение не передано дважды, пакеты - по порядку, последнее дошло
+    assert delivered == sorted(set(delivered))
+    assert delivered[-1] == 499
+    assert conflator.stats['delivered'] == len(delivered)
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from utils.dispatch import Dispatcher
+
+
+def test_messages_of_one_topic_are_processed_in_order():
+    received = []
+    done = threading.Event()
+    dispatcher = Dispatcher(workers=4)
+
+    def handler(message):
+        received.append(message)
+        if message == 99:
+            done.set()
+
+    for i in range(100):
+        dispatcher.submit('publicTrade.BTCUSDT', handler, i)
+    assert done.wait(2)
+    dispatcher.stop()
+    assert received == list(range(100))
+
+
+def test_conflate_keeps_only_latest_message():
+    release = threading.Event()
+    received = []
+    dispatcher = Dispatcher(workers=1, policy='conflate')
+    dispatcher.submit('tickers.A', lambda message: release.wait(2), 'blocker')
+    for i in range(5):
+        dispatcher.submit('tickers.B', received.append, i)
+    release.set()
+    dispatcher.stop()
+    assert received == [4]
+    assert dispatcher.stats()['conflated'] == 4
+
+
+def test_orderbook_topics_are_never_dropped():
+    with pytest.raises(ValueError):
+        Dispatcher(workers=1, topic_policies={'orderbook': 'drop_oldest'})
+    with pytest.raises(ValueError):
+        Dispatcher(workers=1, topic_policies={'orderbook.50.BTCUSDT': 'conflate'})
+
+    dispatcher = Dispatcher(workers=1, maxsize=1, policy='drop_oldest')
+    dispatcher.submit('orderbook.50.BTCUSDT', lambda message: None, 1)
+    assert dispatcher.stats()['topics']['orderbook.50.BTCUSDT']['policy'] == 'block'
+    dispatcher.stop()
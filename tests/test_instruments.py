@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from instruments import InstrumentCache, InstrumentRules
+
+
+def rules(**overrides):
+    data = {'symbol': 'BTCUSDT', 'status': 'Trading',
+            'priceFilter': {'tickSize': '0.01', 'minPrice': '0.01', 'maxPrice': '1000000'},
+            'lotSizeFilter': {'basePrecision': '0.000001', 'minOrderQty': '0.000048',
+                              'maxOrderQty': '71', 'minOrderAmt': '1'}}
+    data.update(overrides)
+    return InstrumentRules.from_dict('spot', data)
+
+
+class FakeClient:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.release = threading.Event()
+        self.release.set()
+
+    def get_instruments_info(self, category, limit, cursor=None):
+        self.calls += 1
+        self.release.wait(2)
+        time.sleep(self.delay)
+        if category != 'spot':
+            return {'result': {'list': []}}
+        item = {'symbol': 'BTCUSDT', 'status': 'Trading', 'priceFilter': {'tickSize': '0.01'},
+                'lotSizeFilter': {'basePrecision': '0.001', 'minOrderQty': '0.001'}}
+        return {'result': {'list': [item]}}
+
+
+def test_price_and_qty_rounding():
+    assert rules().prepare('0.0012345678', '50000.006') == ('0.001234', '50000.01')
+    assert rules().prepare('0.0012345678', '50000.004') == ('0.001234', '50000')
+
+
+def test_rejects_orders_the_exchange_would_reject():
+    with pytest.raises(ValueError):
+        rules().prepare('0.00001', '50000')  # меньше минимального количества
+    with pytest.raises(ValueError):
+        rules().prepare('0.0001', '5000')  # стоимость меньше minOrderAmt
+    with pytest.raises(ValueError):
+        rules().prepare('0.01', None, orderType='Limit')  # лимитный ордер без цены
+    with pytest.raises(ValueError):
+        rules(status='PreLaunch').prepare('0.01', '50000')
+    assert rules().prepare('0.01', None, orderType='Market') == ('0.01', None)
+
+
+def test_empty_cache_is_loaded_once_by_concurrent_orders():
+    client = FakeClient(delay=0.05)
+    cache = InstrumentCache(client, path=None, categories=('spot',))
+    threads = [threading.Thread(target=cache.prepare_order, args=('spot', 'BTCUSDT', 'Buy', 'Limit', '1', '10'))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.calls == 1
+
+
+def test_stale_cache_refreshes_in_background():
+    client = FakeClient()
+    cache = InstrumentCache(client, path=None, refresh_interval=60, categories=('spot',)).load()
+    cache.updated_at -= 120
+    client.release.clear()
+    # Ордер проверяется по прежним параметрам, не дожидаясь ответа биржи
+    assert cache.prepare_order('spot', 'BTCUSDT', 'Buy', 'Limit', '1.0004', '10') == ('1', '10')
+    cache.prepare_order('spot', 'BTCUSDT', 'Buy', 'Limit', '1', '10')
+    client.release.set()
+    cache._refresh_thread.join(2)
+    assert client.calls == 2
+    assert time.time() - cache.updated_at < 5
+
+
+def test_unknown_instruments_are_sent_unchanged():
+    client = FakeClient()
+    cache = InstrumentCache(client, path=None, categories=('spot',)).load()
+    assert client.calls == 1
+    # Категория вне кэша: кэш не проверяет и не обновляет
+    assert cache.prepare_order('option', 'BTC-30DEC26-80000-C', 'Buy', 'Limit', '1', '5') == ('1', '5')
+    assert client.calls == 1
+
+    # Новый символ: ордер уходит без изменений, кэш обновляется в фоне один раз
+    assert cache.prepare_order('spot', 'NEWUSDT', 'Buy', 'Limit', '1.23456', '0.1') == ('1.23456', '0.1')
+    assert cache.prepare_amend('spot', 'NEWUSDT', qty='2') == ('2', None)
+    cache._refresh_thread.join(2)
+    assert client.calls == 2
@@ -0,0 +1,106 @@
+from order_book import OrderBook, OrderBookManager
+
+
+def snapshot(u, bids=(('100', '1'),), asks=(('101', '1'),), seq=1):
+    return {'topic': 'orderbook.50.BTCUSDT', 'type': 'snapshot', 'ts': 1,
+            'data': {'s': 'BTCUSDT', 'b': [list(b) for b in bids], 'a': [list(a) for a in asks],
+                     'u': u, 'seq': seq}}
+
+
+def delta(u, bids=(), asks=(), seq=None):
+    return {'topic': 'orderbook.50.BTCUSDT', 'type': 'delta', 'ts': 2,
+            'data': {'s': 'BTCUSDT', 'b': [list(b) for b in bids], 'a': [list(a) for a in asks],
+                     'u': u, 'seq': seq if seq is not None else u}}
+
+
+def test_delta_updates_and_removes_levels():
+    book = OrderBook('BTCUSDT', 50)
+    assert book.apply(snapshot(10, bids=(('100', '1'), ('99', '2')))) == 'snapshot'
+    assert book.apply(delta(11, bids=(('100', '0'), ('98', '3')))) == 'delta'
+    assert book.snapshot()['bids'] == [(99.0, 2.0), (98.0, 3.0)]
+    assert book.best_bid() == (99.0, 2.0)
+    assert book.best_ask() == (101.0, 1.0)
+
+
+def test_dropped_delta_is_a_gap_by_default():
+    book = OrderBook('BTCUSDT', 50)
+    book.apply(snapshot(10))
+    assert book.apply(delta(12, bids=(('100', '5'),))) == 'gap'
+    assert not book.synced
+    # До нового snapshot delta не применяются
+    assert book.apply(delta(13)) == 'unsynced'
+    assert book.apply(snapshot(20)) == 'snapshot'
+    assert book.synced
+
+
+def test_non_strict_mode_counts_skipped_updates():
+    book = OrderBook('BTCUSDT', 50, strict_sequence=False)
+    book.apply(snapshot(10))
+    assert book.apply(delta(13)) == 'delta'
+    assert book.skipped_updates == 2
+    assert book.synced
+
+
+def test_stale_and_decreasing_seq():
+    book = OrderBook('BTCUSDT', 50)
+    book.apply(snapshot(10, seq=100))
+    assert book.apply(delta(10)) == 'stale'
+    assert book.apply(delta(11, seq=50)) == 'gap'
+
+
+def test_crossed_book_is_a_gap():
+    book = OrderBook('BTCUSDT', 50)
+    book.apply(snapshot(10))
+    assert book.apply(delta(11, bids=(('102', '1'),))) == 'gap'
+
+
+def test_u_equal_one_resets_book():
+    book = OrderBook('BTCUSDT', 50)
+    book.apply(snapshot(10, bids=(('100', '1'),)))
+    assert book.apply(delta(1, bids=(('90', '1'),))) == 'snapshot'
+    assert book.snapshot()['bids'] == [(90.0, 1.0)]
+
+
+def test_manager_reports_gaps():
+    gaps, updates = [], []
+
+    class Client:
+        def subscribe_orderbook(self, symbols, depth, callback, raw):
+            assert raw
+            self.callback = callback
+
+    client = Client()
+    manager = OrderBookManager(client, ['BTCUSDT'], depth=50, callback=updates.append,
+                               on_gap=gaps.append).start()
+    client.callback(snapshot(10))
+    client.callback(delta(11))
+    client.callback(delta(13))
+    assert manager.stats['snapshot'] == 1 and manager.stats['delta'] == 1 and manager.stats['gap'] == 1
+    assert gaps == [manager.book('BTCUSDT')]
+    assert len(updates) == 2
+
+
+def test_load_snapshot_replays_pending_deltas():
+    book = OrderBook('BTCUSDT', 200)
+    book.apply(snapshot(10))
+    book.invalidate()
+    assert book.apply(delta(12, bids=(('99', '2'),))) == 'unsynced'
+    assert book.apply(delta(13, bids=(('98', '3'),))) == 'unsynced'
+    # Delta старше снимка отбрасываются, новее - применяются по порядку
+    assert book.load_snapshot({'b': [['100', '1']], 'a': [['101', '1']], 'u': 12, 'seq': 12})
+    assert book.update_id == 13
+    assert book.snapshot()['bids'] == [(100.0, 1.0), (98.0, 3.0)]
+
+
+def test_load_snapshot_older_than_pending_deltas_is_rejected():
+    book = OrderBook('BTCUSDT', 200)
+    book.apply(delta(15))
+    assert not book.load_snapshot({'b': [], 'a': [], 'u': 10, 'seq': 10})
+    assert not book.synced
+
+
+def test_load_snapshot_does_not_replace_synced_book():
+    book = OrderBook('BTCUSDT', 200)
+    book.apply(snapshot(20, bids=(('100', '1'),)))
+    assert not book.load_snapshot({'b': [['90', '1']], 'a': [], 'u': 10})
+    assert book.update_id == 20 and book.best_bid() == (100.0, 1.0)
@@ -0,0 +1,60 @@
+from bybit_client import BybitClient
+from order_registry import OrderRegistry
+
+
+class FakeHttp:
+    """pybit HTTP: открытые ордера биржи"""
+
+    def __init__(self, orders):
+        self.orders = orders
+        self.requests = 0
+
+    def get_open_orders(self, **params):
+        self.requests += 1
+        result = {'category': params['category'], 'list': [dict(o) for o in self.orders], 'nextPageCursor': ''}
+        return {'retCode': 0, 'retMsg': 'OK', 'result': result}, None, None
+
+
+def order(order_id, created, status='New', updated=None, symbol='BTCUSDT'):
+    return {'orderId': order_id, 'orderLinkId': f"link-{order_id}", 'symbol': symbol, 'side': 'Buy',
+            'orderStatus': status, 'qty': '1', 'price': '100', 'cumExecQty': '0',
+            'createdTime': str(created), 'updatedTime': str(updated or created)}
+
+
+def make_client(orders):
+    client = BybitClient(api_key='key', api_secret='secret', rate_limit=False)
+    client.client = FakeHttp(orders)
+    registry = OrderRegistry(client, categories=('linear',), settle_coins=('USDT',),
+                             reconcile_interval=None).start()
+    return client, registry
+
+
+def test_local_open_orders_are_copies_newest_first():
+    client, registry = make_client([order('1', 1000), order('2', 2000)])
+    response = client.get_open_orders('linear', 'BTCUSDT')
+    assert [o['orderId'] for o in response['result']['list']] == ['2', '1']
+    response['result']['list'][0]['price'] = '1'
+    registry.get(orderId='1')['qty'] = '5'
+    assert registry.get(orderId='2')['price'] == '100'
+    assert registry.get(orderLinkId='link-1')['qty'] == '1'
+    assert client.client.requests == 1
+
+
+def test_local_open_orders_respect_limit():
+    client, _ = make_client([order(str(i), 1000 + i) for i in range(3)])
+    assert len(client.get_open_orders('linear', limit=5)['result']['list']) == 3
+    # Больше страницы: запрос к бирже (настоящий nextPageCursor)
+    client.get_open_orders('linear', limit=2)
+    assert client.client.requests == 2
+
+
+def test_stream_updates_and_stale_messages():
+    _, registry = make_client([order('1', 1000)])
+    registry.on_order_message({'data': [dict(order('1', 1000, updated=3000), category='linear', qty='2')]})
+    registry.on_order_message({'data': [dict(order('1', 1000, updated=2000), category='linear', qty='9')]})
+    assert registry.get(orderId='1')['qty'] == '2'
+    registry.on_order_message({'data': [dict(order('1', 1000, 'Filled', 4000), category='linear')]})
+    assert registry.get(orderId='1') is None
+    # Запоздавшее сообщение не воскрешает закрытый ордер
+    registry.on_order_message({'data': [dict(order('1', 1000, updated=3500), category='linear')]})
+    assert len(registry) == 0
@@ -0,0 +1,73 @@
+import json
+import time
+from datetime import timedelta
+
+import pytest
+from pybit.exceptions import InvalidRequestError
+
+from bybit_client import BybitClient
+from rate_limiter import RateLimitScheduler, TokenBucket
+
+
+class FakeResponse:
+    """Ответ requests для сессии pybit"""
+
+    def __init__(self, payload, headers):
+        self.status_code = 200
+        self.payload = payload
+        self.headers = headers
+        self.text = json.dumps(payload)
+        self.elapsed = timedelta(milliseconds=5)
+        self.url = 'https://api.bybit.com/v5/market/tickers'
+
+    def json(self):
+        return self.payload
+
+
+def test_bucket_refill_and_block():
+    bucket = TokenBucket(2, 2)
+    bucket.consume(2)
+    assert 0.4 < bucket.time_until(1) <= 0.5
+    bucket.update(limit=10, remaining=0, reset_in=3)
+    assert bucket.time_until(1) > 2.5
+    assert bucket.capacity == 10
+
+
+def test_trading_requests_reserve_ip_limit():
+    scheduler = RateLimitScheduler(ip_limit=2, ip_window=100)
+    scheduler._waiting[0] = 1  # ордер ждет общий лимит
+    assert scheduler._try_acquire('market', 2, 1) == 0
+    # Последний токен общего лимита зарезервирован за ордером
+    assert scheduler._try_acquire('market', 2, 1) > 0
+    assert scheduler._try_acquire('order_create', 0, 1) == 0
+
+
+def test_headers_update_group_bucket():
+    scheduler = RateLimitScheduler()
+    reset = int(time.time() * 1000) + 2000
+    scheduler.update_from_headers('place_order', {'X-Bapi-Limit': '20', 'X-Bapi-Limit-Status': '0',
+                                                  'X-Bapi-Limit-Reset-Timestamp': str(reset)})
+    assert scheduler.buckets['order_create'].time_until(1) > 1.5
+    assert scheduler.buckets['market'].time_until(1) == 0
+
+
+def test_throttled_response_reaches_scheduler():
+    client = BybitClient(api_key='key', api_secret='secret', rate_limit=True, coalesce=False)
+    sent = []
+    reset = int(time.time() * 1000) + 3000
+    headers = {'X-Bapi-Limit': '50', 'X-Bapi-Limit-Status': '0', 'X-Bapi-Limit-Reset-Timestamp': str(reset)}
+
+    def send(request, timeout=None):
+        sent.append(request)
+        return FakeResponse({'retCode': 10006, 'retMsg': 'Too many visits!', 'result': {}}, headers)
+
+    client.client.client.send = send
+    started = time.monotonic()
+    with pytest.raises(InvalidRequestError) as error:
+        client.get_tickers(category='spot', symbol='BTCUSDT')
+    # pybit не спит до сброса лимита и не повторяет запрос сам
+    assert error.value.status_code == 10006
+    assert len(sent) == 1
+    assert time.monotonic() - started < 1
+    assert client.scheduler.stats['throttled'] == 1
+    assert client.scheduler.buckets['market'].time_until(1) > 2
@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from pybit.exceptions import InvalidRequestError
+
+from bybit_client import BybitClient
+from utils.metrics import MetricsRegistry
+from utils.retry import HedgePolicy, RetryPolicy
+
+
+def api_error(code):
+    return InvalidRequestError(request='req', message='error', status_code=code, time='0', resp_headers={})
+
+
+def test_retry_policy_retries_only_transient_errors():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    assert policy.next_delay(api_error(10016), 0) is not None
+    assert policy.next_delay(api_error(10016), 2) is None  # попытки исчерпаны
+    assert policy.next_delay(api_error(110007), 0) is None  # недостаточно средств
+    assert policy.next_delay(ConnectionError(), 0) is not None
+    assert policy.stats()['gave_up'] == 1
+
+
+class FlakyHttp:
+    def __init__(self, failures, code=10016):
+        self.failures = failures
+        self.code = code
+        self.calls = []
+
+    def _respond(self, method, params):
+        self.calls.append((method, params))
+        if self.failures:
+            self.failures -= 1
+            raise api_error(self.code)
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'orderId': '1', 'list': []}}, None, None
+
+    def place_order(self, **params):
+        return self._respond('place_order', params)
+
+    def get_tickers(self, **params):
+        return self._respond('get_tickers', params)
+
+
+def make_client(http):
+    client = BybitClient(api_key='key', api_secret='secret', rate_limit=False,
+                         retry=RetryPolicy(max_attempts=3, base_delay=0.001))
+    client.client = http
+    return client
+
+
+def test_client_retries_reads_and_orders_with_link_id_only():
+    http = FlakyHttp(failures=2)
+    make_client(http).get_tickers(category='spot', symbol='BTCUSDT')
+    assert len(http.calls) == 3
+
+    http = FlakyHttp(failures=1)
+    try:
+        make_client(http).place_order('linear', 'BTCUSDT', 'Buy', 'Limit', 1, price=100)
+    except InvalidRequestError:
+        pass
+    # Без orderLinkId повтор мог бы создать второй ордер
+    assert len(http.calls) == 1
+
+    http = FlakyHttp(failures=1)
+    make_client(http).place_order('linear', 'BTCUSDT', 'Buy', 'Limit', 1, price=100, orderLinkId='abc')
+    assert len(http.calls) == 2
+
+
+class FakeResponse:
+    """Ответ requests для сессии pybit"""
+
+    def __init__(self, payload):
+        self.status_code = 200
+        self.payload = payload
+        self.headers = {}
+        self.text = json.dumps(payload)
+        self.elapsed = timedelta(milliseconds=5)
+        self.url = 'https://api.bybit.com/v5/market/tickers'
+
+    def json(self):
+        return self.payload
+
+
+@pytest.mark.parametrize('code', [10002, 10006])
+def test_pybit_retry_codes_reach_policy(code):
+    client = BybitClient(api_key='key', api_secret='secret', rate_limit=False, coalesce=False,
+                         retry=RetryPolicy(max_attempts=3, base_delay=0.001))
+    responses = [{'retCode': code, 'retMsg': 'error', 'result': {}},
+                 {'retCode': 0, 'retMsg': 'OK', 'result': {'list': []}}]
+    sent = []
+
+    def send(request, timeout=None):
+        sent.append(request)
+        return FakeResponse(responses[len(sent) - 1])
+
+    client.client.client.send = send
+    assert client.get_tickers(category='spot', symbol='BTCUSDT')['retCode'] == 0
+    # Один повтор - от RetryPolicy, собственных повторов pybit нет
+    assert len(sent) == 2
+    assert client.retry.stats()['retries'] == 1
+
+
+class DuplicateHttp:
+    """Первая попытка place_order теряет ответ, повтор получает ошибку дубликата orderLinkId"""
+
+    def __init__(self, duplicate_code):
+        self.errors = [api_error(10016), api_error(duplicate_code)]
+        self.calls = []
+
+    def place_order(self, **params):
+        self.calls.append(('place_order', params))
+        raise self.errors.pop(0)
+
+    def get_open_orders(self, **params):
+        self.calls.append(('get_open_orders', params))
+        order = {'orderId': '42', 'orderLinkId': params['orderLinkId']}
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'list': [order]}, 'time': 1}, None, None
+
+
+@pytest.mark.parametrize('code', [110072, 170141])
+def test_duplicate_link_id_returns_placed_order(code):
+    http = DuplicateHttp(code)
+    response = make_client(http).place_order('linear', 'BTCUSDT', 'Buy', 'Limit', 1, price=100,
+                                             orderLinkId='abc')
+    assert response['result'] == {'orderId': '42', 'orderLinkId': 'abc'}
+    assert [method for method, _ in http.calls] == ['place_order', 'place_order', 'get_open_orders']
+    assert http.calls[-1][1]['orderLinkId'] == 'abc'
+
+
+class SlowHttp:
+    """Первый get_tickers отвечает с задержкой, следующие - сразу"""
+
+    def __init__(self, slow=0.5):
+        self.slow = slow
+        self.calls = 0
+        self.client = SimpleNamespace(close=lambda: None)  # сессия requests для close()
+        self._lock = threading.Lock()
+
+    def get_tickers(self, **params):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        if number == 1:
+            time.sleep(self.slow)
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'call': number}}, None, None
+
+
+def test_hedge_fires_after_delay_and_first_response_wins():
+    http = SlowHttp()
+    client = BybitClient(api_key='key', api_secret='secret', rate_limit=False, coalesce=False,
+                         hedge=HedgePolicy(default_delay=0.05))
+    client.client = http
+    try:
+        started = time.monotonic()
+        response = client.get_tickers(category='spot', symbol='BTCUSDT')
+        elapsed = time.monotonic() - started
+        assert response['result']['call'] == 2
+        assert 0.05 <= elapsed < 0.4
+        assert client.hedge.stats() == {'requests': 1, 'hedged': 1, 'hedge_wins': 1}
+
+        # Быстрый ответ укладывается в задержку: второй запрос не отправляется
+        client.get_tickers(category='spot', symbol='BTCUSDT')
+        assert http.calls == 3
+        assert client.hedge.stats() == {'requests': 2, 'hedged': 1, 'hedge_wins': 1}
+    finally:
+        client.close()
+
+
+def test_hedge_delay_follows_latency_percentile():
+    policy = HedgePolicy(percentile=95, min_samples=20, default_delay=0.2)
+    metrics = MetricsRegistry()
+    assert policy.delay(metrics, 'get_tickers') == 0.2
+    for latency in range(1, 101):
+        metrics.record('get_tickers', '/v5/market/tickers', latency)
+    assert 0.08 <= policy.delay(metrics, 'get_tickers') <= 0.12
@@ -0,0 +1,38 @@
+import threading
+
+from bybit_client import BybitClient
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', fetch)))
+    leader.start()
+    started.wait(2)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('key', fetch))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flight.stats()['coalesced'] < 3:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert results == ['result'] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {'calls': 4, 'executed': 1, 'coalesced': 3, 'in_flight': 0}
+
+
+def test_account_reads_are_not_coalesced_by_default():
+    client = BybitClient(api_key='key', api_secret='secret', rate_limit=False)
+    assert 'get_tickers' in client.coalesced_methods
+    assert not {'get_open_orders', 'get_positions', 'get_wallet_balance'} & client.coalesced_methods
@@ -0,0 +1,240 @@
+import threading
+
+from order_book import OrderBookManager
+from stream_resync import StreamResync
+
+
+class FakeWebSocket:
+    """Минимальный BybitWebSocketClient: подписки и обработчики разрыва"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.topic_ts = {}
+        self.disconnect_listeners = []
+        self.reconnect_listeners = []
+        self.subscribed = []
+        self.unsubscribed = []
+
+    def add_disconnect_listener(self, callback):
+        self.disconnect_listeners.append(callback)
+
+    def add_reconnect_listener(self, callback):
+        self.reconnect_listeners.append(callback)
+
+    def subscribe_trades(self, symbols, callback=None):
+        for symbol in symbols:
+            self.callbacks[f"publicTrade.{symbol}"] = callback
+
+    def subscribe_orderbook(self, symbols, depth=1, callback=None, raw=False):
+        for symbol in symbols:
+            self.callbacks[f"orderbook.{depth}.{symbol}"] = callback
+            self.subscribed.append(f"orderbook.{depth}.{symbol}")
+
+    def unsubscribe(self, topic):
+        self.unsubscribed.append(topic)
+
+    def disconnect(self, last_seen):
+        for listener in self.disconnect_listeners:
+            listener(self, last_seen)
+
+    def reconnect(self, last_seen):
+        for listener in self.reconnect_listeners:
+            listener(self, last_seen)
+
+
+class FakeClient:
+    def __init__(self, trades=(), orderbook=None):
+        self.trades = list(trades)
+        self.orderbook = orderbook
+        self.release = threading.Event()
+        self.release.set()
+        self.orderbook_calls = 0
+
+    def get_public_trade_history(self, category, symbol, limit):
+        self.release.wait(5)
+        # REST возвращает сделки от новых к старым
+        return {'result': {'list': sorted(self.trades, key=lambda t: -t['time'])}}
+
+    def get_orderbook(self, category, symbol, limit, use_cache=True):
+        self.orderbook_calls += 1
+        return {'result': self.orderbook}
+
+
+def rest_trade(i, ts, symbol='BTCUSDT'):
+    return {'execId': str(i), 'symbol': symbol, 'price': '100', 'size': '1', 'side': 'Buy', 'time': ts}
+
+
+def live(i, ts, symbol='BTCUSDT'):
+    return {'topic': f"publicTrade.{symbol}", 'ts': ts,
+            'data': [{'i': str(i), 's': symbol, 'T': ts, 'p': '100', 'v': '1', 'S': 'Buy'}]}
+
+
+def book_message(kind, u, symbol='BTCUSDT', depth=50):
+    return {'topic': f"orderbook.{depth}.{symbol}", 'type': kind, 'ts': u,
+            'data': {'s': symbol, 'b': [['100', '1']], 'a': [['101', '1']], 'u': u, 'seq': u}}
+
+
+def delivered_ids(received):
+    return [trade['i'] for message in received for trade in message['data']]
+
+
+def test_backfill_is_merged_with_buffered_trades_in_order():
+    ws = FakeWebSocket()
+    client = FakeClient(trades=[rest_trade(1, 1000), rest_trade(2, 2000), rest_trade(3, 3000),
+                                rest_trade(4, 4000)])
+    resync = StreamResync(client, ws, category="spot").start()
+    received = []
+    ws.subscribe_trades(['BTCUSDT'], callback=resync.track_trades(received.append))
+    handler = ws.callbacks['publicTrade.BTCUSDT']
+
+    handler(live(1, 1000))
+    ws.disconnect({'publicTrade.BTCUSDT': 1000})
+    # Сделки после переподключения приходят раньше ответа REST
+    handler(live(4, 4000))
+    handler(live(5, 5000))
+    resync.backfill_trades('BTCUSDT', 1000)
+
+    assert delivered_ids(received) == ['1', '2', '3', '4', '5']
+    assert received[1]['backfill'] is True
+    # Сделка 4 пришла и в ответе REST, и в буфере - передана один раз
+    assert resync.stats['backfilled_trades'] == 3
+    # Буфер передан: следующие сделки идут напрямую
+    handler(live(6, 6000))
+    assert delivered_ids(received)[-1] == '6'
+
+
+def test_reconnect_backfills_symbol_without_previous_trades():
+    ws = FakeWebSocket()
+    client = FakeClient(trades=[rest_trade(7, 10 ** 13)])
+    resync = StreamResync(client, ws, category="spot").start()
+    received = []
+    ws.subscribe_trades(['ETHUSDT'], callback=resync.track_trades(received.append))
+    client.trades = [rest_trade(7, 10 ** 13, symbol='ETHUSDT')]
+
+    ws.disconnect({})
+    ws.reconnect({})
+    for _ in range(100):
+        if resync.stats['resyncs']['trades']:
+            break
+        threading.Event().wait(0.01)
+    assert resync.stats['gaps']['reconnect'] == 1
+    assert delivered_ids(received) == ['7']
+
+
+def test_book_waits_for_stream_snapshot_after_reconnect():
+    ws = FakeWebSocket()
+    client = FakeClient(orderbook={'b': [['90', '1']], 'a': [['91', '1']], 'u': 5})
+    books = OrderBookManager(ws, ['BTCUSDT'], depth=50).start()
+    resynced = []
+    resync = StreamResync(client, ws, category="spot", books=books,
+                          on_resync=lambda topic, kind, info: resynced.append(info)).start()
+    ws.callbacks['orderbook.50.BTCUSDT'](book_message('snapshot', 10))
+
+    ws.disconnect({'orderbook.50.BTCUSDT': 10})
+    ws.reconnect({'orderbook.50.BTCUSDT': 10})
+    assert not books.book('BTCUSDT').synced
+    assert client.orderbook_calls == 0
+
+    ws.callbacks['orderbook.50.BTCUSDT'](book_message('snapshot', 100))
+    assert books.book('BTCUSDT').synced
+    assert resynced == [{'source': 'ws', 'u': 100}]
+    assert resync.stats['gaps']['reconnect'] == 1
+
+
+def test_sequence_gap_resubscribes_when_rest_depth_differs():
+    ws = FakeWebSocket()
+    books = OrderBookManager(ws, ['BTCUSDT'], depth=50).start()
+    StreamResync(FakeClient(), ws, category="spot", books=books).start()
+    callback = ws.callbacks['orderbook.50.BTCUSDT']
+    callback(book_message('snapshot', 10))
+    ws.subscribed.clear()
+
+    callback(book_message('delta', 12))
+    for _ in range(100):
+        if ws.subscribed:
+            break
+        threading.Event().wait(0.01)
+    assert ws.unsubscribed == ['orderbook.50.BTCUSDT']
+    assert ws.subscribed == ['orderbook.50.BTCUSDT']
+    assert not books.book('BTCUSDT').synced
+
+
+def test_rest_snapshot_at_matching_depth_replays_deltas():
+    ws = FakeWebSocket()
+    client = FakeClient(orderbook={'b': [['100', '1']], 'a': [['101', '1']], 'u': 11, 'seq': 11})
+    books = OrderBookManager(ws, ['BTCUSDT'], depth=200).start()
+    resync = StreamResync(client, ws, category="spot", books=books).start()
+    callback = ws.callbacks['orderbook.200.BTCUSDT']
+    callback(book_message('snapshot', 10, depth=200))
+    # Пропущен u=11: стакан загружается снимком REST в отдельном потоке
+    callback(book_message('delta', 12, depth=200))
+    for _ in range(100):
+        if resync.stats['resyncs']['book']:
+            break
+        threading.Event().wait(0.01)
+    assert client.orderbook_calls == 1
+    assert ws.unsubscribed == []
+    assert books.book('BTCUSDT').synced
+    assert books.book('BTCUSDT').update_id == 12
+
+
+class FakeManager:
+    """WebsocketManager SDK Hyperliquid без сети: разрыв - alive = False"""
+
+    instances = []
+
+    def __init__(self, base_url):
+        self.handlers = {}
+        self.alive = True
+        self.daemon = False
+        FakeManager.instances.append(self)
+
+    def subscribe(self, subscription, callback):
+        topic = f"{subscription['type']}.{subscription.get('coin', '')}".rstrip('.')
+        self.handlers[topic] = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.alive = False
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_hyperliquid_reconnect_and_silence_are_gaps(monkeypatch):
+    import hyperliquid_websocket
+
+    FakeManager.instances.clear()
+    monkeypatch.setattr(hyperliquid_websocket, 'codec_websocket_manager', lambda: FakeManager)
+    ws = hyperliquid_websocket.HyperliquidWebSocket(reconnect_interval=0.01)
+    ws.subscribe_trades(['BTC'], callback=lambda message: None)
+    ws.subscribe_orderbook(['BTC'], callback=lambda message: None)
+    gaps, reconnected = [], threading.Event()
+    resync = StreamResync(None, ws, on_gap=lambda topic, kind, info: gaps.append((topic, kind)),
+                          max_silence={'l2Book': 0.05})
+    resync.start()
+    ws.add_reconnect_listener(lambda client, last_seen: reconnected.set())
+    ws.start()
+    try:
+        manager = FakeManager.instances[-1]
+        # Сделки и стакан одной монеты - разные топики
+        assert set(manager.handlers) == {'trades.BTC', 'l2Book.BTC'}
+        manager.handlers['trades.BTC']({'channel': 'trades', 'data': []})
+        manager.handlers['l2Book.BTC']({'channel': 'l2Book', 'data': {}})
+
+        manager.alive = False
+        assert reconnected.wait(2)
+        assert sorted(gaps) == [('l2Book.BTC', 'reconnect'), ('trades.BTC', 'reconnect')]
+        assert set(FakeManager.instances[-1].handlers) == {'trades.BTC', 'l2Book.BTC'}
+
+        gaps.clear()
+        ws.topic_ts['l2Book.BTC'] -= 1000
+        resync.check_silence()
+        resync.check_silence()  # молчащий топик учитывается один раз
+        assert gaps == [('l2Book.BTC', 'silence')]
+        assert resync.stats['gaps'] == {'reconnect': 2, 'sequence': 0, 'silence': 1}
+    finally:
+        resync.stop()
+        ws.stop()
@@ -0,0 +1,79 @@
+from ws_pool import BybitWebSocketPool
+
+
+class FakeShard:
+    def __init__(self):
+        self.calls = []
+        self.unsubscribed = []
+        self.handler = None
+
+    def subscribe_trades(self, symbols, callback=None):
+        self.calls.append(list(symbols))
+        self.handler = callback
+
+    def unsubscribe(self, topic):
+        self.unsubscribed.append(topic)
+
+    def stop(self):
+        pass
+
+
+def make_pool(connections):
+    pool = BybitWebSocketPool(testnet=True, connections=connections)
+    pool.shards = [FakeShard() for _ in range(connections)]
+    return pool
+
+
+def trade(symbol, *ids):
+    return {'topic': f"publicTrade.{symbol}", 'data': [{'s': symbol, 'i': i} for i in ids or ('1',)]}
+
+
+def test_symbols_of_one_connection_are_subscribed_in_one_call():
+    pool = make_pool(2)
+    received = []
+    pool.subscribe_trades(['A', 'B', 'C', 'D'], callback=received.append)
+    assert [len(shard.calls) for shard in pool.shards] == [1, 1]
+    assert sorted(sum((shard.calls[0] for shard in pool.shards), [])) == ['A', 'B', 'C', 'D']
+
+    shard = pool.shards[pool.topics['publicTrade.A'].owner]
+    shard.handler(trade('A'))
+    assert received == [trade('A')]
+
+
+def test_rebalance_moves_topics_in_one_call_per_connection():
+    pool = make_pool(2)
+    pool.subscribe_trades(['A', 'B', 'C', 'D'], callback=lambda message: None)
+    # Вся нагрузка на соединении 0
+    for topic in pool.topics.values():
+        topic.owner = 0
+        topic.messages = 100
+    assert pool.rebalance(threshold=1.0) == 2
+    assert pool.shards[1].calls[-1] and len(pool.shards[1].calls) == 2
+
+    moved = pool.shards[1].calls[-1][0]
+    received = []
+    pool.topics[f"publicTrade.{moved}"].callback = received.append
+    # Старое соединение отбрасывается с первого сообщения нового
+    pool.shards[1].handler(trade(moved))
+    pool.shards[0].handler(trade(moved))
+    assert received == [trade(moved)]
+    assert pool.shards[0].unsubscribed == [f"publicTrade.{moved}"]
+
+
+def test_trades_from_both_connections_are_deduplicated_during_move():
+    pool = make_pool(2)
+    pool.subscribe_trades(['A'], callback=lambda message: None)
+    topic = pool.topics['publicTrade.A']
+    received = []
+    topic.callback = received.append
+    old = pool.shards[topic.owner]
+    new = pool.shards[1 - topic.owner]
+    old.handler(trade('A', '1', '2'))
+
+    topic.pending = 1 - topic.owner
+    topic.subscribe(new, ['A'], pool._routers[topic.pending])
+    # Новое соединение повторяет сделку 2, старое успевает прислать сделку 3
+    new.handler(trade('A', '2', '3'))
+    old.handler(trade('A', '3', '4'))
+    ids = [t['i'] for message in received for t in message['data']]
+    assert ids == ['1', '2', '3', '4']
@@ -0,0 +1,159 @@
+"""
+Синхронизация локального времени с сервером Bybit
+"""
+from pybit import _helpers
+import logging
+import threading
+import time
+
+
+class ClockSync:
+    """
+    Оценка смещения локальных часов относительно сервера Bybit.
+
+    Каждый раунд делает несколько замеров get_server_time и берет замер с
+    минимальным RTT (как в NTP): смещение = server_time - (t_send + t_recv) / 2.
+    Смещение и джиттер сглаживаются экспоненциальным средним.
+    """
+
+    def __init__(self, client, interval=30.0, samples=4, alpha=0.125):
+        """
+        Args:
+            client: Экземпляр BybitClient (или любой объект с get_server_time)
+            interval: Период синхронизации в секундах
+            samples: Замеров на раунд
+            alpha: Коэффициент сглаживания смещения и джиттера
+        """
+        self.client = client
+        self.interval = interval
+        self.samples = samples
+        self.alpha = alpha
+
+        self.offset_ms = 0.0
+        self.jitter_ms = 0.0
+        self.rtt_ms = None
+        self.last_sync = None
+        self.rounds = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _server_ms(response):
+        """Время сервера из ответа /v5/market/time в миллисекундах"""
+        result = response.get('result') or {}
+        if result.get('timeNano'):
+            return int(result['timeNano']) / 1e6
+        if result.get('timeSecond'):
+            return int(result['timeSecond']) * 1000.0
+        return float(response['time'])
+
+    def sample(self):
+        """
+        Один замер смещения
+
+        Returns:
+            tuple: (offset_ms, rtt_ms)
+        """
+        t_send = time.time() * 1000
+        response = self.client.get_server_time()
+        t_recv = time.time() * 1000
+        server = self._server_ms(response)
+        return server - (t_send + t_recv) / 2, t_recv - t_send
+
+    def sync(self):
+        """
+        Раунд синхронизации: лучший из нескольких замеров + сглаживание
+
+        Returns:
+            float: Сглаженное смещение в миллисекундах
+        """
+        best = None
+        for _ in range(self.samples):
+            try:
+                offset, rtt = self.sample()
+            except Exception as e:
+                logging.warning(f"Ошибка замера времени сервера: {e}")
+                continue
+            if best is None or rtt < best[1]:
+                best = (offset, rtt)
+
+        if best is None:
+            return self.offset_ms
+
+        offset, rtt = best
+        with self._lock:
+            if self.rounds == 0:
+                self.offset_ms = offset
+            else:
+                deviation = abs(offset - self.offset_ms)
+                self.jitter_ms += self.alpha * (deviation - self.jitter_ms)
+                self.offset_ms += self.alpha * (offset - self.offset_ms)
+            self.rtt_ms = rtt
+            self.last_sync = time.time()
+            self.rounds += 1
+
+        logging.debug(f"Синхронизация времени: offset={self.offset_ms:.1f}мс "
+                      f"jitter={self.jitter_ms:.1f}мс rtt={rtt:.1f}мс")
+        return self.offset_ms
+
+    def now_ms(self):
+        """Текущее время сервера Bybit (оценка) в миллисекундах"""
+        return time.time() * 1000 + self.offset_ms
+
+    def timestamp(self):
+        """Целочисленный timestamp для подписи запросов"""
+        return int(self.now_ms())
+
+    def latency_ms(self, exchange_ts, received_at=None):
+        """
+        Задержка доставки сообщения с поправкой на смещение часов
+
+        Args:
+            exchange_ts: Timestamp биржи (мс)
+            received_at: Локальное время получения (секунды, time.time()); по умолчанию - сейчас
+        """
+        received_ms = (received_at if received_at is not None else time.time()) * 1000
+        return received_ms + self.offset_ms - float(exchange_ts)
+
+    def apply_to_pybit(self):
+        """
+        Использовать скорректированное время для подписей pybit (HTTP и WebSocket auth).
+
+        pybit берет timestamp из pybit._helpers.generate_timestamp, поэтому замена
+        действует на весь процесс - как и само смещение локальных часов.
+        """
+        _helpers.generate_timestamp = self.timestamp
+
+    def state(self):
+        """Текущая оценка: смещение, джиттер, RTT, время последней синхронизации"""
+        with self._lock:
+            return {
+                'offset_ms': self.offset_ms,
+                'jitter_ms': self.jitter_ms,
+                'rtt_ms': self.rtt_ms,
+                'last_sync': self.last_sync,
+                'rounds': self.rounds,
+            }
+
+    def start(self):
+        """Запустить фоновую синхронизацию (первый раунд выполняется сразу)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.sync()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ClockSync", daemon=True)
+        self._thread.start()
+        logging.info(f"Синхронизация времени запущена (offset={self.offset_ms:.1f}мс)")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sync()
+
+    def stop(self):
+        """Остановить фоновую синхронизацию"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
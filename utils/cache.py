@@ -0,0 +1,85 @@
+"""
+In-memory кэш с временем жизни записей и вытеснением по LRU
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Потокобезопасный кэш ограниченного размера с TTL и LRU-вытеснением"""
+
+    def __init__(self, maxsize=1024, default_ttl=1.0):
+        """
+        Args:
+            maxsize: Максимальное количество записей
+            default_ttl: Время жизни записи по умолчанию (секунды)
+        """
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Получить значение из кэша
+
+        Returns:
+            tuple: (найдено, значение) - устаревшие записи считаются промахом
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, ttl=None):
+        """
+        Сохранить значение в кэше
+
+        Args:
+            key: Ключ (hashable)
+            value: Значение
+            ttl: Время жизни в секундах (если None, используется default_ttl)
+        """
+        expires = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Удалить запись по ключу или очистить весь кэш"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        """Статистика кэша: размер, попадания, промахи, вытеснения"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,82 @@
+"""
+Слияние обновлений: последнее значение по каждому символу не чаще одного раза за интервал
+"""
+import logging
+import threading
+
+
+class Conflator:
+    """
+    Хранит последнее значение по каждому ключу (символу) и раз в interval секунд
+    вызывает callback(changed) со словарем {символ: последнее значение} только для
+    символов, изменившихся с прошлого вызова. Сколько бы обновлений ни пришло,
+    обработчик вызывается не чаще одного раза за интервал.
+    """
+
+    def __init__(self, callback, interval=0.1, name="Conflator"):
+        """
+        Args:
+            callback: Функция callback(changed), changed - {символ: значение}
+            interval: Минимальный интервал между вызовами callback в секундах
+            name: Имя потока
+        """
+        self.callback = callback
+        self.interval = interval
+        self.latest = {}
+        # Изменения с прошлого вызова; flush подменяет словарь новым под блокировкой
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Один вызов callback за раз: пакеты доходят по порядку, ни один не передается дважды
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.stats = {'updates': 0, 'flushes': 0, 'delivered': 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def update(self, key, value):
+        """
+        Запомнить новое значение (одинаковое с текущим не считается изменением)
+
+        Словарь копируется: pybit передает для linear/inverse тикеров один и тот же
+        объект, изменяемый на месте каждым delta, и без копии сравнение всегда равно.
+        """
+        if isinstance(value, dict):
+            value = dict(value)
+        with self._lock:
+            self.stats['updates'] += 1
+            if self.latest.get(key) != value:
+                self.latest[key] = value
+                self._pending[key] = value
+
+    def get(self, key, default=None):
+        """Последнее значение ключа"""
+        return self.latest.get(key, default)
+
+    def flush(self):
+        """
+        Передать накопленные изменения обработчику (вызывается потоком по таймеру)
+
+        Можно вызывать из любого потока: накопленное забирает только один вызов, а
+        update не ждет, пока работает обработчик.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                changed, self._pending = self._pending, {}
+                self.stats['flushes'] += 1
+                self.stats['delivered'] += len(changed)
+            try:
+                self.callback(changed)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика обновлений: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        """Остановить таймер (оставшиеся изменения передаются обработчику)"""
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self.flush()
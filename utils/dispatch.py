@@ -0,0 +1,188 @@
+"""
+Очередь обработки сообщений WebSocket: прием отделен от пользовательских обработчиков
+"""
+from collections import deque
+import logging
+import threading
+
+
+# Политики переполнения очереди топика
+POLICY_BLOCK = 'block'              # поток приема ждет освобождения места
+POLICY_DROP_OLDEST = 'drop_oldest'  # самое старое сообщение выбрасывается
+POLICY_CONFLATE = 'conflate'        # хранится только последнее сообщение топика
+
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_CONFLATE)
+
+# Префиксы топиков, сообщения которых нельзя терять: delta стакана применяются к локальному
+# стакану по порядку u, и выброшенный delta ломает его до следующего snapshot
+LOSSLESS_PREFIXES = ('orderbook',)
+
+
+class _TopicQueue:
+    """Очередь одного топика и ее счетчики"""
+
+    __slots__ = ('items', 'policy', 'scheduled', 'processed', 'dropped', 'conflated', 'max_depth',
+                 'errors')
+
+    def __init__(self, policy):
+        self.items = deque()
+        self.policy = policy
+        self.scheduled = False
+        self.processed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+        self.errors = 0
+
+
+class Dispatcher:
+    """
+    Ограниченная очередь на каждый топик и пул обработчиков.
+
+    Сообщения одного топика обрабатываются строго по порядку (одним потоком
+    в каждый момент), разные топики - параллельно в workers потоках. Поток
+    приема WebSocket только кладет сообщение в очередь.
+
+    Для топиков LOSSLESS_PREFIXES всегда используется политика block: политика
+    по умолчанию к ним не применяется, а drop_oldest/conflate в topic_policies
+    для них отклоняются.
+    """
+
+    def __init__(self, workers=4, maxsize=1000, policy=POLICY_BLOCK, topic_policies=None):
+        """
+        Args:
+            workers: Количество потоков обработки
+            maxsize: Максимальная длина очереди топика
+            policy: Политика переполнения по умолчанию: 'block', 'drop_oldest', 'conflate'
+            topic_policies: Политики по префиксу топика, например
+                            {'tickers': 'conflate', 'kline': 'drop_oldest'}
+        """
+        for value in [policy, *(topic_policies or {}).values()]:
+            if value not in POLICIES:
+                raise ValueError(f"Неизвестная политика переполнения: {value}")
+        for topic, value in (topic_policies or {}).items():
+            if value != POLICY_BLOCK and self._is_lossless(topic):
+                raise ValueError(f"Для {topic} допустима только политика {POLICY_BLOCK}: "
+                                 f"потеря delta ломает локальный стакан")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.topic_policies = dict(topic_policies or {})
+
+        self._queues = {}
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self._threads = [threading.Thread(target=self._worker, name=f"Dispatch-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def _is_lossless(topic):
+        return isinstance(topic, str) and topic.split('.', 1)[0] in LOSSLESS_PREFIXES
+
+    def _policy_for(self, topic):
+        if self._is_lossless(topic):
+            return POLICY_BLOCK
+        prefix = topic.split('.', 1)[0] if isinstance(topic, str) else topic
+        return self.topic_policies.get(topic, self.topic_policies.get(prefix, self.policy))
+
+    def submit(self, topic, callback, message):
+        """
+        Поставить сообщение в очередь топика (вызывается из потока приема)
+
+        Args:
+            topic: Ключ очереди (например, 'tickers.BTCUSDT')
+            callback: Обработчик callback(message)
+            message: Сообщение
+        """
+        with self._cond:
+            queue = self._queues.get(topic)
+            if queue is None:
+                queue = self._queues[topic] = _TopicQueue(self._policy_for(topic))
+
+            if queue.policy == POLICY_CONFLATE:
+                if queue.items:
+                    queue.items.clear()
+                    queue.conflated += 1
+            elif len(queue.items) >= self.maxsize:
+                if queue.policy == POLICY_DROP_OLDEST:
+                    queue.items.popleft()
+                    queue.dropped += 1
+                else:
+                    while len(queue.items) >= self.maxsize and self._running:
+                        self._cond.wait()
+
+            queue.items.append((callback, message))
+            if len(queue.items) > queue.max_depth:
+                queue.max_depth = len(queue.items)
+            if not queue.scheduled:
+                queue.scheduled = True
+                self._ready.append(topic)
+                self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready and self._running:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                topic = self._ready.popleft()
+                queue = self._queues[topic]
+                callback, message = queue.items.popleft()
+                # Освободилось место: будим поток приема, ждущий по политике block
+                self._cond.notify_all()
+
+            failed = False
+            try:
+                callback(message)
+            except Exception as e:
+                failed = True
+                logging.error(f"Ошибка обработчика {topic}: {e}")
+
+            with self._cond:
+                queue.processed += 1
+                queue.errors += failed
+                if queue.items:
+                    # В конец очереди готовых топиков - остальные топики не голодают
+                    self._ready.append(topic)
+                    self._cond.notify_all()
+                else:
+                    queue.scheduled = False
+
+    def stats(self):
+        """
+        Счетчики очередей
+
+        Returns:
+            dict: {'topics': {топик: {...}}, 'depth', 'dropped', 'conflated', 'processed'}
+        """
+        with self._cond:
+            topics = {
+                topic: {
+                    'policy': q.policy,
+                    'depth': len(q.items),
+                    'max_depth': q.max_depth,
+                    'processed': q.processed,
+                    'dropped': q.dropped,
+                    'conflated': q.conflated,
+                    'errors': q.errors,
+                }
+                for topic, q in self._queues.items()
+            }
+        return {
+            'topics': topics,
+            'depth': sum(t['depth'] for t in topics.values()),
+            'processed': sum(t['processed'] for t in topics.values()),
+            'dropped': sum(t['dropped'] for t in topics.values()),
+            'conflated': sum(t['conflated'] for t in topics.values()),
+        }
+
+    def stop(self, timeout=1.0):
+        """Остановить потоки обработки (оставшиеся сообщения обрабатываются, пока есть время)"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
@@ -0,0 +1,202 @@
+"""
+Метрики запросов: гистограммы задержек, коды ошибок, размеры ответов
+"""
+import logging
+import math
+import threading
+import time
+
+
+# Границы гистограммы: от 0.05 мс до ~100 с, 8 корзин на каждое удвоение (шаг ~9%)
+_MIN_MS = 0.05
+_BUCKETS_PER_DOUBLING = 8
+_BUCKET_COUNT = 21 * _BUCKETS_PER_DOUBLING
+_LOG_BASE = math.log(2) / _BUCKETS_PER_DOUBLING
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с логарифмическими корзинами фиксированного размера"""
+
+    __slots__ = ('counts', 'count', 'total', 'max', 'min')
+
+    def __init__(self):
+        self.counts = [0] * (_BUCKET_COUNT + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.min = None
+
+    def record(self, value_ms):
+        """Добавить значение (мс)"""
+        if value_ms <= _MIN_MS:
+            index = 0
+        else:
+            index = min(_BUCKET_COUNT, int(math.log(value_ms / _MIN_MS) / _LOG_BASE) + 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+        if self.min is None or value_ms < self.min:
+            self.min = value_ms
+
+    def percentile(self, p):
+        """Оценка перцентиля p (0-100) по верхней границе корзины"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                upper = _MIN_MS * math.exp(index * _LOG_BASE)
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self):
+        """Сводка: count, mean, p50, p90, p99, max"""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'min': self.min,
+            'max': self.max if self.count else None,
+        }
+
+
+class _RequestStats:
+    """Статистика одного метода или эндпоинта"""
+
+    __slots__ = ('latency', 'phases', 'errors', 'bytes', 'responses')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.phases = {}
+        self.errors = {}
+        self.bytes = 0
+        self.responses = 0
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик запросов по методам клиента и эндпоинтам API.
+
+    Запись - O(1) под одной блокировкой; snapshot() и экспорт выполняются
+    вне горячего пути.
+    """
+
+    def __init__(self):
+        self._methods = {}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._exporter_thread = None
+        self._exporter_stop = threading.Event()
+
+    def _stats(self, table, key):
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = _RequestStats()
+        return stats
+
+    def record(self, method, endpoint, latency_ms, ret_code=0, size=None, phases=None):
+        """
+        Зафиксировать запрос
+
+        Args:
+            method: Имя метода клиента (например, 'get_tickers')
+            endpoint: Путь эндпоинта (например, '/v5/market/tickers')
+            latency_ms: Полное время запроса (мс)
+            ret_code: retCode ответа (0 - успех) или код/метка ошибки
+            size: Размер ответа в байтах (если известен)
+            phases: Время этапов {этап: мс}, например {'sign': .., 'network': .., 'parse': ..}
+        """
+        with self._lock:
+            for stats in (self._stats(self._methods, method), self._stats(self._endpoints, endpoint)):
+                stats.latency.record(latency_ms)
+                if ret_code:
+                    stats.errors[ret_code] = stats.errors.get(ret_code, 0) + 1
+                if size is not None:
+                    stats.bytes += size
+                    stats.responses += 1
+                if phases:
+                    for phase, value in phases.items():
+                        histogram = stats.phases.get(phase)
+                        if histogram is None:
+                            histogram = stats.phases[phase] = LatencyHistogram()
+                        histogram.record(value)
+
+    def latency_percentile(self, method, p, min_count=0):
+        """Перцентиль задержки метода (мс) или None, если замеров меньше min_count (или нет)"""
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None or stats.latency.count < min_count:
+                return None
+            return stats.latency.percentile(p)
+
+    @staticmethod
+    def _describe(stats):
+        return {
+            'latency_ms': stats.latency.summary(),
+            'phases_ms': {phase: h.summary() for phase, h in stats.phases.items()},
+            'errors': dict(stats.errors),
+            'bytes_total': stats.bytes,
+            'bytes_avg': stats.bytes / stats.responses if stats.responses else None,
+        }
+
+    def snapshot(self):
+        """
+        Снимок метрик
+
+        Returns:
+            dict: {'methods': {метод: ...}, 'endpoints': {эндпоинт: ...}, 'timestamp': ...}
+        """
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'methods': {k: self._describe(v) for k, v in self._methods.items()},
+                'endpoints': {k: self._describe(v) for k, v in self._endpoints.items()},
+            }
+
+    def reset(self):
+        """Сбросить все метрики"""
+        with self._lock:
+            self._methods.clear()
+            self._endpoints.clear()
+
+    def start_exporter(self, exporter, interval=10.0):
+        """
+        Периодически передавать снимок метрик во внешний экспортер
+
+        Args:
+            exporter: Функция exporter(snapshot), например запись в лог или Prometheus
+            interval: Период экспорта в секундах
+        """
+        self.stop_exporter()
+        self._exporter_stop.clear()
+
+        def run():
+            while not self._exporter_stop.wait(interval):
+                try:
+                    exporter(self.snapshot())
+                except Exception as e:
+                    logging.error(f"Ошибка экспорта метрик: {e}")
+
+        self._exporter_thread = threading.Thread(target=run, name="MetricsExporter", daemon=True)
+        self._exporter_thread.start()
+
+    def stop_exporter(self):
+        """Остановить экспорт метрик"""
+        if self._exporter_thread:
+            self._exporter_stop.set()
+            self._exporter_thread.join(timeout=1)
+            self._exporter_thread = None
+
+
+def log_exporter(snapshot):
+    """Экспортер по умолчанию: краткая сводка по методам в лог"""
+    for method, stats in sorted(snapshot['methods'].items()):
+        latency = stats['latency_ms']
+        logging.info(f"{method}: n={latency['count']} p50={latency['p50']:.1f}мс "
+                     f"p99={latency['p99']:.1f}мс max={latency['max']:.1f}мс errors={stats['errors']}")
@@ -0,0 +1,156 @@
+"""
+Повторы запросов с экспоненциальной задержкой и хеджирование медленных чтений
+"""
+from pybit.exceptions import InvalidRequestError, FailedRequestError
+import random
+import threading
+
+
+# retCode временных ошибок Bybit, после которых запрос можно повторить
+RETRYABLE_RET_CODES = {
+    10000,   # Server Timeout
+    10002,   # Время запроса вне recv_window (повтор подписывается заново)
+    10006,   # Превышен лимит запросов (повтор ждет корзину планировщика)
+    10016,   # Internal server error / service restarting
+    10019,   # Service restarting
+    10429,   # System level frequency protection
+    170007,  # Timeout waiting for response from backend server
+    170032,  # Network error
+}
+
+# HTTP статусы временных ошибок (409 - pybit не смог разобрать JSON ответа)
+RETRYABLE_HTTP_STATUSES = {409, 500, 502, 503, 504}
+
+# retCode "orderLinkId уже существует" (linear/inverse, spot)
+DUPLICATE_ORDER_LINK_ID_CODES = {110072, 170141}
+
+
+def classify_error(error):
+    """
+    Классификация ошибки запроса
+
+    Returns:
+        str: 'retryable' - временная ошибка, 'fatal' - повтор не поможет
+    """
+    if isinstance(error, InvalidRequestError):
+        return 'retryable' if error.status_code in RETRYABLE_RET_CODES else 'fatal'
+    if isinstance(error, FailedRequestError):
+        return 'retryable' if error.status_code in RETRYABLE_HTTP_STATUSES else 'fatal'
+    # Сетевые ошибки requests (ConnectionError, ReadTimeout, SSLError) - подклассы OSError
+    if isinstance(error, OSError):
+        return 'retryable'
+    return 'fatal'
+
+
+def error_code(error):
+    """Код ошибки для статистики: retCode, http_<status> или имя класса"""
+    if isinstance(error, InvalidRequestError):
+        return error.status_code
+    if isinstance(error, FailedRequestError):
+        return f"http_{error.status_code}"
+    return type(error).__name__
+
+
+class RetryPolicy:
+    """
+    Повтор временных ошибок с экспоненциальной задержкой и полным джиттером:
+    задержка попытки n - случайная величина в [0, min(max_delay, base_delay * 2^n)].
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.1, max_delay=2.0):
+        """
+        Args:
+            max_attempts: Всего попыток, включая первую
+            base_delay: Базовая задержка в секундах
+            max_delay: Максимальная задержка в секундах
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.gave_up = 0
+        self.errors = {}
+
+    def next_delay(self, error, attempt):
+        """
+        Задержка перед повтором или None, если повторять не нужно
+
+        Args:
+            error: Исключение последней попытки
+            attempt: Номер неудачной попытки (с 0)
+        """
+        retryable = classify_error(error) == 'retryable'
+        with self._lock:
+            code = error_code(error)
+            self.errors[code] = self.errors.get(code, 0) + 1
+            if not retryable:
+                return None
+            if attempt + 1 >= self.max_attempts:
+                self.gave_up += 1
+                return None
+            self.retries += 1
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def stats(self):
+        """Счетчики: повторов, исчерпанных попыток, ошибок по кодам"""
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'gave_up': self.gave_up,
+                'errors': dict(self.errors),
+            }
+
+
+class HedgePolicy:
+    """
+    Хеджирование чтений: если ответ не пришел за перцентиль задержки метода,
+    отправляется второй такой же запрос и используется первый ответ.
+    """
+
+    def __init__(self, percentile=95, min_samples=20, default_delay=0.2, min_delay=0.01,
+                 max_delay=1.0):
+        """
+        Args:
+            percentile: Перцентиль задержки метода, после которого отправляется второй запрос
+            min_samples: Сколько замеров нужно, чтобы доверять перцентилю
+            default_delay: Задержка хеджирования (секунды), пока замеров мало
+            min_delay: Нижняя граница задержки (секунды)
+            max_delay: Верхняя граница задержки (секунды)
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self, metrics, method):
+        """Через сколько секунд отправлять второй запрос"""
+        value = metrics.latency_percentile(method, self.percentile, min_count=self.min_samples)
+        if value is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, value / 1000))
+
+    def record(self, hedged, hedge_won=False):
+        """Учесть запрос: был ли отправлен второй запрос и ответил ли он первым"""
+        with self._lock:
+            self.requests += 1
+            if hedged:
+                self.hedged += 1
+            if hedge_won:
+                self.hedge_wins += 1
+
+    def stats(self):
+        """Счетчики: запросов, хеджированных, побед второго запроса"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+            }
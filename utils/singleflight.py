@@ -0,0 +1,77 @@
+"""
+Объединение одинаковых одновременных вызовов (single-flight)
+"""
+import threading
+
+
+class _Flight:
+    """Выполняющийся вызов, результат которого ждут остальные"""
+
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Пока вызов с ключом key выполняется, повторные вызовы с тем же ключом
+    не запускают функцию, а получают результат (или исключение) первого.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Выполнить fn() или дождаться результата такого же вызова
+
+        Args:
+            key: Ключ вызова (hashable), например (метод, параметры)
+            fn: Функция без аргументов
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        """Счетчики: всего вызовов, выполнено запросов, сэкономлено запросов"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights),
+            }
@@ -1,44 +1,281 @@
 """
 WebSocket клиент для получения данных в реальном времени от Bybit
 """
-from pybit.unified_trading import WebSocket
 from config import Config
+import codec
+import json
 import logging
+import threading
 import time
 from datetime import datetime
+from uuid import uuid4
+
+
+# Максимум топиков (args) в одном запросе subscribe по типу канала
+SUBSCRIBE_ARGS_LIMIT = {'spot': 10}
+# Ограничение суммарной длины args одного запроса (остальные каналы)
+SUBSCRIBE_ARGS_MAX_CHARS = 21000
 
 
 class BybitWebSocketClient:
     """Класс для работы с WebSocket потоками Bybit"""
 
-    def __init__(self, testnet=None, channel_type="spot"):
+    def __init__(self, testnet=None, channel_type="spot", clock=None, dispatcher=None):
         """
         Инициализация WebSocket клиента
 
         Args:
             testnet: Использовать testnet (если None, берется из config)
             channel_type: Тип канала - "spot", "linear", "inverse", "option", "private"
+            clock: ClockSync для сравнения timestamp биржи с локальным временем
+            dispatcher: utils.dispatch.Dispatcher - обработчики вызываются в его потоках,
+                        а не в потоке приема WebSocket (True - Dispatcher по умолчанию)
         """
         self.testnet = testnet if testnet is not None else Config.TESTNET
         self.channel_type = channel_type
         self.callbacks = {}
+        self.clock = clock
 
-        # Для приватных каналов нужны ключи
-        if channel_type == "private":
-            self.ws = WebSocket(
-                testnet=self.testnet,
-                channel_type=channel_type,
-                api_key=Config.API_KEY,
-                api_secret=Config.API_SECRET
-            )
-        else:
-            self.ws = WebSocket(
-                testnet=self.testnet,
-                channel_type=channel_type
-            )
+        # Свой Dispatcher останавливается в stop(), переданный извне - нет
+        self._owns_dispatcher = dispatcher is True
+        if dispatcher is True:
+            from utils.dispatch import Dispatcher
+
+            dispatcher = Dispatcher()
+        self.dispatcher = dispatcher
+
+        # Слияние тикеров (subscribe_ticker(conflate=...)), останавливаются в stop()
+        self._conflators = []
+
+        # Соединение pybit создается при первой подписке (см. свойство ws)
+        self._ws = None
+        # topic -> обработчик сырых сообщений (без слияния snapshot/delta в pybit)
+        self._raw_handlers = {}
+
+        # Пакетные подписки: req_id -> топики запроса, req_id без подтверждения биржи
+        self._sub_requests = {}
+        self._pending = set()
+        self._sub_cond = threading.Condition()
+        self.failed_topics = {}
+        self.subscription_stats = {'frames': 0, 'topics': 0, 'confirmed': 0, 'failed': 0}
+
+        # Переподключения: topic -> ts последнего сообщения, обработчики переподключения
+        self.topic_ts = {}
+        self.reconnects = 0
+        self._disconnect_listeners = []
+        self._reconnect_listeners = []
 
         logging.info(f"WebSocket клиент инициализирован (testnet={self.testnet}, channel={channel_type})")
 
+    @property
+    def ws(self):
+        """WebSocket pybit; pybit импортируется и соединение открывается при первом обращении"""
+        if self._ws is None:
+            from pybit.unified_trading import WebSocket
+
+            # Для приватных каналов нужны ключи
+            if self.channel_type == "private":
+                ws = WebSocket(
+                    testnet=self.testnet,
+                    channel_type=self.channel_type,
+                    api_key=Config.API_KEY,
+                    api_secret=Config.API_SECRET
+                )
+            else:
+                ws = WebSocket(
+                    testnet=self.testnet,
+                    channel_type=self.channel_type
+                )
+
+            # Декодирование входящих сообщений быстрым JSON кодеком (orjson/msgspec)
+            # и доставка сырых сообщений подписок с raw=True
+            ws._on_message = self._decode_message
+            # Первое соединение открыто в конструкторе pybit, дальше _connect - только переподключения
+            connect = ws._connect
+            ws._connect = lambda url: self._reconnect(connect, url)
+            self._ws = ws
+        return self._ws
+
+    def _reconnect(self, connect, url):
+        """Переподключение pybit: pybit повторяет запросы subscribe, затем вызываются обработчики"""
+        last_seen = dict(self.topic_ts)
+        with self._sub_cond:
+            # Повторные запросы снова ждут подтверждения
+            self._pending.update(self._sub_requests)
+        logging.warning(f"WebSocket {self.channel_type}: соединение потеряно, переподключение...")
+        self._notify(self._disconnect_listeners, last_seen)
+        connect(url)
+        self.reconnects += 1
+        logging.info(f"WebSocket {self.channel_type}: переподключено, повторено запросов "
+                     f"subscribe: {len(self._sub_requests)}")
+        self._notify(self._reconnect_listeners, last_seen)
+
+    def _notify(self, listeners, last_seen):
+        for listener in list(listeners):
+            try:
+                listener(self, last_seen)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика переподключения: {e}")
+
+    def add_disconnect_listener(self, callback):
+        """
+        Вызывать callback(client, last_seen) при разрыве, до повторных подписок
+
+        Сообщения новых подписок еще не пришли: здесь можно пометить состояние
+        устаревшим (см. add_reconnect_listener).
+        """
+        self._disconnect_listeners.append(callback)
+
+    def add_reconnect_listener(self, callback):
+        """
+        Вызывать callback(client, last_seen) после каждого переподключения
+
+        last_seen - {топик: ts последнего сообщения до разрыва (мс)}; данные после
+        этих ts могли быть пропущены.
+        """
+        self._reconnect_listeners.append(callback)
+
+    def _decode_message(self, raw):
+        """Разбор сообщения WebSocket (замена json.loads в pybit)"""
+        message = codec.loads(raw)
+        if self.ws._is_custom_pong(message):
+            return
+        topic = message.get('topic')
+        if topic is None:
+            if message.get('op') in ('subscribe', 'unsubscribe') and self._on_command_response(message):
+                return
+        else:
+            self.topic_ts[topic] = message.get('ts')
+            handler = self._raw_handlers.get(topic)
+            if handler is not None:
+                # Сообщение как есть: pybit не сливает delta в копию стакана
+                handler(message)
+                return
+            if topic not in self.ws.callback_directory:
+                # Запоздавшее сообщение топика, от которого уже отписались
+                return
+        self.ws.callback(message)
+
+    # === Пакетные подписки ===
+
+    def _batches(self, topics):
+        """Разбить топики на запросы subscribe с учетом лимитов биржи"""
+        limit = SUBSCRIBE_ARGS_LIMIT.get(self.channel_type)
+        batch, length = [], 0
+        for topic in topics:
+            size = len(topic) + 3
+            if batch and ((limit and len(batch) >= limit) or length + size > SUBSCRIBE_ARGS_MAX_CHARS):
+                yield batch
+                batch, length = [], 0
+            batch.append(topic)
+            length += size
+        if batch:
+            yield batch
+
+    def _subscribe_topics(self, handlers):
+        """
+        Подписаться на топики пакетными запросами (несколько args в одном subscribe)
+
+        Запросы сохраняются в pybit, поэтому при переподключении pybit повторяет
+        те же несколько запросов. Подтверждения биржи (success по req_id)
+        отслеживаются в subscription_status() и wait_subscribed().
+
+        Args:
+            handlers: Словарь {топик: обработчик}
+
+        Returns:
+            list: req_id отправленных запросов
+        """
+        ws = self.ws
+        ws._check_callback_directory(handlers)
+        while not ws.is_connected():
+            # Ждем открытия соединения
+            time.sleep(0.1)
+
+        req_ids = []
+        for args in self._batches(list(handlers)):
+            req_id = str(uuid4())
+            frame = json.dumps({"op": "subscribe", "req_id": req_id, "args": args})
+            # Обработчики до отправки: первое сообщение может прийти сразу после подтверждения
+            for topic in args:
+                ws._set_callback(topic, handlers[topic])
+            with self._sub_cond:
+                self._sub_requests[req_id] = args
+                self._pending.add(req_id)
+                self.subscription_stats['frames'] += 1
+                self.subscription_stats['topics'] += len(args)
+            ws.subscriptions[req_id] = frame
+            ws.ws.send(frame)
+            req_ids.append(req_id)
+        return req_ids
+
+    def _on_command_response(self, message):
+        """
+        Подтверждение subscribe/unsubscribe по req_id
+
+        Returns:
+            bool: True, если запрос отправлен этим клиентом (pybit его не получает)
+        """
+        req_id = message.get('req_id')
+        if message.get('op') == 'unsubscribe':
+            if req_id in self.ws.subscriptions:
+                # Отписка через pybit (приватные потоки)
+                return False
+            if not message.get('success'):
+                logging.error(f"Ошибка отписки: {message.get('ret_msg')}")
+            return True
+
+        with self._sub_cond:
+            args = self._sub_requests.get(req_id)
+            if args is None:
+                return False
+            self._pending.discard(req_id)
+            if message.get('success'):
+                self.subscription_stats['confirmed'] += 1
+                logging.debug(f"Подписка подтверждена: {args}")
+            else:
+                # Запрос отклонен целиком: убираем его, чтобы не повторять при переподключении
+                self.subscription_stats['failed'] += 1
+                del self._sub_requests[req_id]
+                self.ws.subscriptions.pop(req_id, None)
+                for topic in args:
+                    self.ws.callback_directory.pop(topic, None)
+                    self._raw_handlers.pop(topic, None)
+                    self.callbacks.pop(topic, None)
+                    self.failed_topics[topic] = message.get('ret_msg')
+                logging.error(f"Подписка на {args} отклонена: {message.get('ret_msg')}")
+            self._sub_cond.notify_all()
+        return True
+
+    def wait_subscribed(self, timeout=10.0):
+        """
+        Дождаться подтверждения всех отправленных запросов subscribe
+
+        Returns:
+            bool: True, если все запросы подтверждены (или отклонены) за timeout
+        """
+        with self._sub_cond:
+            return self._sub_cond.wait_for(lambda: not self._pending, timeout)
+
+    def subscription_status(self):
+        """
+        Состояние подписок
+
+        Returns:
+            dict: {'frames', 'topics', 'confirmed', 'failed' - счетчики запросов/топиков,
+                   'pending': [топики без подтверждения], 'failed_topics': {топик: ошибка}}
+        """
+        with self._sub_cond:
+            pending = [topic for req_id in self._pending for topic in self._sub_requests[req_id]]
+            return {**self.subscription_stats, 'pending': pending, 'failed_topics': dict(self.failed_topics)}
+
+    def _dispatch(self, topic, callback):
+        """Обработчик для pybit: при заданном dispatcher сообщение ставится в очередь топика"""
+        if self.dispatcher is None:
+            return callback
+        dispatcher = self.dispatcher
+        return lambda message: dispatcher.submit(topic, callback, message)
+
     def subscribe_trades(self, symbols, callback=None):
         """
         Подписка на поток последних сделок
@@ -50,16 +287,13 @@ class BybitWebSocketClient:
         if callback is None:
             callback = self._default_trade_handler
 
-        for symbol in symbols:
-            topic = f"publicTrade.{symbol}"
-            self.ws.trade_stream(
-                symbol=symbol,
-                callback=callback
-            )
+        topics = {f"publicTrade.{symbol}": symbol for symbol in symbols}
+        self._subscribe_topics({topic: self._dispatch(topic, callback) for topic in topics})
+        for topic, symbol in topics.items():
             self.callbacks[topic] = callback
             logging.info(f"Подписка на trades для {symbol}")
 
-    def subscribe_orderbook(self, symbols, depth=1, callback=None):
+    def subscribe_orderbook(self, symbols, depth=1, callback=None, raw=False):
         """
         Подписка на поток изменений стакана заявок
 
@@ -67,17 +301,18 @@ class BybitWebSocketClient:
             symbols: Список символов
             depth: Глубина стакана (1, 50, 200, 500)
             callback: Функция обработки данных
+            raw: Передавать сообщения как есть (type snapshot/delta) без слияния
+                 в pybit - для собственного стакана (order_book.OrderBookManager)
         """
         if callback is None:
             callback = self._default_orderbook_handler
 
-        for symbol in symbols:
-            topic = f"orderbook.{depth}.{symbol}"
-            self.ws.orderbook_stream(
-                depth=depth,
-                symbol=symbol,
-                callback=callback
-            )
+        topics = {f"orderbook.{depth}.{symbol}": symbol for symbol in symbols}
+        handlers = {topic: self._dispatch(topic, callback) for topic in topics}
+        if raw:
+            self._raw_handlers.update(handlers)
+        self._subscribe_topics(handlers)
+        for topic, symbol in topics.items():
             self.callbacks[topic] = callback
             logging.info(f"Подписка на orderbook (depth={depth}) для {symbol}")
 
@@ -93,35 +328,145 @@ class BybitWebSocketClient:
         if callback is None:
             callback = self._default_kline_handler
 
-        for symbol in symbols:
-            topic = f"kline.{interval}.{symbol}"
-            self.ws.kline_stream(
-                interval=interval,
-                symbol=symbol,
-                callback=callback
-            )
+        topics = {f"kline.{interval}.{symbol}": symbol for symbol in symbols}
+        self._subscribe_topics({topic: self._dispatch(topic, callback) for topic in topics})
+        for topic, symbol in topics.items():
             self.callbacks[topic] = callback
             logging.info(f"Подписка на kline (interval={interval}) для {symbol}")
 
-    def subscribe_ticker(self, symbols, callback=None):
+    def subscribe_ticker(self, symbols, callback=None, conflate=None):
         """
         Подписка на поток тикеров (24h статистика)
 
         Args:
             symbols: Список символов
             callback: Функция обработки данных
+            conflate: Интервал слияния в секундах. Если задан, хранится только последний
+                      тикер каждого символа, а callback(changed) вызывается не чаще раза
+                      за интервал со словарем {символ: data тикера} изменившихся символов
+
+        Returns:
+            Conflator при conflate, иначе None
         """
-        if callback is None:
+        conflator = None
+        if conflate:
+            from utils.conflation import Conflator
+
+            conflator = Conflator(callback or self._default_conflated_ticker_handler, conflate,
+                                  name="TickerConflator")
+            self._conflators.append(conflator)
+            callback = lambda message: conflator.update(message['data']['symbol'], message['data'])
+        elif callback is None:
             callback = self._default_ticker_handler
 
-        for symbol in symbols:
-            topic = f"tickers.{symbol}"
-            self.ws.ticker_stream(
-                symbol=symbol,
-                callback=callback
-            )
+        topics = {f"tickers.{symbol}": symbol for symbol in symbols}
+        self._subscribe_topics({topic: self._dispatch(topic, callback) for topic in topics})
+        for topic, symbol in topics.items():
             self.callbacks[topic] = callback
             logging.info(f"Подписка на ticker для {symbol}")
+        return conflator
+
+    def unsubscribe(self, topic):
+        """
+        Отписаться от топика (например, 'orderbook.50.BTCUSDT')
+
+        Топик убирается из пакетного запроса subscribe, остальные топики запроса
+        остаются подписанными (и повторяются при переподключении).
+
+        Raises:
+            NotImplementedError: Если установленная версия pybit не поддерживает отписку
+                                 (приватные потоки)
+        """
+        ws = self.ws
+        with self._sub_cond:
+            req_id = next((r for r, args in self._sub_requests.items() if topic in args), None)
+            if req_id is not None:
+                args = self._sub_requests[req_id]
+                args.remove(topic)
+                if args:
+                    ws.subscriptions[req_id] = json.dumps({"op": "subscribe", "req_id": req_id, "args": args})
+                else:
+                    del self._sub_requests[req_id]
+                    self._pending.discard(req_id)
+                    ws.subscriptions.pop(req_id, None)
+
+        if req_id is not None:
+            ws.ws.send(json.dumps({"op": "unsubscribe", "req_id": str(uuid4()), "args": [topic]}))
+            ws.callback_directory.pop(topic, None)
+            ws.data.pop(topic, None)
+        elif hasattr(ws, 'unsubscribe'):
+            ws.unsubscribe(topic)
+        else:
+            raise NotImplementedError("Установленная версия pybit не поддерживает unsubscribe")
+        self._raw_handlers.pop(topic, None)
+        self.callbacks.pop(topic, None)
+        logging.info(f"Отписка от {topic}")
+
+    # === Private Streams (channel_type="private") ===
+
+    def _subscribe_private(self, topic, stream, callback):
+        if self.channel_type != "private":
+            raise ValueError(f"Поток {topic} доступен только для channel_type='private'")
+        if callback is None:
+            callback = self._default_private_handler
+        getattr(self.ws, stream)(callback=self._dispatch(topic, callback))
+        self.callbacks[topic] = callback
+        logging.info(f"Подписка на приватный поток {topic}")
+
+    def subscribe_wallet(self, callback=None):
+        """
+        Подписка на изменения баланса кошелька
+
+        Args:
+            callback: Функция обработки данных
+        """
+        self._subscribe_private("wallet", "wallet_stream", callback)
+
+    def subscribe_position(self, callback=None):
+        """
+        Подписка на изменения позиций
+
+        Args:
+            callback: Функция обработки данных
+        """
+        self._subscribe_private("position", "position_stream", callback)
+
+    def subscribe_order(self, callback=None):
+        """
+        Подписка на изменения ордеров
+
+        Args:
+            callback: Функция обработки данных
+        """
+        self._subscribe_private("order", "order_stream", callback)
+
+    def subscribe_execution(self, callback=None):
+        """
+        Подписка на исполнения ордеров
+
+        Args:
+            callback: Функция обработки данных
+        """
+        self._subscribe_private("execution", "execution_stream", callback)
+
+    def dispatch_stats(self):
+        """Глубина очередей и счетчики потерь dispatcher (None, если dispatcher не задан)"""
+        return self.dispatcher.stats() if self.dispatcher is not None else None
+
+    def latency_ms(self, exchange_ts, received_at=None):
+        """
+        Задержка сообщения: локальное время получения минус timestamp биржи (мс)
+
+        Если задан clock, учитывается смещение локальных часов относительно сервера.
+
+        Args:
+            exchange_ts: Timestamp биржи (например, message['ts'] или trade['T'])
+            received_at: Время получения (time.time()); по умолчанию - сейчас
+        """
+        if self.clock is not None:
+            return self.clock.latency_ms(exchange_ts, received_at)
+        received = received_at if received_at is not None else time.time()
+        return received * 1000 - float(exchange_ts)
 
     # === Default Handlers ===
 
@@ -197,6 +542,21 @@ class BybitWebSocketClient:
         except Exception as e:
             logging.error(f"Ошибка обработки ticker: {e}")
 
+    def _default_conflated_ticker_handler(self, changed):
+        """Стандартный обработчик слитых тикеров"""
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        for symbol, data in sorted(changed.items()):
+            print(f"[{timestamp}] {symbol:12} {data.get('lastPrice')}")
+
+    def _default_private_handler(self, message):
+        """Стандартный обработчик приватных потоков"""
+        try:
+            topic = message.get('topic')
+            for item in message.get('data', []):
+                logging.info(f"[{topic}] {item}")
+        except Exception as e:
+            logging.error(f"Ошибка обработки приватного сообщения: {e}")
+
     def run(self):
         """Запуск WebSocket соединения (блокирующий вызов)"""
         logging.info("WebSocket соединение запущено. Нажмите Ctrl+C для остановки.")
@@ -212,8 +572,12 @@ class BybitWebSocketClient:
     def stop(self):
         """Остановка WebSocket соединения"""
         try:
-            if hasattr(self.ws, 'exit'):
-                self.ws.exit()
+            if self._ws is not None and hasattr(self._ws, 'exit'):
+                self._ws.exit()
+            for conflator in self._conflators:
+                conflator.stop()
+            if self._owns_dispatcher:
+                self.dispatcher.stop()
             logging.info("WebSocket соединение закрыто")
         except Exception as e:
             logging.error(f"Ошибка при закрытии WebSocket: {e}")
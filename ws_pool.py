@@ -0,0 +1,359 @@
+"""
+Пул WebSocket соединений Bybit: топики распределяются по нескольким соединениям
+"""
+from collections import defaultdict, deque
+from websocket_client import BybitWebSocketClient
+import logging
+import threading
+import time
+
+
+# Начальная оценка нагрузки топика (сообщений в секунду, условно), пока нет замеров
+DEFAULT_TOPIC_WEIGHTS = {
+    'orderbook': 5.0,
+    'publicTrade': 3.0,
+    'tickers': 2.0,
+    'kline': 1.0,
+}
+
+# Сколько id последних сделок топика publicTrade помнить для отсева дублей при переносе
+SEEN_TRADES_SIZE = 1000
+
+
+class _Topic:
+    """Подписка пула: на каком соединении, как переподписать, сколько сообщений"""
+
+    __slots__ = ('name', 'symbol', 'subscribe', 'callback', 'owner', 'pending', 'previous', 'messages',
+                 'rate', 'seen')
+
+    def __init__(self, name, symbol, subscribe, callback, owner):
+        self.name = name
+        self.symbol = symbol
+        self.subscribe = subscribe
+        self.callback = callback
+        self.owner = owner
+        self.pending = None
+        self.previous = None
+        self.messages = 0
+        self.rate = None
+        # id последних сделок (deque, set) - только для publicTrade
+        self.seen = (deque(), set()) if name.startswith('publicTrade.') else None
+
+    def fresh_trades(self, message):
+        """Сообщение без уже переданных сделок или None, если новых сделок нет"""
+        order, ids = self.seen
+        trades = [trade for trade in message['data'] if trade['i'] not in ids]
+        for trade in trades:
+            order.append(trade['i'])
+            ids.add(trade['i'])
+            if len(order) > SEEN_TRADES_SIZE:
+                ids.discard(order.popleft())
+        if not trades:
+            return None
+        if len(trades) < len(message['data']):
+            message = {**message, 'data': trades}
+        return message
+
+
+class BybitWebSocketPool:
+    """
+    Логический WebSocket клиент поверх N соединений.
+
+    Методы подписки те же, что у BybitWebSocketClient. Каждый топик (символ)
+    назначается на наименее нагруженное соединение; нагрузка оценивается по
+    числу сообщений топика. Топики одного вызова подписки, попавшие на одно
+    соединение, отправляются одним пакетным запросом subscribe. rebalance()
+    переносит топики с перегруженных соединений: новая подписка открывается
+    до отписки от старой. Для стаканов, тикеров и свечей сообщения старого
+    соединения отбрасываются с первого сообщения нового (оно начинается со
+    snapshot). Сделки publicTrade во время переноса принимаются с обоих
+    соединений и отсеиваются по id сделки: дубликатов нет, но сообщения двух
+    соединений могут прийти не по порядку.
+    """
+
+    def __init__(self, testnet=None, channel_type="spot", connections=4, max_topics_per_connection=200,
+                 rebalance_interval=None, clock=None, dispatcher=None):
+        """
+        Args:
+            testnet: Использовать testnet (если None, берется из config)
+            channel_type: Тип канала - "spot", "linear", "inverse", "option"
+            connections: Количество соединений
+            max_topics_per_connection: Максимум топиков на одно соединение
+            rebalance_interval: Период автоматической перебалансировки в секундах (None - вручную)
+            clock: ClockSync для latency_ms
+            dispatcher: utils.dispatch.Dispatcher, общий для всех соединений
+                        (True - Dispatcher по умолчанию)
+        """
+        if channel_type == "private":
+            raise ValueError("Пул поддерживает только публичные каналы")
+        self.channel_type = channel_type
+        self.max_topics_per_connection = max_topics_per_connection
+        self.clock = clock
+        self._owns_dispatcher = dispatcher is True
+        if dispatcher is True:
+            from utils.dispatch import Dispatcher
+
+            dispatcher = Dispatcher()
+        self.dispatcher = dispatcher
+        self.shards = [BybitWebSocketClient(testnet=testnet, channel_type=channel_type, clock=clock,
+                                            dispatcher=dispatcher)
+                       for _ in range(connections)]
+        self.topics = {}
+        # Обработчик каждого соединения: сообщения направляются топикам пула по 'topic'
+        self._routers = [self._router(shard) for shard in range(connections)]
+        self._conflators = []
+        self._lock = threading.RLock()
+        self._measured_at = time.time()
+
+        self.rebalance_interval = rebalance_interval
+        self._stop = threading.Event()
+        self._thread = None
+        if rebalance_interval:
+            self._thread = threading.Thread(target=self._run, name="WebSocketPoolRebalance", daemon=True)
+            self._thread.start()
+
+    # === Нагрузка ===
+
+    @staticmethod
+    def _default_weight(topic):
+        return DEFAULT_TOPIC_WEIGHTS.get(topic.split('.', 1)[0], 1.0)
+
+    def _topic_load(self, topic):
+        return topic.rate if topic.rate is not None else self._default_weight(topic.name)
+
+    def _shard_loads(self):
+        loads = [0.0] * len(self.shards)
+        counts = [0] * len(self.shards)
+        for topic in self.topics.values():
+            owner = topic.pending if topic.pending is not None else topic.owner
+            loads[owner] += self._topic_load(topic)
+            counts[owner] += 1
+        return loads, counts
+
+    def _pick_shard(self, exclude=None):
+        loads, counts = self._shard_loads()
+        candidates = [i for i in range(len(self.shards))
+                      if i != exclude and counts[i] < self.max_topics_per_connection]
+        if not candidates:
+            raise RuntimeError("Достигнут лимит топиков во всех соединениях пула")
+        return min(candidates, key=lambda i: loads[i])
+
+    # === Подписки ===
+
+    def _router(self, shard):
+        """Обработчик сообщений всех топиков соединения shard"""
+        def dispatch(message):
+            topic = self.topics.get(message.get('topic'))
+            if topic is None:
+                return
+            if shard == topic.pending:
+                # Первое сообщение нового соединения: переключаемся и закрываем старую подписку
+                with self._lock:
+                    old, topic.owner, topic.pending = topic.owner, shard, None
+                    topic.previous = old
+                self._unsubscribe(old, topic.name)
+            elif shard != topic.owner and (topic.seen is None or shard != topic.previous):
+                return
+            if topic.seen is not None:
+                # Сделки старого и нового соединения пересекаются: отсев по id
+                with self._lock:
+                    message = topic.fresh_trades(message)
+                if message is None:
+                    return
+            topic.messages += 1
+            topic.callback(message)
+        return dispatch
+
+    def _unsubscribe(self, shard, name):
+        try:
+            self.shards[shard].unsubscribe(name)
+        except Exception as e:
+            logging.error(f"Ошибка отписки от {name} (соединение {shard}): {e}")
+
+    def _subscribe_groups(self, groups):
+        """
+        Отправить подписки, сгруппированные по соединению
+
+        Args:
+            groups: {(номер соединения, subscribe): [_Topic, ...]}
+
+        Returns:
+            list: Топики, подписка которых не удалась
+        """
+        failed = []
+        for (shard, subscribe), topics in groups.items():
+            try:
+                # Все символы соединения - одним вызовом (пакетные запросы subscribe)
+                subscribe(self.shards[shard], [topic.symbol for topic in topics], self._routers[shard])
+                logging.info(f"{len(topics)} топиков -> соединение {shard}")
+            except Exception as e:
+                logging.error(f"Ошибка подписки на соединении {shard}: {e}")
+                failed.extend(topics)
+        return failed
+
+    def _add(self, names, subscribe, callback):
+        """
+        Подписать топики на наименее нагруженных соединениях
+
+        Args:
+            names: {имя топика: символ}
+            subscribe: Функция subscribe(client, symbols, handler), подписывающая символы
+                       на одном соединении
+            callback: Пользовательский обработчик
+        """
+        groups = defaultdict(list)
+        with self._lock:
+            for name in names:
+                if name in self.topics:
+                    raise ValueError(f"Уже есть подписка на {name}")
+            for name, symbol in names.items():
+                shard = self._pick_shard()
+                topic = self.topics[name] = _Topic(name, symbol, subscribe, callback, shard)
+                groups[(shard, subscribe)].append(topic)
+        failed = self._subscribe_groups(groups)
+        if failed:
+            with self._lock:
+                for topic in failed:
+                    self.topics.pop(topic.name, None)
+            raise RuntimeError(f"Не удалось подписаться на {len(failed)} топиков")
+
+    def subscribe_trades(self, symbols, callback=None):
+        """Подписка на поток последних сделок (см. BybitWebSocketClient.subscribe_trades)"""
+        callback = callback or self.shards[0]._default_trade_handler
+        self._add({f"publicTrade.{symbol}": symbol for symbol in symbols},
+                  lambda client, batch, handler: client.subscribe_trades(batch, callback=handler),
+                  callback)
+
+    def subscribe_orderbook(self, symbols, depth=1, callback=None, raw=False):
+        """Подписка на поток стакана (см. BybitWebSocketClient.subscribe_orderbook)"""
+        callback = callback or self.shards[0]._default_orderbook_handler
+        self._add({f"orderbook.{depth}.{symbol}": symbol for symbol in symbols},
+                  lambda client, batch, handler: client.subscribe_orderbook(
+                      batch, depth=depth, callback=handler, raw=raw),
+                  callback)
+
+    def subscribe_kline(self, symbols, interval="1", callback=None):
+        """Подписка на поток свечей (см. BybitWebSocketClient.subscribe_kline)"""
+        callback = callback or self.shards[0]._default_kline_handler
+        self._add({f"kline.{interval}.{symbol}": symbol for symbol in symbols},
+                  lambda client, batch, handler: client.subscribe_kline(
+                      batch, interval=interval, callback=handler),
+                  callback)
+
+    def subscribe_ticker(self, symbols, callback=None, conflate=None):
+        """Подписка на поток тикеров (см. BybitWebSocketClient.subscribe_ticker)"""
+        conflator = None
+        if conflate:
+            from utils.conflation import Conflator
+
+            # Один Conflator на все соединения: callback получает изменения всех символов сразу
+            conflator = Conflator(callback or self.shards[0]._default_conflated_ticker_handler, conflate,
+                                  name="TickerConflator")
+            self._conflators.append(conflator)
+            callback = lambda message: conflator.update(message['data']['symbol'], message['data'])
+        callback = callback or self.shards[0]._default_ticker_handler
+        self._add({f"tickers.{symbol}": symbol for symbol in symbols},
+                  lambda client, batch, handler: client.subscribe_ticker(batch, callback=handler),
+                  callback)
+        return conflator
+
+    # === Перебалансировка ===
+
+    def measure(self):
+        """Обновить оценку нагрузки топиков (сообщений в секунду с прошлого замера)"""
+        now = time.time()
+        with self._lock:
+            elapsed = max(now - self._measured_at, 1e-6)
+            for topic in self.topics.values():
+                topic.rate = topic.messages / elapsed
+                topic.messages = 0
+            self._measured_at = now
+
+    def rebalance(self, threshold=1.25):
+        """
+        Перенести топики с самого нагруженного соединения на наименее нагруженное,
+        пока нагрузка самого загруженного превышает нагрузку наименее загруженного
+        более чем в threshold раз
+
+        Returns:
+            int: Количество перенесенных топиков
+        """
+        self.measure()
+        moved = []
+        with self._lock:
+            loads, counts = self._shard_loads()
+            while True:
+                hot = max(range(len(loads)), key=lambda i: loads[i])
+                cold = min(range(len(loads)), key=lambda i: loads[i])
+                if hot == cold or loads[hot] <= loads[cold] * threshold \
+                        or counts[cold] >= self.max_topics_per_connection:
+                    break
+                # Самый тяжелый топик, перенос которого уменьшает разницу
+                gap = loads[hot] - loads[cold]
+                candidates = [t for t in self.topics.values()
+                              if t.owner == hot and t.pending is None and 0 < self._topic_load(t) < gap]
+                if not candidates:
+                    break
+                topic = max(candidates, key=self._topic_load)
+                load = self._topic_load(topic)
+                topic.pending = cold
+                loads[hot] -= load
+                loads[cold] += load
+                counts[hot] -= 1
+                counts[cold] += 1
+                moved.append(topic)
+
+        groups = defaultdict(list)
+        for topic in moved:
+            logging.info(f"{topic.name}: соединение {topic.owner} -> {topic.pending}")
+            groups[(topic.pending, topic.subscribe)].append(topic)
+        for topic in self._subscribe_groups(groups):
+            topic.pending = None
+        return len(moved)
+
+    def _run(self):
+        while not self._stop.wait(self.rebalance_interval):
+            try:
+                self.rebalance()
+            except Exception as e:
+                logging.error(f"Ошибка перебалансировки пула: {e}")
+
+    def stats(self):
+        """Нагрузка соединений: топиков и оценка сообщений в секунду"""
+        with self._lock:
+            loads, counts = self._shard_loads()
+            return [{'connection': i, 'topics': counts[i], 'load': loads[i]}
+                    for i in range(len(self.shards))]
+
+    # === Общие методы клиента ===
+
+    def dispatch_stats(self):
+        """Глубина очередей и счетчики потерь dispatcher (None, если dispatcher не задан)"""
+        return self.dispatcher.stats() if self.dispatcher is not None else None
+
+    def latency_ms(self, exchange_ts, received_at=None):
+        """Задержка сообщения (см. BybitWebSocketClient.latency_ms)"""
+        return self.shards[0].latency_ms(exchange_ts, received_at)
+
+    def run(self):
+        """Поддерживать соединения до Ctrl+C (блокирующий вызов)"""
+        logging.info(f"WebSocket пул запущен: {len(self.shards)} соединений, {len(self.topics)} топиков")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logging.info("Остановка WebSocket пула...")
+            self.stop()
+
+    def stop(self):
+        """Закрыть все соединения пула"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        for shard in self.shards:
+            shard.stop()
+        for conflator in self._conflators:
+            conflator.stop()
+        if self._owns_dispatcher:
+            self.dispatcher.stop()